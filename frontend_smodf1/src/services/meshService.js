@@ -0,0 +1,80 @@
+import axios from 'axios';
+
+const API_URL = 'http://localhost:8000/api';
+
+// Formato binario de /api/projects/<id>/mesh/ (ver vision/mesh.py):
+// cabecera de 16 bytes little-endian (magic 'SMSH', versión, flags,
+// número de vértices, número de caras) seguida de posiciones, normales y
+// colores en float32 y caras en uint32.
+const MESH_MAGIC = 'SMSH';
+const HEADER_SIZE = 16;
+const HAS_NORMALS = 1;
+const HAS_COLORS = 2;
+
+export function parseBinaryMesh(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== MESH_MAGIC) {
+        throw new Error('Formato de malla binaria no válido');
+    }
+
+    const flags = view.getUint16(6, true);
+    const vertexCount = view.getUint32(8, true);
+    const faceCount = view.getUint32(12, true);
+
+    // Los arrays se mapean directamente sobre el buffer, sin copiar
+    let offset = HEADER_SIZE;
+    const take = (ArrayType, count) => {
+        const array = new ArrayType(buffer, offset, count * 3);
+        offset += array.byteLength;
+        return array;
+    };
+
+    const mesh = { vertices: take(Float32Array, vertexCount), normals: null, colors: null };
+    if (flags & HAS_NORMALS) {
+        mesh.normals = take(Float32Array, vertexCount);
+    }
+    if (flags & HAS_COLORS) {
+        mesh.colors = take(Float32Array, vertexCount);
+    }
+    mesh.faces = take(Uint32Array, faceCount);
+    return mesh;
+}
+
+export const meshService = {
+    // lod: 0 = malla completa, 1 = 1/4 de polígonos, 2 = 1/16 (vistas previas)
+    async getBinaryMesh(projectId, imageId, lod = 0) {
+        try {
+            const response = await axios.get(`${API_URL}/projects/${projectId}/mesh/`, {
+                params: { image_id: imageId, lod },
+                responseType: 'arraybuffer'
+            });
+            return parseBinaryMesh(response.data);
+        } catch (error) {
+            console.error('Error fetching binary mesh:', error);
+            throw error;
+        }
+    },
+
+    // url: mesh_url devuelto por la API (ya incluye image_id y lod)
+    async getMeshFromUrl(url) {
+        try {
+            const response = await axios.get(url, { responseType: 'arraybuffer' });
+            return parseBinaryMesh(response.data);
+        } catch (error) {
+            console.error('Error fetching binary mesh:', error);
+            throw error;
+        }
+    }
+};
+
+// Modelo para los visores: metadatos de data_3d y geometría en arrays tipados
+export function withBinaryGeometry(model3d, mesh) {
+    return {
+        ...model3d,
+        vertices: mesh.vertices,
+        normals: mesh.normals,
+        colors: mesh.colors,
+        faces: mesh.faces
+    };
+}
@@ -0,0 +1,97 @@
+import hashlib
+import logging
+import os
+
+from django.utils import timezone
+
+from .models import ProjectImage
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de los bloques con los que se calcula el checksum
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+# Campos que lee y actualiza el escaneo
+INTEGRITY_FIELDS = ['file_exists', 'file_size', 'checksum', 'file_checked_at']
+
+STATUS_OK = 'ok'
+STATUS_MISSING = 'missing'
+STATUS_RESTORED = 'restored'
+STATUS_CHANGED = 'changed'
+STATUS_HASHED = 'hashed'
+
+
+def file_checksum(path):
+    """SHA-256 del archivo, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_image_file(project_image, rehash=False):
+    """
+    Comprueba el archivo de una imagen y actualiza sus campos de integridad
+    (sin guardarlos)
+
+    Solo se lee el archivo entero cuando no tiene checksum, cuando su tamaño
+    no coincide con el guardado o con rehash; en el resto de casos basta un stat.
+
+    Args:
+        project_image: ProjectImage con los campos de INTEGRITY_FIELDS cargados
+        rehash: Recalcular el checksum aunque el tamaño no haya cambiado
+
+    Returns:
+        Estado: STATUS_OK, STATUS_MISSING, STATUS_RESTORED, STATUS_CHANGED o STATUS_HASHED
+    """
+    was_missing = not project_image.file_exists
+    project_image.file_checked_at = timezone.now()
+
+    try:
+        size = os.stat(project_image.image.path).st_size if project_image.image else None
+    except OSError:
+        size = None
+    if size is None:
+        project_image.file_exists = False
+        return STATUS_MISSING
+
+    project_image.file_exists = True
+    status = STATUS_RESTORED if was_missing else STATUS_OK
+    if rehash or not project_image.checksum or size != project_image.file_size:
+        checksum = file_checksum(project_image.image.path)
+        if status == STATUS_OK and not project_image.checksum:
+            status = STATUS_HASHED
+        elif status == STATUS_OK and checksum != project_image.checksum:
+            status = STATUS_CHANGED
+        project_image.checksum = checksum
+        project_image.file_size = size
+    return status
+
+
+def scan_images(images, rehash=False, batch_size=200):
+    """
+    Comprueba los archivos de un queryset de imágenes y guarda el resultado
+    con una actualización en bloque cada batch_size imágenes
+
+    Returns:
+        Diccionario {estado: número de imágenes}
+    """
+    counts = {}
+    pending = []
+    for project_image in images.only('id', 'image', *INTEGRITY_FIELDS).order_by('id').iterator(chunk_size=batch_size):
+        try:
+            status = check_image_file(project_image, rehash=rehash)
+        except OSError as e:
+            logger.warning(f"No se pudo comprobar la imagen {project_image.id}: {str(e)}")
+            continue
+        counts[status] = counts.get(status, 0) + 1
+        if status in (STATUS_MISSING, STATUS_RESTORED, STATUS_CHANGED):
+            logger.info(f"Imagen {project_image.id}: {status}")
+        pending.append(project_image)
+        if len(pending) >= batch_size:
+            ProjectImage.objects.bulk_update(pending, INTEGRITY_FIELDS)
+            pending = []
+    if pending:
+        ProjectImage.objects.bulk_update(pending, INTEGRITY_FIELDS)
+    return counts
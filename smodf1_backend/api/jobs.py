@@ -0,0 +1,339 @@
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+
+from vision.image_processor import ImageProcessor
+from .mesh_store import save_model_3d
+from .models import ProcessingJob
+from .progress import PipelineCancelled, PipelineProgress
+
+logger = logging.getLogger(__name__)
+
+# Valores por defecto de la configuración de los workers
+JOB_POLL_INTERVAL = 1.0
+JOB_TIMEOUT = 30 * 60
+JOB_MAX_ATTEMPTS = 2
+
+# Prefijo del worker de los trabajos que ejecuta una petición SSE en su
+# propio hilo (start_job); no pasan por la cola
+STREAM_WORKER_PREFIX = 'stream:'
+
+
+class JobError(Exception):
+    """Error esperado de un trabajo: su mensaje se devuelve tal cual al cliente"""
+
+
+def generate_model_3d(project_image, settings_3d=None):
+    """
+    Genera el modelo 3D de una imagen y lo guarda en el almacén de mallas
+
+    Returns:
+        Resultado de generate_3d_data (con la clave 'error' si falló)
+    """
+    processor = ImageProcessor()
+    results = processor.generate_3d_data(project_image.image.path, settings=settings_3d or {})
+
+    if isinstance(results, dict) and not results.get('error'):
+        save_model_3d(project_image, results)
+        project_image.save()
+    return results
+
+
+def enqueue_job(kind, project, project_image=None, payload=None):
+    """Crea un trabajo pendiente; lo ejecutará el primer worker libre"""
+    job = ProcessingJob.objects.create(
+        project=project,
+        project_image=project_image,
+        kind=kind,
+        payload=payload or {}
+    )
+    logger.info(f"Trabajo {job.id} ({kind}) en cola para la imagen {project_image.id if project_image else None}")
+    return job
+
+
+def enqueue_jobs(kind, project, project_images, payload=None):
+    """
+    Crea un trabajo pendiente por imagen con una sola inserción en bloque
+
+    Returns:
+        Lista de ProcessingJob creados
+    """
+    jobs = ProcessingJob.objects.bulk_create([
+        ProcessingJob(project=project, project_image=project_image, kind=kind, payload=payload or {})
+        for project_image in project_images
+    ])
+    logger.info(f"{len(jobs)} trabajos ({kind}) en cola para el proyecto {project.id}")
+    return jobs
+
+
+def start_job(kind, project, project_image=None, payload=None, worker_name=None):
+    """
+    Crea un trabajo ya reclamado por el proceso actual, para ejecutarlo
+    fuera de la cola (por ejemplo mientras se envía su progreso por SSE)
+    """
+    return ProcessingJob.objects.create(
+        project=project,
+        project_image=project_image,
+        kind=kind,
+        payload=payload or {},
+        status=ProcessingJob.STATUS_RUNNING,
+        worker=worker_name or default_worker_name(),
+        started_at=timezone.now(),
+        attempts=1
+    )
+
+
+def job_cancelled(job_id):
+    """Indica si se pidió cancelar el trabajo"""
+    return ProcessingJob.objects.filter(id=job_id, status=ProcessingJob.STATUS_CANCELLED).exists()
+
+
+def cancel_job(job):
+    """
+    Cancela un trabajo pendiente o en ejecución
+
+    Un trabajo en cola no llegará a ejecutarse; uno en ejecución se detiene
+    al empezar o terminar su siguiente etapa.
+
+    Returns:
+        True si el trabajo no había terminado
+    """
+    cancelled = ProcessingJob.objects.filter(
+        id=job.id,
+        status__in=[ProcessingJob.STATUS_QUEUED, ProcessingJob.STATUS_RUNNING]
+    ).update(
+        status=ProcessingJob.STATUS_CANCELLED,
+        finished_at=timezone.now(),
+        error_message="Trabajo cancelado"
+    )
+    job.refresh_from_db()
+    return bool(cancelled)
+
+
+def claim_next_job(worker_name):
+    """
+    Reclama el trabajo pendiente más antiguo
+
+    La reclamación es un UPDATE condicionado al estado 'queued', de modo que
+    si varios workers eligen el mismo trabajo solo uno lo consigue. Funciona
+    igual en SQLite que en PostgreSQL, sin bloqueos de fila.
+
+    Returns:
+        El ProcessingJob reclamado o None si no hay trabajos pendientes
+    """
+    candidates = (ProcessingJob.objects
+                  .filter(status=ProcessingJob.STATUS_QUEUED)
+                  .order_by('created_at', 'id')
+                  .values_list('id', flat=True)[:10])
+    for job_id in candidates:
+        claimed = ProcessingJob.objects.filter(id=job_id, status=ProcessingJob.STATUS_QUEUED).update(
+            status=ProcessingJob.STATUS_RUNNING,
+            worker=worker_name,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            return ProcessingJob.objects.select_related('project', 'project_image').get(id=job_id)
+    return None
+
+
+def requeue_stale_jobs(timeout=None, max_attempts=None):
+    """
+    Recupera los trabajos de workers que murieron a mitad de ejecución
+
+    Los trabajos en ejecución desde hace más de timeout segundos vuelven a
+    la cola, o se marcan como fallidos si ya agotaron sus intentos. Los de
+    los streams SSE no se tocan: siguen en marcha en el hilo de su petición
+    y un worker los ejecutaría por segunda vez.
+
+    Returns:
+        Tuple de (trabajos reencolados, trabajos marcados como fallidos)
+    """
+    timeout = timeout if timeout is not None else getattr(settings, 'PROCESSING_JOB_TIMEOUT', JOB_TIMEOUT)
+    max_attempts = max_attempts if max_attempts is not None else getattr(settings, 'PROCESSING_JOB_MAX_ATTEMPTS', JOB_MAX_ATTEMPTS)
+
+    now = timezone.now()
+    stale = ProcessingJob.objects.filter(
+        status=ProcessingJob.STATUS_RUNNING,
+        started_at__lt=now - timedelta(seconds=timeout)
+    ).exclude(worker__startswith=STREAM_WORKER_PREFIX)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=ProcessingJob.STATUS_FAILED,
+        finished_at=now,
+        error_message="El trabajo no terminó dentro del tiempo límite"
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(
+        status=ProcessingJob.STATUS_QUEUED,
+        worker='',
+        started_at=None
+    )
+    if requeued or failed:
+        logger.warning(f"Trabajos interrumpidos: {requeued} reencolados, {failed} fallidos")
+    return requeued, failed
+
+
+def _run_process_image(job, progress):
+    # Importación diferida: las vistas importan este módulo
+    from .views import attach_model_3d, process_image_internal
+
+    project_image = job.project_image
+    request_data = dict(job.payload, image_id=project_image.id)
+    base_url = job.payload.get('base_url')
+
+    project_image.start_processing()
+    result = process_image_internal(
+        request_data,
+        project_image,
+        progress=progress,
+        inline_image=job.payload.get('inline', False),
+        absolute_uri=(lambda path: urljoin(base_url, path)) if base_url else None
+    )
+    if result.get("cancelled"):
+        raise PipelineCancelled()
+    if "error" in result:
+        raise JobError(result["error"])
+
+    if job.payload.get('generate_3d'):
+        attach_model_3d(result, request_data)
+
+    # La geometría ya está en el almacén de mallas; se vuelve a leer al pedir el resultado
+    result.pop("model_3d", None)
+    return result
+
+
+def _run_generate_3d(job, progress):
+    progress.check()
+    results = generate_model_3d(job.project_image, job.payload.get('settings'))
+    if isinstance(results, dict) and results.get('error'):
+        raise JobError(results['error'])
+    return {"message": "Modelo 3D generado exitosamente"}
+
+
+JOB_HANDLERS = {
+    ProcessingJob.KIND_PROCESS_IMAGE: _run_process_image,
+    ProcessingJob.KIND_GENERATE_3D: _run_generate_3d,
+}
+
+
+def run_job(job, progress=None):
+    """
+    Ejecuta un trabajo ya reclamado y guarda su resultado o su error
+
+    Si al terminar el trabajo ya no está en ejecución a nombre de este
+    worker (se canceló o se reencoló) el resultado se descarta y job
+    refleja el estado guardado.
+
+    Args:
+        job: ProcessingJob en ejecución
+        progress: PipelineProgress que recibe los eventos del trabajo; por
+            defecto uno que solo comprueba si se canceló el trabajo
+    """
+    start = time.perf_counter()
+    handler = JOB_HANDLERS.get(job.kind)
+    progress = progress or PipelineProgress(is_cancelled=lambda: job_cancelled(job.id))
+    try:
+        if handler is None:
+            raise JobError(f"Tipo de trabajo desconocido: {job.kind}")
+        if job.kind in (ProcessingJob.KIND_PROCESS_IMAGE, ProcessingJob.KIND_GENERATE_3D) and job.project_image is None:
+            raise JobError("El trabajo no tiene imagen asociada")
+        job.result = handler(job, progress)
+        job.status = ProcessingJob.STATUS_SUCCEEDED
+        job.error_message = None
+    except PipelineCancelled:
+        job.status = ProcessingJob.STATUS_CANCELLED
+        job.error_message = "Trabajo cancelado"
+    except JobError as e:
+        job.status = ProcessingJob.STATUS_FAILED
+        job.error_message = str(e)
+    except Exception as e:
+        logger.exception(f"Error ejecutando el trabajo {job.id}")
+        job.status = ProcessingJob.STATUS_FAILED
+        job.error_message = str(e)
+
+    job.finished_at = timezone.now()
+    # Solo si el trabajo sigue siendo de este worker: mientras se ejecutaba
+    # pudo cancelarse o, si se consideró interrumpido, volver a la cola y
+    # reclamarlo otro worker
+    finished = ProcessingJob.objects.filter(
+        id=job.id,
+        status=ProcessingJob.STATUS_RUNNING,
+        worker=job.worker
+    ).update(
+        status=job.status,
+        result=job.result,
+        error_message=job.error_message,
+        finished_at=job.finished_at
+    )
+    if not finished:
+        outcome = job.status
+        job.refresh_from_db()
+        logger.warning(f"Trabajo {job.id} ({job.kind}): se descarta el resultado '{outcome}', "
+                       f"el trabajo ya está en estado '{job.status}' (worker '{job.worker}')")
+        return job
+    logger.info(f"Trabajo {job.id} ({job.kind}) {job.status} en {(time.perf_counter() - start) * 1000:.0f} ms")
+    return job
+
+
+def run_streamed_job(job, progress):
+    """
+    Ejecuta un trabajo creado con start_job publicando su progreso y, al
+    terminar, un evento final: 'complete', 'error' o 'cancelled'
+    """
+    try:
+        run_job(job, progress)
+        if job.status == ProcessingJob.STATUS_SUCCEEDED:
+            progress.finish("complete", job_id=job.id, result=job.result)
+        elif job.status == ProcessingJob.STATUS_CANCELLED:
+            progress.finish("cancelled", job_id=job.id)
+        else:
+            progress.finish("error", job_id=job.id, error=job.error_message or f"Trabajo en estado {job.status}")
+    except Exception as e:
+        logger.exception(f"Error en el trabajo {job.id}")
+        progress.finish("error", job_id=job.id, error=str(e))
+    finally:
+        # Conexión propia de este hilo
+        connections.close_all()
+
+
+def default_worker_name(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def work(worker_name=None, poll_interval=None, once=False):
+    """
+    Bucle de un worker: reclama y ejecuta trabajos hasta que se le detiene
+
+    Args:
+        worker_name: Identificador guardado en los trabajos que ejecuta
+        poll_interval: Segundos de espera cuando la cola está vacía
+        once: Terminar en cuanto la cola quede vacía
+
+    Returns:
+        Número de trabajos ejecutados
+    """
+    worker_name = worker_name or default_worker_name()
+    if poll_interval is None:
+        poll_interval = getattr(settings, 'PROCESSING_JOB_POLL_INTERVAL', JOB_POLL_INTERVAL)
+
+    executed = 0
+    requeue_stale_jobs()
+    while True:
+        close_old_connections()
+        job = claim_next_job(worker_name)
+        if job is None:
+            if once:
+                return executed
+            requeue_stale_jobs()
+            time.sleep(poll_interval)
+            continue
+
+        run_job(job)
+        executed += 1
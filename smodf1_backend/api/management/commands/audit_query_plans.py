@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+
+from api.models import Project, ProjectImage
+from api.query_audit import AUDITED_ACTIONS, audit_queries, capture_action_queries
+from api.statistics import invalidate_statistics
+from api.views import ProjectViewSet
+
+
+class Command(BaseCommand):
+    help = ("Ejecuta las acciones de lectura de ProjectViewSet, pasa cada consulta por EXPLAIN "
+            "y señala las que recorren tablas enteras")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, default=None,
+                            help='Proyecto sobre el que ejecutar las acciones (por defecto el que tiene más imágenes)')
+        parser.add_argument('--action', action='append', default=None,
+                            help='Auditar solo esta acción (se puede repetir)')
+        parser.add_argument('--ignore-table', action='append', default=[],
+                            help='No señalar los recorridos de esta tabla (se puede repetir)')
+        parser.add_argument('--show-plans', action='store_true',
+                            help='Mostrar el SQL y el plan de todas las consultas, no solo de las señaladas')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Terminar con error si alguna consulta recorre una tabla entera')
+
+    def handle(self, *args, **options):
+        if options['project']:
+            project = Project.objects.filter(pk=options['project']).first()
+        else:
+            project = Project.objects.annotate(image_count=Count('images')).order_by('-image_count', 'id').first()
+        if project is None:
+            raise CommandError("No hay ningún proyecto sobre el que ejecutar las acciones")
+
+        actions = [name for name, _ in AUDITED_ACTIONS]
+        if options['action']:
+            unknown = set(options['action']) - set(actions)
+            if unknown:
+                raise CommandError(f"Acciones no auditables: {', '.join(sorted(unknown))}")
+            actions = [name for name in actions if name in options['action']]
+
+        # Las acciones de mallas necesitan una imagen con modelo 3D
+        model_image = ProjectImage.objects.filter(project=project, has_3d_data=True).values_list('id', flat=True).first()
+        params = {'get_3d_mesh': {'image_id': model_image}, 'export_glb': {'image_id': model_image}}
+
+        ignored = set(options['ignore_table'])
+        flagged = failed = 0
+        self.stdout.write(f"Proyecto {project.id} ({connection.vendor})")
+        for action in actions:
+            # Sin caché, para que las estadísticas lleguen a la base de datos
+            invalidate_statistics([project.id])
+            # Cualquier escritura de la acción se deshace al terminar
+            try:
+                with transaction.atomic():
+                    status_code, sqls = capture_action_queries(
+                        ProjectViewSet, action, project,
+                        {key: value for key, value in params.get(action, {}).items() if value is not None}
+                    )
+                    results = audit_queries(sqls)
+                    transaction.set_rollback(True)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(self.style.ERROR(f"{action}: error al auditar: {type(e).__name__}: {str(e)}"))
+                continue
+
+            scans = [result for result in results if set(result['full_scans']) - ignored]
+            flagged += len(scans)
+            style = self.style.WARNING if scans else self.style.SUCCESS
+            self.stdout.write(style(f"{action}: HTTP {status_code}, {len(results)} consultas, "
+                                    f"{len(scans)} con recorridos completos"))
+            for result in results:
+                tables = sorted(set(result['full_scans']) - ignored)
+                if not tables and not options['show_plans']:
+                    continue
+                if tables:
+                    self.stdout.write(self.style.WARNING(f"  Recorrido completo de {', '.join(tables)}"))
+                self.stdout.write(f"    {result['sql']}")
+                for line in result['plan']:
+                    self.stdout.write(f"      {line}")
+
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f"{flagged} consultas recorren tablas enteras")
+        if failed:
+            raise CommandError(f"{failed} acciones no se pudieron auditar")
+        self.stdout.write(self.style.SUCCESS(f"Auditoría terminada: {flagged} consultas señaladas"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api.models import ProjectImage
+from api.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = "Genera la miniatura y la vista previa de las imágenes subidas antes de que existieran"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, default=None,
+                            help='Solo las imágenes de este proyecto')
+        parser.add_argument('--all', action='store_true',
+                            help='Regenerar también las imágenes que ya tienen versiones')
+
+    def handle(self, *args, **options):
+        images = ProjectImage.objects.defer('analysis_results', 'data_3d').order_by('id')
+        if options['project']:
+            images = images.filter(project_id=options['project'])
+        if not options['all']:
+            images = images.filter(renditions__isnull=True)
+
+        generated = failed = 0
+        for project_image in images.iterator():
+            try:
+                renditions = generate_renditions(project_image)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Imagen {project_image.id}: {str(e)}")
+                continue
+            generated += 1
+            sizes = ", ".join(f"{r.size} {r.width}x{r.height}" for r in renditions) or "sin reducir"
+            self.stdout.write(f"Imagen {project_image.id}: {sizes}")
+
+        self.stdout.write(self.style.SUCCESS(f"{generated} imágenes procesadas, {failed} con errores"))
@@ -0,0 +1,60 @@
+import multiprocessing
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _worker(index, poll_interval, once):
+    """Punto de entrada de cada proceso worker"""
+    if not apps.ready:
+        # Procesos creados con 'spawn': hay que volver a cargar Django
+        django.setup()
+    from api.jobs import default_worker_name, work
+
+    try:
+        work(default_worker_name(index), poll_interval, once)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Ejecuta los trabajos de procesamiento en cola (procesado de imágenes y generación 3D)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Número de procesos worker; el rendimiento escala con él')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--once', action='store_true',
+                            help='Terminar cuando la cola quede vacía')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        poll_interval = options['poll_interval']
+        once = options['once']
+
+        self.stdout.write(f"Iniciando {workers} worker(s)")
+        if workers == 1:
+            _worker(0, poll_interval, once)
+            return
+
+        # Las conexiones abiertas no pueden compartirse entre procesos
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=_worker, args=(index, poll_interval, once))
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Deteniendo workers...")
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+        self.stdout.write(self.style.SUCCESS("Workers detenidos"))
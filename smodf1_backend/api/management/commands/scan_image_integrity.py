@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from api.integrity import scan_images
+from api.models import ProjectImage
+
+
+class Command(BaseCommand):
+    help = ("Comprueba que los archivos de las imágenes existen y guarda su tamaño y checksum, "
+            "para que los listados no tengan que consultar el almacenamiento")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, default=None,
+                            help='Solo las imágenes de este proyecto')
+        parser.add_argument('--stale-hours', type=float, default=24,
+                            help='Solo las imágenes no comprobadas en estas horas (0 para todas)')
+        parser.add_argument('--rehash', action='store_true',
+                            help='Recalcular el checksum aunque el tamaño no haya cambiado')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Imágenes por actualización en bloque')
+
+    def handle(self, *args, **options):
+        images = ProjectImage.objects.all()
+        if options['project']:
+            images = images.filter(project_id=options['project'])
+        if options['stale_hours'] > 0:
+            cutoff = timezone.now() - timedelta(hours=options['stale_hours'])
+            images = images.filter(Q(file_checked_at__isnull=True) | Q(file_checked_at__lt=cutoff))
+
+        counts = scan_images(images, rehash=options['rehash'], batch_size=options['batch_size'])
+
+        summary = ", ".join(f"{status}: {count}" for status, count in sorted(counts.items())) or "ninguna imagen"
+        self.stdout.write(self.style.SUCCESS(f"Imágenes comprobadas ({summary})"))
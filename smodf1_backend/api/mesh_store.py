@@ -0,0 +1,233 @@
+import hashlib
+import logging
+import os
+import uuid
+from functools import partial
+
+import numpy as np
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from vision.artifacts import write_atomic
+from vision.lod import GEOMETRY_KEYS, select_lod
+from vision.mesh import mesh_from_data, pack_mesh, unpack_mesh
+from .models import Mesh
+
+logger = logging.getLogger(__name__)
+
+MESH_DIRECTORY = 'meshes'
+MESH_EXTENSION = '.smsh'
+
+# Claves de data_3d que el cliente puede modificar sin enviar la geometría
+MODEL_METADATA_KEYS = ("metadata", "settings")
+
+
+def mesh_storage_name(content_hash):
+    """Ruta del archivo de una malla dentro de MEDIA_ROOT, direccionada por contenido"""
+    return f"{MESH_DIRECTORY}/{content_hash[:2]}/{content_hash}{MESH_EXTENSION}"
+
+
+def write_mesh_blob(payload):
+    """
+    Escribe una malla empaquetada si no existe ya un archivo con el mismo contenido
+
+    Returns:
+        Tuple de (nombre en el almacenamiento, hash SHA-256)
+    """
+    content_hash = hashlib.sha256(payload).hexdigest()
+    name = mesh_storage_name(content_hash)
+    if not default_storage.exists(name):
+        write_atomic(default_storage.path(name), payload)
+    return name, content_hash
+
+
+def restore_mesh_blob(name, payload):
+    """
+    Vuelve a escribir la malla si falta, una vez confirmadas las filas que la
+    referencian
+
+    Otra imagen puede haber liberado el mismo archivo entre write_mesh_blob
+    y el commit, cuando aún no veía estas filas (ver release_mesh_files).
+    """
+    if not default_storage.exists(name):
+        logger.info(f"Malla {name} eliminada antes del commit; se vuelve a escribir")
+        write_atomic(default_storage.path(name), payload)
+
+
+def model_levels(model_3d):
+    """
+    Niveles de detalle con geometría de un modelo serializado (listas JSON)
+
+    Returns:
+        Lista de tuplas (lod, diccionario con las claves de geometría)
+    """
+    levels = [(0, model_3d)]
+    for entry in model_3d.get("lods") or []:
+        levels.append((entry.get("lod", len(levels)), entry))
+    return [(lod, geometry) for lod, geometry in levels if geometry.get("vertices")]
+
+
+def strip_geometry(model_3d):
+    """Copia de data_3d sin vértices, caras, normales, colores ni niveles de detalle"""
+    return {key: value for key, value in model_3d.items() if key not in GEOMETRY_KEYS and key != "lods"}
+
+
+def has_geometry(model_3d):
+    """Indica si un modelo serializado trae vértices en algún nivel de detalle"""
+    return isinstance(model_3d, dict) and bool(model_levels(model_3d))
+
+
+def update_model_metadata(project_image, model_3d):
+    """
+    Actualiza solo los metadatos y la configuración de un modelo, sin tocar
+    sus mallas guardadas
+
+    Es lo que ocurre al guardar un data_3d leído de la API, que ya no lleva
+    la geometría. La imagen no se guarda; lo hace quien llama.
+
+    Returns:
+        El nuevo data_3d
+    """
+    data_3d = dict(project_image.data_3d) if isinstance(project_image.data_3d, dict) else {}
+    for key in MODEL_METADATA_KEYS:
+        if key in model_3d:
+            data_3d[key] = model_3d[key]
+    project_image.data_3d = data_3d
+    return data_3d
+
+
+def save_model_3d(project_image, model_3d):
+    """
+    Guarda la geometría de un modelo 3D en el almacén de mallas
+
+    Cada nivel de detalle se empaqueta en un archivo binario y
+    project_image.data_3d queda solo con los metadatos y las referencias
+    a las mallas. Si model_3d no trae geometría solo se actualizan los
+    metadatos y se conservan las mallas. La imagen no se guarda; lo hace
+    quien llama.
+
+    Args:
+        project_image: Instancia de ProjectImage ya guardada
+        model_3d: Resultado de generate_3d_data (o datos enviados por el cliente)
+
+    Returns:
+        El nuevo data_3d
+    """
+    if not isinstance(model_3d, dict):
+        project_image.data_3d = model_3d
+        return model_3d
+    if not has_geometry(model_3d):
+        return update_model_metadata(project_image, model_3d)
+
+    meshes = []
+    for lod, geometry in model_levels(model_3d):
+        mesh = mesh_from_data(geometry)
+        payload = pack_mesh(mesh)
+        name, content_hash = write_mesh_blob(payload)
+
+        stored = Mesh(
+            project_image=project_image,
+            lod=lod,
+            content_hash=content_hash,
+            vertex_count=len(mesh["vertices"]),
+            face_count=len(mesh["faces"]),
+            size_bytes=len(payload)
+        )
+        stored.file.name = name
+        meshes.append(stored)
+        transaction.on_commit(partial(restore_mesh_blob, name, payload))
+
+    # Las mallas anteriores se liberan al confirmar el borrado (señal post_delete de Mesh)
+    with transaction.atomic():
+        project_image.meshes.all().delete()
+        Mesh.objects.bulk_create(meshes)
+
+    data_3d = strip_geometry(model_3d)
+    data_3d["meshes"] = [
+        {
+            "lod": mesh.lod,
+            "content_hash": mesh.content_hash,
+            "vertices_count": mesh.vertex_count,
+            "faces_count": mesh.face_count,
+        }
+        for mesh in meshes
+    ]
+    project_image.has_3d_data = True
+    project_image.data_3d = data_3d
+    return data_3d
+
+
+def release_mesh_files(content_hashes):
+    """
+    Elimina los archivos de malla que ya no referencia ninguna fila
+
+    Debe llamarse con el borrado de las filas ya confirmado. Cada archivo se
+    aparta con un rename antes de volver a comprobar si alguna fila lo
+    referencia: si otra imagen ha guardado entretanto la misma malla se
+    devuelve a su sitio, y si la guarda después su restore_mesh_blob lo
+    encuentra ausente y lo vuelve a escribir.
+    """
+    in_use = set(Mesh.objects.filter(content_hash__in=content_hashes).values_list('content_hash', flat=True))
+    for content_hash in set(content_hashes) - in_use:
+        path = default_storage.path(mesh_storage_name(content_hash))
+        released_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex}.released")
+        try:
+            os.replace(path, released_path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning(f"No se pudo eliminar la malla {content_hash}: {str(e)}")
+            continue
+
+        try:
+            if Mesh.objects.filter(content_hash=content_hash).exists():
+                os.replace(released_path, path)
+            else:
+                os.remove(released_path)
+        except OSError as e:
+            logger.warning(f"No se pudo eliminar la malla {content_hash}: {str(e)}")
+
+
+def get_stored_mesh(project_image, lod=0):
+    """
+    Fila Mesh del nivel pedido o, si no existe, la más simple disponible por debajo de él
+    """
+    return project_image.meshes.filter(lod__lte=lod or 0).order_by('-lod').first()
+
+
+def load_mesh(project_image, lod=0):
+    """
+    Carga la geometría de un modelo 3D mapeando el archivo en memoria
+
+    Los modelos guardados antes del almacén de mallas conservan la
+    geometría dentro de data_3d y se leen desde ahí.
+
+    Returns:
+        Diccionario con arrays 'vertices', 'normals', 'colors' y 'faces',
+        o None si el modelo no tiene geometría
+    """
+    stored = get_stored_mesh(project_image, lod)
+    if stored is not None:
+        return unpack_mesh(np.memmap(stored.file.path, dtype=np.uint8, mode='r'))
+
+    data_3d = project_image.data_3d
+    if isinstance(data_3d, dict) and data_3d.get("vertices"):
+        return mesh_from_data(select_lod(data_3d, lod))
+    return None
+
+
+def inline_model_3d(project_image, lod=0):
+    """
+    data_3d con la geometría en listas JSON, para los clientes que esperan
+    el modelo completo en la respuesta
+    """
+    data_3d = project_image.data_3d
+    if not isinstance(data_3d, dict):
+        return data_3d
+
+    mesh = load_mesh(project_image, lod)
+    model_3d = strip_geometry(data_3d)
+    for key in GEOMETRY_KEYS:
+        values = mesh.get(key) if mesh else None
+        model_3d[key] = values.tolist() if values is not None else []
+    return model_3d
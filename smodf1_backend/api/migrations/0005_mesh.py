@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 16:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_processingoperation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Mesh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lod', models.PositiveSmallIntegerField(default=0)),
+                ('file', models.FileField(upload_to='meshes/')),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('vertex_count', models.IntegerField(default=0)),
+                ('face_count', models.IntegerField(default=0)),
+                ('size_bytes', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project_image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meshes', to='api.projectimage')),
+            ],
+            options={
+                'ordering': ['lod'],
+                'unique_together': {('project_image', 'lod')},
+            },
+        ),
+    ]
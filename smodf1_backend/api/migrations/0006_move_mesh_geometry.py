@@ -0,0 +1,181 @@
+import hashlib
+import struct
+
+import numpy as np
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import migrations
+
+# Copia congelada del formato de malla (versión 1) y del almacén de mallas
+# tal como eran al escribir esta migración, para que los cambios
+# posteriores en vision.mesh o api.mesh_store no cambien lo que hace.
+MESH_MAGIC = b'SMSH'
+MESH_FORMAT_VERSION = 1
+MESH_HEADER = struct.Struct('<4sHHII')
+MESH_HAS_NORMALS = 1
+MESH_HAS_COLORS = 2
+GEOMETRY_KEYS = ("vertices", "faces", "normals", "colors")
+
+
+def mesh_from_data(data_3d):
+    def as_array(key, dtype):
+        return np.asarray(data_3d.get(key) or [], dtype=dtype).reshape(-1, 3)
+
+    return {
+        "vertices": as_array("vertices", np.float32),
+        "normals": as_array("normals", np.float32),
+        "colors": as_array("colors", np.float32),
+        "faces": as_array("faces", np.uint32),
+    }
+
+
+def pack_mesh(mesh):
+    vertices = np.ascontiguousarray(mesh["vertices"], dtype='<f4').reshape(-1, 3)
+    faces = np.ascontiguousarray(mesh["faces"], dtype='<u4').reshape(-1, 3)
+    vertex_count = len(vertices)
+
+    flags = 0
+    chunks = [vertices]
+    for key, flag in (("normals", MESH_HAS_NORMALS), ("colors", MESH_HAS_COLORS)):
+        values = mesh.get(key)
+        if values is not None and len(values) == vertex_count and vertex_count > 0:
+            chunks.append(np.ascontiguousarray(values, dtype='<f4').reshape(-1, 3))
+            flags |= flag
+    chunks.append(faces)
+
+    header = MESH_HEADER.pack(MESH_MAGIC, MESH_FORMAT_VERSION, flags, vertex_count, len(faces))
+    return b''.join([header] + [chunk.tobytes() for chunk in chunks])
+
+
+def unpack_mesh(buffer):
+    magic, version, flags, vertex_count, face_count = MESH_HEADER.unpack_from(buffer, 0)
+    if magic != MESH_MAGIC or version != MESH_FORMAT_VERSION:
+        raise ValueError("Formato de malla binaria no válido")
+
+    offset = MESH_HEADER.size
+
+    def read(dtype, count):
+        nonlocal offset
+        array = np.frombuffer(buffer, dtype=dtype, count=count * 3, offset=offset).reshape(-1, 3)
+        offset += array.nbytes
+        return array
+
+    mesh = {"vertices": read('<f4', vertex_count), "normals": None, "colors": None}
+    if flags & MESH_HAS_NORMALS:
+        mesh["normals"] = read('<f4', vertex_count)
+    if flags & MESH_HAS_COLORS:
+        mesh["colors"] = read('<f4', vertex_count)
+    mesh["faces"] = read('<u4', face_count)
+    return mesh
+
+
+def write_mesh_blob(payload):
+    content_hash = hashlib.sha256(payload).hexdigest()
+    name = f"meshes/{content_hash[:2]}/{content_hash}.smsh"
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(payload))
+    return name, content_hash
+
+
+def model_levels(model_3d):
+    levels = [(0, model_3d)]
+    for entry in model_3d.get("lods") or []:
+        levels.append((entry.get("lod", len(levels)), entry))
+    return [(lod, geometry) for lod, geometry in levels if geometry.get("vertices")]
+
+
+def strip_geometry(model_3d):
+    return {key: value for key, value in model_3d.items() if key not in GEOMETRY_KEYS and key != "lods"}
+
+
+def move_geometry_to_store(apps, schema_editor):
+    """Mueve la geometría guardada en ProjectImage.data_3d a archivos Mesh"""
+    ProjectImage = apps.get_model('api', 'ProjectImage')
+    Mesh = apps.get_model('api', 'Mesh')
+
+    images = ProjectImage.objects.filter(has_3d_data=True).only('id', 'data_3d')
+    for project_image in images.iterator(chunk_size=20):
+        data_3d = project_image.data_3d
+        if not isinstance(data_3d, dict) or not data_3d.get("vertices"):
+            continue
+
+        references = []
+        for lod, geometry in model_levels(data_3d):
+            mesh = mesh_from_data(geometry)
+            payload = pack_mesh(mesh)
+            name, content_hash = write_mesh_blob(payload)
+            Mesh.objects.update_or_create(
+                project_image_id=project_image.id,
+                lod=lod,
+                defaults={
+                    "file": name,
+                    "content_hash": content_hash,
+                    "vertex_count": len(mesh["vertices"]),
+                    "face_count": len(mesh["faces"]),
+                    "size_bytes": len(payload),
+                }
+            )
+            references.append({
+                "lod": lod,
+                "content_hash": content_hash,
+                "vertices_count": len(mesh["vertices"]),
+                "faces_count": len(mesh["faces"]),
+            })
+
+        data_3d = strip_geometry(data_3d)
+        data_3d["meshes"] = references
+        ProjectImage.objects.filter(id=project_image.id).update(data_3d=data_3d)
+
+
+def inline_geometry_from_store(apps, schema_editor):
+    """
+    Inversa de move_geometry_to_store: vuelve a guardar la geometría de cada
+    nivel en data_3d antes de que se elimine la tabla Mesh
+
+    Los archivos de malla se conservan; si vuelve a aplicarse la migración
+    se reutilizan.
+    """
+    ProjectImage = apps.get_model('api', 'ProjectImage')
+    Mesh = apps.get_model('api', 'Mesh')
+
+    image_ids = Mesh.objects.values_list('project_image_id', flat=True).distinct().order_by('project_image_id')
+    for project_image in ProjectImage.objects.filter(id__in=list(image_ids)).only('id', 'data_3d').iterator(chunk_size=20):
+        levels = []
+        for stored in Mesh.objects.filter(project_image_id=project_image.id).order_by('lod'):
+            with default_storage.open(stored.file.name, 'rb') as f:
+                mesh = unpack_mesh(f.read())
+            geometry = {
+                key: mesh[key].tolist() if mesh[key] is not None else []
+                for key in GEOMETRY_KEYS
+            }
+            levels.append((stored.lod, geometry))
+        if not levels:
+            continue
+
+        data_3d = project_image.data_3d if isinstance(project_image.data_3d, dict) else {}
+        data_3d = {key: value for key, value in data_3d.items() if key != "meshes"}
+        lods = []
+        for lod, geometry in levels:
+            if lod == 0:
+                data_3d.update(geometry)
+            else:
+                lods.append(dict(
+                    geometry,
+                    lod=lod,
+                    vertices_count=len(geometry["vertices"]),
+                    faces_count=len(geometry["faces"])
+                ))
+        if lods:
+            data_3d["lods"] = lods
+        ProjectImage.objects.filter(id=project_image.id).update(data_3d=data_3d)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_mesh'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_geometry_to_store, inline_geometry_from_store),
+    ]
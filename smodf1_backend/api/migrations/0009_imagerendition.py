@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 17:08
+
+import api.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_processingjob_cancelled'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(choices=[('thumb', 'Miniatura'), ('preview', 'Vista previa')], max_length=16)),
+                ('file', models.ImageField(upload_to=api.models.get_rendition_path)),
+                ('width', models.IntegerField(default=0)),
+                ('height', models.IntegerField(default=0)),
+                ('size_bytes', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project_image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='api.projectimage')),
+            ],
+            options={
+                'unique_together': {('project_image', 'size')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_imagerendition'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='processingoperation',
+            index=models.Index(fields=['algorithm', 'timestamp'], name='api_operation_algo_time_idx'),
+        ),
+    ]
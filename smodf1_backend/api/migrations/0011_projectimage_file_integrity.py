@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_processingoperation_algo_time_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectimage',
+            name='checksum',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='projectimage',
+            name='file_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectimage',
+            name='file_exists',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='projectimage',
+            index=models.Index(fields=['project', '-uploaded_at', '-id'], name='api_image_project_upload_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_projectimage_file_integrity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='processingoperation',
+            index=models.Index(fields=['project_image', '-timestamp'], name='api_operation_image_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectimage',
+            index=models.Index(condition=models.Q(('has_3d_data', True)), fields=['project', '-uploaded_at'], name='api_image_project_3d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectimage',
+            index=models.Index(condition=models.Q(('processed', False)), fields=['project', '-uploaded_at'], name='api_image_project_pending_idx'),
+        ),
+    ]
@@ -71,6 +71,12 @@ class ProjectImage(models.Model):
     image_width = models.IntegerField(null=True, blank=True)
     image_height = models.IntegerField(null=True, blank=True)
     file_size = models.IntegerField(null=True, blank=True)  # en bytes
+
+    # Estado del archivo en el almacenamiento, que mantiene al día
+    # 'manage.py scan_image_integrity' para no consultarlo en cada listado
+    file_exists = models.BooleanField(default=True)
+    checksum = models.CharField(max_length=64, blank=True, default='')  # SHA-256
+    file_checked_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f"Image {self.id} for project {self.project.name}"
@@ -91,6 +97,71 @@ class ProjectImage(models.Model):
 
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            # Listado paginado por clave (uploaded_at, id) de las imágenes de un proyecto;
+            # también sirve para el orden por defecto (-uploaded_at) dentro de un proyecto
+            models.Index(fields=['project', '-uploaded_at', '-id'], name='api_image_project_upload_idx'),
+            # Índices parciales: solo contienen las filas que buscan get_3d_models y
+            # process_batch (all_unprocessed), que suelen ser una fracción de la tabla
+            models.Index(fields=['project', '-uploaded_at'], condition=models.Q(has_3d_data=True),
+                         name='api_image_project_3d_idx'),
+            models.Index(fields=['project', '-uploaded_at'], condition=models.Q(processed=False),
+                         name='api_image_project_pending_idx'),
+        ]
+
+class Mesh(models.Model):
+    """
+    Geometría de un modelo 3D (un nivel de detalle) en formato binario compacto.
+    El archivo se nombra por el hash SHA-256 de su contenido, de modo que
+    mallas idénticas comparten archivo.
+    """
+    project_image = models.ForeignKey(ProjectImage, related_name='meshes', on_delete=models.CASCADE)
+    lod = models.PositiveSmallIntegerField(default=0)
+    file = models.FileField(upload_to='meshes/')
+    content_hash = models.CharField(max_length=64, db_index=True)
+    vertex_count = models.IntegerField(default=0)
+    face_count = models.IntegerField(default=0)
+    size_bytes = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Mesh LOD {self.lod} for {self.project_image}"
+
+    class Meta:
+        ordering = ['lod']
+        unique_together = [('project_image', 'lod')]
+
+def get_rendition_path(instance, filename):
+    """
+    Generar path para una versión reducida de la imagen: project_<id>/renditions/<filename>
+    """
+    return os.path.join(f'project_{instance.project_image.project_id}', 'renditions', filename)
+
+class ImageRendition(models.Model):
+    """
+    Versión reducida de una imagen subida (miniatura o vista previa), para
+    que las galerías y las vistas previas no descarguen el original
+    """
+    SIZE_THUMB = 'thumb'
+    SIZE_PREVIEW = 'preview'
+    SIZE_CHOICES = [
+        (SIZE_THUMB, 'Miniatura'),
+        (SIZE_PREVIEW, 'Vista previa'),
+    ]
+
+    project_image = models.ForeignKey(ProjectImage, related_name='renditions', on_delete=models.CASCADE)
+    size = models.CharField(max_length=16, choices=SIZE_CHOICES)
+    file = models.ImageField(upload_to=get_rendition_path)
+    width = models.IntegerField(default=0)
+    height = models.IntegerField(default=0)
+    size_bytes = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.size} ({self.width}x{self.height}) for {self.project_image}"
+
+    class Meta:
+        unique_together = [('project_image', 'size')]
 
 class ProcessingOperation(models.Model):
     """Modelo para registrar operaciones de procesamiento de imágenes"""
@@ -114,3 +185,63 @@ class ProcessingOperation(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Analíticas de telemetría: operaciones de un algoritmo en un intervalo de tiempo
+            models.Index(fields=['algorithm', 'timestamp'], name='api_operation_algo_time_idx'),
+            # Historial de operaciones de una imagen, de la más reciente a la más antigua
+            models.Index(fields=['project_image', '-timestamp'], name='api_operation_image_time_idx'),
+        ]
+
+class ProcessingJob(models.Model):
+    """
+    Trabajo de procesamiento en segundo plano. La propia tabla hace de cola:
+    los workers (manage.py process_jobs) reclaman los trabajos pendientes
+    por orden de llegada y guardan aquí el resultado.
+    """
+    KIND_PROCESS_IMAGE = 'process_image'
+    KIND_GENERATE_3D = 'generate_3d'
+    KIND_CHOICES = [
+        (KIND_PROCESS_IMAGE, 'Procesar imagen'),
+        (KIND_GENERATE_3D, 'Generar modelo 3D'),
+    ]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'En cola'),
+        (STATUS_RUNNING, 'En ejecución'),
+        (STATUS_SUCCEEDED, 'Completado'),
+        (STATUS_FAILED, 'Fallido'),
+        (STATUS_CANCELLED, 'Cancelado'),
+    ]
+    FINISHED_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+
+    project = models.ForeignKey(Project, related_name='jobs', on_delete=models.CASCADE)
+    project_image = models.ForeignKey(ProjectImage, related_name='jobs', on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    payload = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error_message = models.TextField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.id} ({self.kind}, {self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Reclamar el siguiente trabajo pendiente por orden de llegada
+            models.Index(fields=['status', 'created_at'], name='api_job_status_created_idx'),
+        ]
@@ -0,0 +1,76 @@
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(uploaded_at, image_id):
+    """Cursor opaco con la clave (uploaded_at, id) de la última imagen de una página"""
+    return base64.urlsafe_b64encode(f"{uploaded_at.isoformat()}|{image_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Inversa de encode_cursor
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    try:
+        uploaded_at, image_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        uploaded_at = parse_datetime(uploaded_at)
+        image_id = int(image_id)
+    except (ValueError, UnicodeError):
+        raise ValueError("Cursor no válido")
+    if uploaded_at is None:
+        raise ValueError("Cursor no válido")
+    return uploaded_at, image_id
+
+
+def parse_page_size(value):
+    """
+    Raises:
+        ValueError: Si value no es un entero positivo
+    """
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    if not str(value).isdigit() or int(value) < 1:
+        raise ValueError("'page_size' debe ser un entero mayor que 0")
+    return min(int(value), MAX_PAGE_SIZE)
+
+
+def keyset_page(images, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Página de imágenes de la más reciente a la más antigua, paginada por
+    clave (uploaded_at, id) en lugar de por desplazamiento
+
+    Cada página continúa donde terminó la anterior con un rango sobre el
+    índice (project, -uploaded_at, -id): cuesta lo mismo la primera página
+    que la última, y las imágenes subidas mientras tanto no desplazan las
+    siguientes páginas.
+
+    Args:
+        images: Queryset de ProjectImage
+        cursor: Cursor devuelto con la página anterior (None para la primera)
+        page_size: Número de imágenes por página
+
+    Returns:
+        Tuple de (lista de imágenes, cursor de la página siguiente o None)
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    images = images.order_by('-uploaded_at', '-id')
+    if cursor:
+        uploaded_at, image_id = decode_cursor(cursor)
+        images = images.filter(Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=image_id))
+
+    # Una fila de más indica si hay otra página sin necesidad de contar
+    page = list(images[:page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, encode_cursor(page[-1].uploaded_at, page[-1].id)
@@ -8,6 +8,14 @@ import math
 from pathlib import Path
 import time
 
+from vision.artifacts import ARTIFACT_EXTENSION, write_model_artifact
+from vision.classifier import analysis_classifier
+from vision.depth_primitives import BLEND_REPLACE, draw_elliptical_bump, draw_radial_bump
+from vision.encoding import FORMAT_JPEG, encode_image, format_extension, format_from_extension
+from vision.executor import run_stage
+from vision.lod import build_mesh_lods, lod_entries
+from vision.stages import mean_shift_filter
+
 # Configurar logging
 logger = logging.getLogger(__name__)
 
@@ -94,44 +102,12 @@ class ImageProcessor:
     def _detect_image_type(self, image):
         """
         Detecta automáticamente el tipo de imagen basado en su contenido
+        (clasificador por etapas sobre una copia reducida, memorizado por contenido)
         """
-        # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Usar diferentes detectores para identificar el tipo de contenido
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-        
-        # Detectar bordes
-        edges = cv2.Canny(gray, 50, 200)
-        edge_density = np.count_nonzero(edges) / (edges.shape[0] * edges.shape[1])
-        
-        # Detectar círculos
-        circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1.2, minDist=100,
-                                   param1=100, param2=30, minRadius=5, maxRadius=300)
-        
-        # Analizar resultados para determinar el tipo
-        if len(faces) > 0:
-            return "rostros"
-        elif circles is not None and len(circles[0]) > 5:
-            return "redondos"
-        elif edge_density > 0.2:  # Muchos bordes indican posibles circuitos o figuras geométricas
-            # Analizar si son patrones rectos (circuitos) o curvos (trigonometría)
-            lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=80, minLineLength=50, maxLineGap=10)
-            if lines is not None and len(lines) > 20:
-                return "circuitos"
-            else:
-                return "trigonometria"
-        else:
-            # Analizar el histograma para personas
-            hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
-            hist_norm = hist / hist.sum()
-            skin_range_sum = np.sum(hist_norm[70:150])  # Rango aproximado para tonos de piel
-            if skin_range_sum > 0.4:
-                return "personas"
-        
-        # Si no se puede determinar con certeza
-        return "general"
+        result = analysis_classifier.classify(image)
+        logger.info(f"Clasificación: {result.image_type} (etapa {result.stage}, "
+                    f"{result.total_ms:.1f} ms{', en caché' if result.cached else ''})")
+        return result.image_type
     
     def generate_3d_data(self, image_path, settings=None):
         """
@@ -146,6 +122,7 @@ class ImageProcessor:
                 - sensitivity: Sensibilidad de extracción (0-1)
                 - extraction_method: Método de extracción ('contour', 'segmentation', 'yolo')
                 - extrusion_scale: Escala de extrusión para el modelo 3D
+                - mesh_mode: Tipo de malla ('grid' uniforme o 'adaptive' por quadtree)
                 
         Returns:
             Diccionario con datos 3D (vértices, caras, normales, colores)
@@ -203,120 +180,48 @@ class ImageProcessor:
             elif image_type == "redondos":
                 depth_map = self._enhance_rounds_depth_map(image, depth_map)
             
-            # Calcular resolución basada en número de polígonos deseados
+            # Redimensionar mapa de profundidad e imagen según el número de polígonos deseados
             target_polygons = settings.get("polygons", 2000)
-            scale_factor = max(1, int(np.sqrt((gray.shape[0] * gray.shape[1]) / (target_polygons * 2))))
+            mesh_mode = settings.get("mesh_mode", "grid")
             
-            # Redimensionar mapa de profundidad
-            resized_depth = cv2.resize(depth_map, 
-                                      (gray.shape[1] // scale_factor, gray.shape[0] // scale_factor),
-                                      interpolation=cv2.INTER_AREA)
-            
-            # Aplicar efecto según el modo de color seleccionado
-            color_mode = settings.get("color_mode", "color")
-            if color_mode == "grayscale":
-                processed_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                processed_image = cv2.cvtColor(processed_image, cv2.COLOR_GRAY2BGR)
-            elif color_mode == "blueprint":
-                # Crea efecto blueprint (azul técnico)
-                processed_image = np.zeros_like(image)
-                processed_image[:,:,0] = 180  # Canal B (azul)
-                processed_image[:,:,1] = 30 + gray // 4  # Canal G
-                processed_image[:,:,2] = 5 + gray // 8   # Canal R
-            else:  # color (normal)
-                processed_image = image.copy()
-            
-            # Redimensionar la imagen procesada según el mapa de profundidad
-            processed_image_resized = cv2.resize(processed_image, 
-                                               (resized_depth.shape[1], resized_depth.shape[0]),
-                                               interpolation=cv2.INTER_AREA)
-            
-            # Generar vertices, caras, normales y colores
-            height, width = resized_depth.shape
-            vertices = []
-            faces = []
-            normals = []
-            colors = []
-            
-            # 1. Crear vértices
-            for y in range(height):
-                for x in range(width):
-                    # Normalizar coordenadas entre -1 y 1
-                    norm_x = (x / (width-1)) * 2 - 1
-                    norm_y = -((y / (height-1)) * 2 - 1)  # Y invertido
-                    
-                    # Aplicar escala de extrusión
-                    extrusion_scale = settings.get("extrusion_scale", 1.0)
-                    norm_z = resized_depth[y, x] * extrusion_scale
-                    
-                    vertices.append([norm_x, norm_y, norm_z])
-                    
-                    # Normales - calcular gradiente del mapa de profundidad
-                    if x > 0 and x < width-1 and y > 0 and y < height-1:
-                        dx = resized_depth[y, x+1] - resized_depth[y, x-1]
-                        dy = resized_depth[y+1, x] - resized_depth[y-1, x]
-                        normal = [-dx, -dy, 1.0]  # Vector normal aproximado
-                        length = math.sqrt(normal[0]**2 + normal[1]**2 + normal[2]**2)
-                        if length > 0:
-                            normal = [n/length for n in normal]
-                        else:
-                            normal = [0, 0, 1]
-                    else:
-                        normal = [0, 0, 1]  # Normal por defecto
-                    
-                    normals.append(normal)
-                    
-                    # Colores - extraer de la imagen procesada
-                    b, g, r = [float(c)/255.0 for c in processed_image_resized[y, x]]
-                    colors.append([r, g, b])  # RGB normalizado
-            
-            # 2. Crear caras (triángulos) - malla de triángulos
-            for y in range(height - 1):
-                for x in range(width - 1):
-                    # Índices de los vértices para cada cuadrado de la malla
-                    v0 = y * width + x
-                    v1 = y * width + (x + 1)
-                    v2 = (y + 1) * width + x
-                    v3 = (y + 1) * width + (x + 1)
-                    
-                    # Crear dos triángulos por cada cuadrado
-                    # Verificar que no haya cambios bruscos de profundidad (huecos en el modelo)
-                    depth_threshold = 0.2
-                    d0 = vertices[v0][2]
-                    d1 = vertices[v1][2]
-                    d2 = vertices[v2][2]
-                    d3 = vertices[v3][2]
-                    
-                    # Solo crear caras si la diferencia de profundidad no es muy grande
-                    if (abs(d0-d1) < depth_threshold and 
-                        abs(d1-d3) < depth_threshold and 
-                        abs(d3-d2) < depth_threshold and 
-                        abs(d2-d0) < depth_threshold):
-                        faces.append([v0, v1, v2])
-                        faces.append([v1, v3, v2])
+            # Generar vértices, normales, colores y caras aplicando extrusión y modo de color,
+            # junto con los niveles de detalle reducidos (1/4 y 1/16)
+            levels = run_stage(
+                build_mesh_lods,
+                depth_map,
+                image,
+                target_polygons,
+                mesh_mode=mesh_mode,
+                z_scale=settings.get("extrusion_scale", 1.0),
+                z_offset=0.0,
+                color_mode=settings.get("color_mode", "color"),
+                cull_extruded=True
+            )
+            mesh = levels[0][0]
             
             # Generar el objeto 3D completo
             model_3d = {
-                "vertices": vertices,
-                "faces": faces,
-                "normals": normals,
-                "colors": colors,
+                "vertices": mesh["vertices"].tolist(),
+                "faces": mesh["faces"].tolist(),
+                "normals": mesh["normals"].tolist(),
+                "colors": mesh["colors"].tolist(),
+                "lods": lod_entries(levels),
                 "metadata": {
-                    "vertices_count": len(vertices),
-                    "faces_count": len(faces),
+                    "vertices_count": len(mesh["vertices"]),
+                    "faces_count": len(mesh["faces"]),
+                    "lod_count": len(levels),
                     "image_path": os.path.basename(image_path),
                     "image_type": image_type,
+                    "mesh_mode": mesh_mode,
                     "processing_time": time.time() - start_time,
                     "settings": settings
                 }
             }
             
-            # Guardar el modelo 3D como archivo JSON
-            model_filename = f"model3d_{Path(image_path).stem}_{image_type}.json"
+            # Guardar el modelo 3D como artefacto comprimido (una sola escritura)
+            model_filename = f"model3d_{Path(image_path).stem}_{image_type}{ARTIFACT_EXTENSION}"
             model_path = os.path.join(self.models_dir, model_filename)
-            
-            with open(model_path, 'w') as f:
-                json.dump(model_3d, f)
+            write_model_artifact(model_path, model_3d["metadata"], [level[0] for level in levels])
             
             # Añadir ruta al resultado
             model_3d["file_path"] = model_path
@@ -382,7 +287,7 @@ class ImageProcessor:
         color_radius = int(10 + detail_level * 2)
         min_density = int(100 - detail_level * 8)
         
-        segmented = cv2.pyrMeanShiftFiltering(blur, spatial_radius, color_radius, min_density)
+        segmented = run_stage(mean_shift_filter, blur, spatial_radius, color_radius, min_density)
         segmented_gray = cv2.cvtColor(segmented, cv2.COLOR_BGR2GRAY)
         
         # Aplicar umbral adaptativo para destacar regiones
@@ -470,16 +375,8 @@ class ImageProcessor:
         face_mask = np.zeros_like(depth_map)
         
         for (x, y, w, h) in faces:
-            # Crear un gradiente radial para cada rostro
-            center_x, center_y = x + w//2, y + h//2
-            for i in range(y, y + h):
-                for j in range(x, x + w):
-                    # Calcular distancia normalizada al centro del rostro
-                    dist = np.sqrt(((j - center_x) / (w/2))**2 + ((i - center_y) / (h/2))**2)
-                    # Crear un abultamiento para el rostro (mayor en el centro)
-                    if dist < 1.0:
-                        boost = np.cos(dist * np.pi/2) * 0.5 + 0.5
-                        face_mask[i, j] = boost
+            # Abultamiento elíptico para cada rostro (mayor en el centro)
+            draw_elliptical_bump(face_mask, x, y, w, h, floor=0.5, blend=BLEND_REPLACE)
         
         # Combinar con el mapa de profundidad original
         enhanced_depth = depth_map * (1.0 - face_mask) + face_mask
@@ -530,26 +427,25 @@ class ImageProcessor:
         
         if circles is not None:
             circles = np.uint16(np.around(circles))
-            for i in circles[0, :]:
-                # Dibujar círculo con gradiente radial
-                center = (i[0], i[1])
-                radius = i[2]
-                for y in range(max(0, center[1]-radius), min(depth_map.shape[0], center[1]+radius+1)):
-                    for x in range(max(0, center[0]-radius), min(depth_map.shape[1], center[0]+radius+1)):
-                        dist = np.sqrt((x - center[0])**2 + (y - center[1])**2)
-                        if dist <= radius:
-                            # Crear un abultamiento para el círculo
-                            boost = np.cos(dist/radius * np.pi/2) * 0.5 + 0.5
-                            circle_mask[y, x] = max(circle_mask[y, x], boost)
+            for center_x, center_y, radius in circles[0, :]:
+                # Abultamiento con gradiente radial para cada círculo
+                draw_radial_bump(circle_mask, center_x, center_y, radius, floor=0.5)
         
         # Combinar con el mapa de profundidad original
         enhanced_depth = depth_map * (1.0 - circle_mask * 0.7) + circle_mask * 0.7
         
         return enhanced_depth
 
-    def apply_image_effect(self, image_path, effect, quality=80):
+    def apply_image_effect(self, image_path, effect, quality=80, output_format=None):
         """
         Aplica efectos visuales a una imagen
+
+        Args:
+            image_path: Ruta de la imagen
+            effect: Nombre del efecto
+            quality: Calidad de compresión (0-100)
+            output_format: 'jpeg', 'webp', 'avif' o 'png'; por defecto el
+                formato de la imagen original
         """
         try:
             # Cargar imagen
@@ -591,12 +487,14 @@ class ImageProcessor:
                 return {"error": f"Efecto no válido: {effect}"}
                 
             # Guardar imagen procesada
+            output_format = output_format or format_from_extension(Path(image_path).suffix) or FORMAT_JPEG
             output_dir = os.path.dirname(image_path)
-            output_filename = f"{Path(image_path).stem}_{effect}{Path(image_path).suffix}"
+            output_filename = f"{Path(image_path).stem}_{effect}{format_extension(output_format)}"
             output_path = os.path.join(output_dir, output_filename)
             
             # Guardar con compresión según calidad
-            cv2.imwrite(output_path, processed, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            with open(output_path, 'wb') as f:
+                f.write(encode_image(processed, output_format, quality=quality))
             
             return {
                 "success": True,
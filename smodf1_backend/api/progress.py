@@ -0,0 +1,92 @@
+import json
+import queue
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Segundos sin eventos tras los que se envía un comentario para mantener viva la conexión
+SSE_HEARTBEAT_SECONDS = 15
+
+
+class PipelineCancelled(BaseException):
+    """
+    Se pidió cancelar el pipeline
+
+    Hereda de BaseException (como asyncio.CancelledError) para que los
+    'except Exception' que protegen cada etapa no la absorban.
+    """
+
+
+class PipelineProgress:
+    """
+    Progreso de un pipeline: comprueba la cancelación en cada evento
+
+    Esta versión descarta los eventos; la usan los workers, que solo
+    necesitan saber si deben detenerse.
+
+    Args:
+        is_cancelled: Función sin argumentos que indica si se pidió cancelar
+            (por ejemplo consultando el estado del trabajo)
+    """
+
+    # Si los eventos deben incluir artefactos intermedios (vistas previas)
+    wants_artifacts = False
+
+    def __init__(self, is_cancelled=None):
+        self._is_cancelled = is_cancelled
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        if not self._cancel.is_set() and self._is_cancelled and self._is_cancelled():
+            self._cancel.set()
+        return self._cancel.is_set()
+
+    def check(self):
+        """Lanza PipelineCancelled si se pidió cancelar"""
+        if self.cancelled:
+            raise PipelineCancelled()
+
+    def emit(self, event, **data):
+        self.check()
+
+
+class StreamingProgress(PipelineProgress):
+    """
+    Progreso que se envía a un cliente como server-sent events
+
+    El pipeline se ejecuta en otro hilo y publica los eventos con emit();
+    stream() los entrega en formato SSE a medida que llegan.
+    """
+
+    wants_artifacts = True
+
+    def __init__(self, is_cancelled=None):
+        super().__init__(is_cancelled)
+        self._queue = queue.Queue()
+
+    def emit(self, event, **data):
+        self.check()
+        self._queue.put((event, data))
+
+    def finish(self, event, **data):
+        """Publica el evento final (sin comprobar la cancelación) y cierra el stream"""
+        self._queue.put((event, data))
+        self._queue.put(None)
+
+    def stream(self):
+        event_id = 0
+        while True:
+            try:
+                item = self._queue.get(timeout=SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if item is None:
+                return
+            event, data = item
+            event_id += 1
+            yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
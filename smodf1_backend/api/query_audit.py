@@ -0,0 +1,111 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+# Acciones de ProjectViewSet que se auditan: solo las de lectura, que se
+# pueden ejecutar sin modificar datos ni procesar imágenes
+AUDITED_ACTIONS = (
+    ('list', False),
+    ('retrieve', True),
+    ('get_statistics', True),
+    ('dashboard', False),
+    ('get_3d_models', True),
+    ('get_3d_mesh', True),
+    ('export_glb', True),
+    ('list_images', True),
+)
+
+EXPLAIN_PREFIX = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+# SQLite: "SCAN api_projectimage" recorre la tabla; "SCAN ... USING INDEX" recorre un índice
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(?P<table>\w+)(?P<rest>.*)$')
+# PostgreSQL: "Seq Scan on api_projectimage"
+POSTGRESQL_SCAN = re.compile(r'Seq Scan on (?P<table>\w+)')
+
+
+def explain(sql, using=connection):
+    """
+    Plan de ejecución de una consulta ya con sus parámetros
+
+    Returns:
+        Lista de líneas del plan
+    """
+    with using.cursor() as cursor:
+        cursor.execute(EXPLAIN_PREFIX.get(using.vendor, 'EXPLAIN ') + sql)
+        rows = cursor.fetchall()
+    # SQLite devuelve (id, parent, notused, detail); PostgreSQL una columna de texto
+    return [str(row[-1]) for row in rows]
+
+
+def full_scans(plan, vendor, tables=None):
+    """
+    Tablas que el plan recorre enteras (vacío para los motores no soportados)
+
+    Args:
+        plan: Líneas devueltas por explain
+        vendor: Motor de base de datos ('sqlite', 'postgresql')
+        tables: Tablas existentes; los recorridos de subconsultas (en SQLite
+            "SCAN qualify", "SCAN (subquery-1)") no cuentan
+
+    Returns:
+        Lista de nombres de tabla
+    """
+    scanned = []
+    for line in plan:
+        line = line.strip()
+        if vendor == 'sqlite':
+            match = SQLITE_SCAN.match(line)
+            if match and 'USING' not in match.group('rest'):
+                scanned.append(match.group('table'))
+        elif vendor == 'postgresql':
+            match = POSTGRESQL_SCAN.search(line)
+            if match:
+                scanned.append(match.group('table'))
+    return [table for table in scanned if tables is None or table in tables]
+
+
+def capture_action_queries(viewset, action, project, params=None):
+    """
+    Ejecuta una acción GET del viewset sobre el proyecto y devuelve las
+    consultas que ha hecho
+
+    Returns:
+        Tuple de (código de estado de la respuesta, lista de SQL)
+    """
+    detail = dict(AUDITED_ACTIONS).get(action, True)
+    view = viewset.as_view({'get': action})
+    # Host permitido por ALLOWED_HOSTS: RequestFactory usa 'testserver' por defecto
+    host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+    request = RequestFactory(HTTP_HOST=host).get('/', params or {})
+    with CaptureQueriesContext(connection) as queries:
+        response = view(request, pk=project.pk) if detail else view(request)
+        # Las respuestas en streaming ejecutan sus consultas al consumirse
+        if getattr(response, 'streaming', False):
+            for _ in response.streaming_content:
+                pass
+        elif hasattr(response, 'render'):
+            response.render()
+    return response.status_code, [query['sql'] for query in queries.captured_queries]
+
+
+def audit_queries(sqls, using=connection):
+    """
+    Plan de cada consulta SELECT y tablas que recorre enteras
+
+    Returns:
+        Lista de diccionarios {'sql', 'plan', 'full_scans'}
+    """
+    tables = set(using.introspection.table_names())
+    results = []
+    for sql in sqls:
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        plan = explain(sql, using)
+        results.append({'sql': sql, 'plan': plan, 'full_scans': full_scans(plan, using.vendor, tables)})
+    return results
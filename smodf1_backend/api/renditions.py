@@ -0,0 +1,166 @@
+import logging
+import os
+
+import cv2
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from vision.encoding import FORMAT_JPEG, FORMAT_WEBP, QUALITY_TIERS, TIER_STANDARD, available_formats, encode_image, format_extension
+from .models import ImageRendition
+
+logger = logging.getLogger(__name__)
+
+# Lado mayor, en píxeles, de cada versión reducida (IMAGE_RENDITION_SIZES en settings)
+DEFAULT_RENDITION_SIZES = {
+    ImageRendition.SIZE_PREVIEW: 1024,
+    ImageRendition.SIZE_THUMB: 256,
+}
+
+# Nombre con el que se expone el original junto a las versiones reducidas
+RENDITION_FULL = 'full'
+
+
+def rendition_sizes():
+    return getattr(settings, 'IMAGE_RENDITION_SIZES', DEFAULT_RENDITION_SIZES)
+
+
+def build_image_pyramid(image, sizes):
+    """
+    Reduce una imagen a varios tamaños, del mayor al menor
+
+    Cada nivel se calcula a partir del anterior: INTER_AREA sobre una
+    imagen ya reducida cuesta una fracción de hacerlo desde el original.
+    No se amplía: se omiten los tamaños mayores que la imagen.
+
+    Args:
+        image: Imagen decodificada
+        sizes: Diccionario {nombre: lado mayor}
+
+    Returns:
+        Lista de tuplas (nombre, imagen reducida)
+    """
+    levels = []
+    current = image
+    for name, max_side in sorted(sizes.items(), key=lambda item: -item[1]):
+        height, width = current.shape[:2]
+        scale = max_side / max(height, width)
+        if scale >= 1.0:
+            continue
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        current = cv2.resize(current, size, interpolation=cv2.INTER_AREA)
+        levels.append((name, current))
+    return levels
+
+
+def generate_renditions(project_image, image=None):
+    """
+    Genera la miniatura y la vista previa de una imagen subida
+
+    La imagen se decodifica una sola vez; de la misma lectura salen las
+    dimensiones y el tamaño del original, que se guardan en project_image.
+    Sustituye las versiones anteriores, si las había.
+
+    Args:
+        project_image: Instancia de ProjectImage ya guardada
+        image: Imagen ya decodificada (opcional, para no leerla otra vez)
+
+    Returns:
+        Lista de ImageRendition creadas
+    """
+    path = project_image.image.path
+    if image is None:
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError(f"No se pudo leer la imagen: {path}")
+
+    fmt = getattr(settings, 'IMAGE_RENDITION_FORMAT', FORMAT_WEBP)
+    if fmt not in available_formats():
+        fmt = FORMAT_JPEG
+    tier = getattr(settings, 'IMAGE_RENDITION_QUALITY', TIER_STANDARD)
+    if tier not in QUALITY_TIERS:
+        tier = TIER_STANDARD
+
+    stem = os.path.splitext(os.path.basename(project_image.image.name))[0]
+    renditions = []
+    for name, resized in build_image_pyramid(image, rendition_sizes()):
+        payload = encode_image(resized, fmt, tier)
+        rendition = ImageRendition(
+            project_image=project_image,
+            size=name,
+            width=resized.shape[1],
+            height=resized.shape[0],
+            size_bytes=len(payload)
+        )
+        rendition.file.save(f"{stem}_{name}{format_extension(fmt)}", ContentFile(payload), save=False)
+        renditions.append(rendition)
+
+    project_image.image_height, project_image.image_width = image.shape[:2]
+    project_image.file_size = os.path.getsize(path)
+
+    previous = list(project_image.renditions.all())
+    with transaction.atomic():
+        project_image.renditions.all().delete()
+        ImageRendition.objects.bulk_create(renditions)
+        project_image.save(update_fields=['image_width', 'image_height', 'file_size'])
+
+    current_names = {rendition.file.name for rendition in renditions}
+    for rendition in previous:
+        if rendition.file.name not in current_names:
+            try:
+                rendition.file.delete(save=False)
+            except OSError as e:
+                logger.warning(f"No se pudo eliminar {rendition.file.name}: {str(e)}")
+    return renditions
+
+
+def generate_upload_renditions(project_image):
+    """
+    Etapa posterior a la subida: genera las versiones reducidas sin hacer
+    fallar la subida si la imagen no se puede leer
+    """
+    try:
+        return generate_renditions(project_image)
+    except Exception as e:
+        logger.warning(f"No se pudieron generar las versiones de la imagen {project_image.id}: {str(e)}")
+        return []
+
+
+def rendition_entries(project_image, build_url=None):
+    """
+    URL, dimensiones y tamaño de cada versión de la imagen
+
+    'full' es el original. Los tamaños sin versión propia (imágenes más
+    pequeñas que ese tamaño, o subidas antes de generarse las versiones)
+    apuntan al original.
+
+    Args:
+        project_image: ProjectImage, idealmente con prefetch_related('renditions')
+        build_url: Función que convierte una URL relativa en absoluta (opcional)
+
+    Returns:
+        Diccionario {tamaño: {'url', 'width', 'height', 'size_bytes'}}
+    """
+    if not project_image.image:
+        return {}
+    build_url = build_url or (lambda url: url)
+
+    full = {
+        'url': build_url(project_image.image.url),
+        'width': project_image.image_width,
+        'height': project_image.image_height,
+        'size_bytes': project_image.file_size,
+    }
+    entries = {
+        rendition.size: {
+            'url': build_url(rendition.file.url),
+            'width': rendition.width,
+            'height': rendition.height,
+            'size_bytes': rendition.size_bytes,
+        }
+        for rendition in project_image.renditions.all()
+    }
+    for name in rendition_sizes():
+        entries.setdefault(name, full)
+    entries[RENDITION_FULL] = full
+    return entries
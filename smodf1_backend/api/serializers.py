@@ -1,16 +1,100 @@
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Project, ProjectImage
+from .models import ProcessingJob, Project, ProjectImage
+from .renditions import rendition_entries
+
+# Columnas JSON pesadas de ProjectImage: no se cargan en los listados salvo que se pidan
+HEAVY_IMAGE_FIELDS = ('analysis_results', 'data_3d')
+
+class DynamicFieldsMixin:
+    """
+    Permite limitar los campos serializados con el argumento fields
+    (por ejemplo a partir del parámetro ?fields= de la petición)
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+class ProjectImageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    # URL y dimensiones de la miniatura, la vista previa y el original ('thumb', 'preview', 'full')
+    renditions = serializers.SerializerMethodField()
 
-class ProjectImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProjectImage
-        fields = ['id', 'project', 'image', 'processed_image', 'uploaded_at', 'processed', 'analysis_results', 'has_3d_data', 'data_3d', 'image_width', 'image_height', 'file_size']
+        fields = ['id', 'project', 'image', 'processed_image', 'uploaded_at', 'processed', 'analysis_results', 'has_3d_data', 'data_3d', 'image_width', 'image_height', 'file_size', 'renditions']
         read_only_fields = ['processed', 'processed_image', 'analysis_results', 'has_3d_data', 'data_3d', 'uploaded_at']
 
-class ProjectSerializer(serializers.ModelSerializer):
+    def get_renditions(self, obj):
+        request = self.context.get('request')
+        return rendition_entries(obj, request.build_absolute_uri if request else None)
+
+# Campos de imagen que se devuelven en los listados por defecto
+LIGHT_IMAGE_FIELDS = [name for name in ProjectImageSerializer.Meta.fields if name not in HEAVY_IMAGE_FIELDS]
+
+class ProjectSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     images = ProjectImageSerializer(many=True, read_only=True)
 
     class Meta:
         model = Project
         fields = ['id', 'name', 'description', 'created_at', 'updated_at', 'user', 'images']
-        read_only_fields = ['created_at', 'updated_at', 'user'] 
\ No newline at end of file
+        read_only_fields = ['created_at', 'updated_at', 'user']
+
+    def __init__(self, *args, **kwargs):
+        image_fields = kwargs.pop('image_fields', None)
+        super().__init__(*args, **kwargs)
+
+        if image_fields is not None and 'images' in self.fields:
+            self.fields['images'] = ProjectImageSerializer(many=True, read_only=True, fields=image_fields)
+
+class ProjectListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Representación ligera para listar proyectos: las imágenes solo se incluyen
+    con ?expand=images y sin las columnas JSON pesadas salvo que se pidan
+    """
+    image_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Project
+        fields = ['id', 'name', 'description', 'created_at', 'updated_at', 'user', 'image_count']
+        read_only_fields = fields
+
+    def __init__(self, *args, **kwargs):
+        image_fields = kwargs.pop('image_fields', None)
+        super().__init__(*args, **kwargs)
+
+        if image_fields is not None:
+            self.fields['images'] = ProjectImageSerializer(many=True, read_only=True, fields=image_fields)
+class ProcessingJobSerializer(serializers.ModelSerializer):
+    """
+    Estado de un trabajo en segundo plano; el resultado se obtiene aparte
+    en result_url cuando el trabajo termina
+    """
+    job_id = serializers.IntegerField(source='id', read_only=True)
+    image_id = serializers.IntegerField(source='project_image_id', read_only=True)
+    status_url = serializers.SerializerMethodField()
+    result_url = serializers.SerializerMethodField()
+    cancel_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProcessingJob
+        fields = ['job_id', 'project', 'image_id', 'kind', 'status', 'attempts', 'error_message',
+                  'created_at', 'started_at', 'finished_at', 'status_url', 'result_url', 'cancel_url']
+        read_only_fields = fields
+
+    def _url(self, name, obj):
+        url = reverse(name, args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_status_url(self, obj):
+        return self._url('job-detail', obj)
+
+    def get_result_url(self, obj):
+        return self._url('job-result', obj)
+
+    def get_cancel_url(self, obj):
+        return self._url('job-cancel', obj)
@@ -0,0 +1,29 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .mesh_store import release_mesh_files
+from .models import Mesh, Project, ProjectImage
+from .statistics import invalidate_statistics
+
+
+@receiver([post_save, post_delete], sender=ProjectImage)
+def project_image_changed(sender, instance, **kwargs):
+    """Cualquier escritura de una imagen invalida las estadísticas de su proyecto"""
+    invalidate_statistics([instance.project_id])
+
+
+@receiver([post_save, post_delete], sender=Project)
+def project_changed(sender, instance, **kwargs):
+    invalidate_statistics([instance.id])
+
+
+@receiver(post_delete, sender=Mesh)
+def mesh_deleted(sender, instance, **kwargs):
+    """
+    Libera el archivo de la malla al confirmar el borrado, también cuando la
+    fila cae en cascada con su imagen o su proyecto
+    """
+    transaction.on_commit(partial(release_mesh_files, [instance.content_hash]))
@@ -0,0 +1,198 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, IntegerField, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import ProjectImage
+
+# Percentiles del tiempo de procesamiento que se devuelven (método del rango más cercano)
+PERCENTILES = (50, 95)
+
+STATISTICS_CACHE_PREFIX = 'statistics'
+DASHBOARD_CACHE_KEY = f'{STATISTICS_CACHE_PREFIX}:dashboard'
+
+
+def project_cache_key(project_id):
+    return f'{STATISTICS_CACHE_PREFIX}:project:{project_id}'
+
+
+def statistics_cache():
+    """Caché de las estadísticas (STATISTICS_CACHE_ALIAS en settings)"""
+    return caches[getattr(settings, 'STATISTICS_CACHE_ALIAS', 'default')]
+
+
+def cache_timeout():
+    # Las escrituras de imágenes invalidan la caché; el tiempo máximo cubre
+    # las actualizaciones en bloque que no pasan por las señales
+    return getattr(settings, 'STATISTICS_CACHE_TIMEOUT', 300)
+
+
+def processing_duration(prefix=''):
+    return ExpressionWrapper(F(f'{prefix}processing_completed') - F(f'{prefix}processing_started'),
+                             output_field=DurationField())
+
+
+def timed_filter(prefix=''):
+    """Imágenes procesadas con las dos marcas de tiempo"""
+    return Q(**{
+        f'{prefix}processed': True,
+        f'{prefix}processing_started__isnull': False,
+        f'{prefix}processing_completed__isnull': False,
+    })
+
+
+def statistics_aggregates(prefix=''):
+    """
+    Agregados de las estadísticas de imágenes
+
+    Args:
+        prefix: Ruta hasta ProjectImage ('images__' para anotar proyectos)
+
+    Returns:
+        Diccionario de expresiones para aggregate() o annotate()
+    """
+    return {
+        'total_images': Count(f'{prefix}id'),
+        'processed_images': Count(f'{prefix}id', filter=Q(**{f'{prefix}processed': True})),
+        'images_with_3d': Count(f'{prefix}id', filter=Q(**{f'{prefix}has_3d_data': True})),
+        'timed_images': Count(f'{prefix}id', filter=timed_filter(prefix)),
+        'avg_duration': Avg(processing_duration(prefix), filter=timed_filter(prefix)),
+    }
+
+
+def percentile_rank(percentile, count):
+    """Posición (desde 1) del percentil en count valores ordenados: ceil(percentile * count / 100)"""
+    return (percentile * count + 99) // 100
+
+
+def window_percentiles(queryset, value, group_by=None, percentiles=PERCENTILES):
+    """
+    Percentiles de value calculados en la base de datos (rango más cercano)
+
+    Una sola consulta numera los valores de cada grupo con funciones de
+    ventana y devuelve solo las filas que ocupan la posición de algún
+    percentil (como mucho len(percentiles) por grupo).
+
+    Args:
+        queryset: Filas sobre las que calcular los percentiles
+        value: Expresión a ordenar (por ejemplo F('execution_time_ms'))
+        group_by: Campo por el que agrupar ('project_id'), o None para el total
+        percentiles: Percentiles a devolver (1-100)
+
+    Returns:
+        Diccionario {grupo: {percentil: valor}}; el grupo es None sin group_by
+    """
+    partition = [F(group_by)] if group_by else None
+    ranked = queryset.annotate(percentile_value=value).annotate(
+        position=Window(RowNumber(), partition_by=partition, order_by=F('percentile_value').asc()),
+        group_size=Window(Count('pk'), partition_by=partition),
+    )
+
+    at_percentile = Q()
+    for percentile in percentiles:
+        rank = ExpressionWrapper((F('group_size') * percentile + 99) / 100, output_field=IntegerField())
+        at_percentile |= Q(position=rank)
+
+    fields = ['percentile_value', 'position', 'group_size'] + ([group_by] if group_by else [])
+    result = {}
+    for row in ranked.filter(at_percentile).order_by().values(*fields):
+        group = result.setdefault(row[group_by] if group_by else None, {})
+        for percentile in percentiles:
+            if row['position'] == percentile_rank(percentile, row['group_size']):
+                group[percentile] = row['percentile_value']
+    return result
+
+
+def duration_percentiles(images, group_by=None):
+    """
+    Percentiles del tiempo de procesamiento de las imágenes
+
+    Returns:
+        Diccionario {grupo: {percentil: timedelta}}
+    """
+    return window_percentiles(images.filter(timed_filter()), processing_duration(), group_by)
+
+
+def seconds(duration):
+    return round(duration.total_seconds(), 2) if duration is not None else 0
+
+
+def format_statistics(values, percentiles):
+    """Respuesta de estadísticas a partir de los agregados y los percentiles"""
+    statistics = {
+        'total_images': values['total_images'],
+        'processed_images': values['processed_images'],
+        'pending_images': values['total_images'] - values['processed_images'],
+        'images_with_3d': values['images_with_3d'],
+        'avg_processing_time': seconds(values['avg_duration']),
+    }
+    for percentile in PERCENTILES:
+        statistics[f'p{percentile}_processing_time'] = seconds(percentiles.get(percentile))
+    return statistics
+
+
+def project_statistics(project):
+    """
+    Estadísticas de un proyecto: una consulta de agregados y otra para los
+    percentiles, guardadas en caché hasta la siguiente escritura de sus imágenes
+    """
+    key = project_cache_key(project.id)
+    statistics = statistics_cache().get(key)
+    if statistics is None:
+        images = ProjectImage.objects.filter(project=project)
+        values = images.aggregate(**statistics_aggregates())
+        percentiles = duration_percentiles(images).get(None, {})
+        statistics = format_statistics(values, percentiles)
+        statistics_cache().set(key, statistics, cache_timeout())
+    return dict(statistics, last_updated=project.updated_at)
+
+
+def dashboard_statistics(projects):
+    """
+    Estadísticas de varios proyectos y del conjunto
+
+    Tres consultas sin importar el número de proyectos: los agregados por
+    proyecto (GROUP BY), los percentiles de todos los proyectos a la vez y
+    los del conjunto. Los totales se suman a partir de las filas por proyecto.
+
+    Args:
+        projects: Queryset de Project
+    """
+    data = statistics_cache().get(DASHBOARD_CACHE_KEY)
+    if data is not None:
+        return data
+
+    rows = list(
+        projects.order_by('-updated_at')
+        .annotate(**statistics_aggregates('images__'))
+        .values('id', 'name', 'updated_at', *statistics_aggregates().keys())
+    )
+    images = ProjectImage.objects.filter(project__in=projects)
+    percentiles = duration_percentiles(images, group_by='project_id')
+
+    totals = {key: sum(row[key] for row in rows) for key in ('total_images', 'processed_images', 'images_with_3d', 'timed_images')}
+    # Media global ponderada por las imágenes con tiempo de cada proyecto
+    timed_rows = [row for row in rows if row['avg_duration'] is not None]
+    totals['avg_duration'] = (
+        sum((row['avg_duration'] * row['timed_images'] for row in timed_rows), timedelta()) / totals['timed_images']
+        if totals['timed_images'] else None
+    )
+
+    data = {
+        'projects': [
+            dict(format_statistics(row, percentiles.get(row['id'], {})),
+                 id=row['id'], name=row['name'], last_updated=row['updated_at'])
+            for row in rows
+        ],
+        'totals': dict(format_statistics(totals, duration_percentiles(images).get(None, {})),
+                       project_count=len(rows)),
+    }
+    statistics_cache().set(DASHBOARD_CACHE_KEY, data, cache_timeout())
+    return data
+
+
+def invalidate_statistics(project_ids=()):
+    """Descarta las estadísticas en caché de los proyectos indicados y del panel"""
+    statistics_cache().delete_many([DASHBOARD_CACHE_KEY] + [project_cache_key(project_id) for project_id in project_ids])
@@ -0,0 +1,174 @@
+from django.db.models import Avg, Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+
+from .models import ProcessingOperation
+from .statistics import window_percentiles
+
+# Límites superiores (en ms) de los intervalos del histograma de latencia;
+# el último intervalo no tiene límite
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+LATENCY_PERCENTILES = (50, 95, 99)
+
+# Granularidad del rendimiento a lo largo del tiempo
+THROUGHPUT_INTERVALS = {
+    'minute': TruncMinute,
+    'hour': TruncHour,
+    'day': TruncDay,
+}
+
+
+def filter_operations(since=None, until=None, algorithm=None, project_id=None, success=None):
+    """
+    Operaciones registradas en un intervalo de tiempo
+
+    Filtrar por algoritmo y fecha usa el índice (algorithm, timestamp).
+
+    Returns:
+        Queryset de ProcessingOperation sin ordenar
+    """
+    operations = ProcessingOperation.objects.order_by()
+    if algorithm:
+        operations = operations.filter(algorithm=algorithm)
+    if since:
+        operations = operations.filter(timestamp__gte=since)
+    if until:
+        operations = operations.filter(timestamp__lt=until)
+    if project_id:
+        operations = operations.filter(project_image__project_id=project_id)
+    if success is not None:
+        operations = operations.filter(success=success)
+    return operations
+
+
+def latency_bucket_aggregates():
+    """Un COUNT filtrado por cada intervalo del histograma"""
+    aggregates = {}
+    lower = None
+    for index, upper in enumerate(LATENCY_BUCKETS_MS + (None,)):
+        condition = Q()
+        if lower is not None:
+            condition &= Q(execution_time_ms__gte=lower)
+        if upper is not None:
+            condition &= Q(execution_time_ms__lt=upper)
+        aggregates[f'bucket_{index}'] = Count('id', filter=condition)
+        lower = upper
+    return aggregates
+
+
+def latency_by_algorithm(operations):
+    """
+    Latencia de cada algoritmo: contadores, media, extremos, percentiles
+    e histograma
+
+    Dos consultas: los agregados e intervalos del histograma agrupados por
+    algoritmo y los percentiles de todos los algoritmos a la vez.
+
+    Returns:
+        Lista de diccionarios, uno por algoritmo
+    """
+    rows = (
+        operations.values('algorithm')
+        .annotate(
+            operations=Count('id'),
+            failures=Count('id', filter=Q(success=False)),
+            avg_ms=Avg('execution_time_ms'),
+            min_ms=Min('execution_time_ms'),
+            max_ms=Max('execution_time_ms'),
+            **latency_bucket_aggregates()
+        )
+        .order_by('algorithm')
+    )
+    percentiles = window_percentiles(operations, F('execution_time_ms'), 'algorithm', LATENCY_PERCENTILES)
+
+    result = []
+    for row in rows:
+        entry = {
+            'algorithm': row['algorithm'],
+            'operations': row['operations'],
+            'failures': row['failures'],
+            'avg_ms': round(row['avg_ms'] or 0, 2),
+            'min_ms': row['min_ms'],
+            'max_ms': row['max_ms'],
+        }
+        algorithm_percentiles = percentiles.get(row['algorithm'], {})
+        for percentile in LATENCY_PERCENTILES:
+            entry[f'p{percentile}_ms'] = algorithm_percentiles.get(percentile)
+        entry['histogram'] = [
+            {'le_ms': upper, 'count': row[f'bucket_{index}']}
+            for index, upper in enumerate(LATENCY_BUCKETS_MS + (None,))
+        ]
+        result.append(entry)
+    return result
+
+
+def throughput_over_time(operations, interval='hour'):
+    """
+    Operaciones por intervalo de tiempo y algoritmo
+
+    busy_ms es el tiempo de ejecución acumulado en el intervalo: dividido
+    por la duración del intervalo da los procesadores ocupados de media.
+
+    Args:
+        interval: 'minute', 'hour' o 'day'
+
+    Returns:
+        Lista de diccionarios ordenada por intervalo y algoritmo
+    """
+    trunc = THROUGHPUT_INTERVALS[interval]
+    rows = (
+        operations.annotate(bucket=trunc('timestamp'))
+        .values('bucket', 'algorithm')
+        .annotate(
+            operations=Count('id'),
+            failures=Count('id', filter=Q(success=False)),
+            avg_ms=Avg('execution_time_ms'),
+            busy_ms=Sum('execution_time_ms'),
+        )
+        .order_by('bucket', 'algorithm')
+    )
+    return [
+        {
+            'bucket': row['bucket'],
+            'algorithm': row['algorithm'],
+            'operations': row['operations'],
+            'failures': row['failures'],
+            'avg_ms': round(row['avg_ms'] or 0, 2),
+            'busy_ms': row['busy_ms'] or 0,
+        }
+        for row in rows
+    ]
+
+
+def slowest_parameters(operations, limit=10, min_operations=1):
+    """
+    Combinaciones de algoritmo y parámetros con mayor latencia media
+
+    Args:
+        limit: Número de combinaciones a devolver
+        min_operations: Ignorar las combinaciones con menos ejecuciones
+
+    Returns:
+        Lista de diccionarios de la más lenta a la más rápida
+    """
+    rows = (
+        operations.values('algorithm', 'parameters')
+        .annotate(
+            operations=Count('id'),
+            avg_ms=Avg('execution_time_ms'),
+            max_ms=Max('execution_time_ms'),
+            total_ms=Sum('execution_time_ms'),
+        )
+        .filter(operations__gte=min_operations)
+        .order_by('-avg_ms')[:limit]
+    )
+    return [
+        {
+            'algorithm': row['algorithm'],
+            'parameters': row['parameters'],
+            'operations': row['operations'],
+            'avg_ms': round(row['avg_ms'] or 0, 2),
+            'max_ms': row['max_ms'],
+            'total_ms': row['total_ms'],
+        }
+        for row in rows
+    ]
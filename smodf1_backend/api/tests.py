@@ -1,3 +1,275 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from unittest import mock
+
+import cv2
+import numpy as np
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .jobs import JOB_HANDLERS, STREAM_WORKER_PREFIX, cancel_job, claim_next_job, requeue_stale_jobs, run_job, start_job
+from .mesh_store import mesh_storage_name, release_mesh_files, save_model_3d
+from .models import Mesh, ProcessingJob, Project, ProjectImage
+from .statistics import project_statistics
+from .views import process_image_internal
+
+
+def grid_model(size=3):
+    """Modelo 3D serializado (listas JSON) de una rejilla de size x size vértices"""
+    vertices = [[float(x), float(y), 0.0] for y in range(size) for x in range(size)]
+    faces = []
+    for y in range(size - 1):
+        for x in range(size - 1):
+            i = y * size + x
+            faces += [[i, i + 1, i + size], [i + 1, i + size + 1, i + size]]
+    return {
+        "vertices": vertices,
+        "faces": faces,
+        "normals": [[0.0, 0.0, 1.0]] * len(vertices),
+        "colors": [[0.5, 0.5, 0.5]] * len(vertices),
+    }
+
+
+class Update3DModelTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+        self.client = APIClient()
+        self.project = Project.objects.create(name="Proyecto")
+        self.image = ProjectImage.objects.create(project=self.project, image="project_1/imagen.jpg")
+
+        model_3d = dict(grid_model(5), metadata={"vertices_count": 25}, lods=[dict(grid_model(3), lod=1)])
+        save_model_3d(self.image, model_3d)
+        self.image.save()
+
+    def test_saving_retrieved_data_3d_keeps_meshes(self):
+        """Guardar el data_3d devuelto por la API (sin geometría) no borra las mallas"""
+        data_3d = self.client.get(f"/api/projects/{self.project.id}/").data["images"][0]["data_3d"]
+        self.assertNotIn("vertices", data_3d)
+
+        response = self.client.post(f"/api/projects/{self.project.id}/update_3d_model/", {
+            "image_id": self.image.id,
+            "model_data": data_3d,
+            "settings": {"polygons": 500},
+        }, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        self.image.refresh_from_db()
+        self.assertEqual(Mesh.objects.filter(project_image=self.image).count(), 2)
+        self.assertEqual(len(self.image.data_3d["meshes"]), 2)
+        self.assertEqual(self.image.data_3d["metadata"]["settings"], {"polygons": 500})
+
+        response = self.client.get(f"/api/projects/{self.project.id}/mesh/", {"image_id": self.image.id})
+        self.assertEqual(response.status_code, 200)
+
+    def test_model_data_without_geometry_or_settings_is_rejected(self):
+        response = self.client.post(f"/api/projects/{self.project.id}/update_3d_model/", {
+            "image_id": self.image.id,
+            "model_data": {"meshes": []},
+        }, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Mesh.objects.filter(project_image=self.image).count(), 2)
+
+    def test_get_3d_models_inlines_selected_lod(self):
+        models = self.client.get(f"/api/projects/{self.project.id}/get_3d_models/", {"lod": 1}).data
+        self.assertEqual(len(models[0]["data_3d"]["vertices"]), 9)
+        models = self.client.get(f"/api/projects/{self.project.id}/get_3d_models/").data
+        self.assertEqual(len(models[0]["data_3d"]["vertices"]), 25)
+
+
+class MeshFileTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+        self.project = Project.objects.create(name="Proyecto")
+        self.first = ProjectImage.objects.create(project=self.project, image="project_1/a.jpg")
+        self.second = ProjectImage.objects.create(project=self.project, image="project_1/b.jpg")
+
+    def save_model(self, project_image, model_3d):
+        with self.captureOnCommitCallbacks(execute=True):
+            save_model_3d(project_image, model_3d)
+            project_image.save()
+        return default_storage.path(mesh_storage_name(project_image.data_3d["meshes"][0]["content_hash"]))
+
+    def test_deleting_image_releases_unshared_blobs(self):
+        shared = self.save_model(self.first, grid_model(3))
+        self.save_model(self.second, grid_model(3))
+        own = self.save_model(self.first, grid_model(4))
+        self.assertTrue(os.path.exists(shared))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.delete()
+        self.assertFalse(os.path.exists(own))
+        self.assertTrue(os.path.exists(shared))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.delete()
+        self.assertFalse(os.path.exists(shared))
+        self.assertEqual(os.listdir(os.path.dirname(shared)), [])
+
+    def test_blob_released_before_commit_is_written_again(self):
+        path = self.save_model(self.first, grid_model(3))
+        with self.captureOnCommitCallbacks(execute=True):
+            save_model_3d(self.second, grid_model(3))
+            self.second.save()
+            # Otra imagen libera el archivo cuando aún no ve las filas nuevas
+            os.remove(path)
+        self.assertTrue(os.path.exists(path))
+
+    def test_release_keeps_referenced_blobs(self):
+        path = self.save_model(self.first, grid_model(3))
+        release_mesh_files([self.first.data_3d["meshes"][0]["content_hash"]])
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(os.listdir(os.path.dirname(path)), [os.path.basename(path)])
+
+
+class ProjectListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name="Proyecto")
+        for name in ("a", "b", "c"):
+            ProjectImage.objects.create(project=self.project, image=f"project_1/{name}.jpg")
+
+    def test_images_limit_expands_latest_image_only(self):
+        response = self.client.get("/api/projects/", {
+            "expand": "images",
+            "images_limit": 1,
+            "fields": "id,image_count,images.id,images.renditions",
+        })
+        self.assertEqual(response.status_code, 200)
+        project = response.data[0]
+        self.assertEqual(project["image_count"], 3)
+        self.assertEqual(len(project["images"]), 1)
+        self.assertEqual(project["images"][0]["id"], self.project.images.order_by('-uploaded_at', '-id')[0].id)
+        self.assertEqual(set(project["images"][0]), {"id", "renditions"})
+
+    def test_invalid_images_limit_is_rejected(self):
+        for value in ("0", "-1", "abc"):
+            response = self.client.get("/api/projects/", {"expand": "images", "images_limit": value})
+            self.assertEqual(response.status_code, 400, value)
+
+
+class RunJobTests(TestCase):
+    def setUp(self):
+        self.project = Project.objects.create(name="Proyecto")
+        self.image = ProjectImage.objects.create(project=self.project, image="project_1/imagen.jpg")
+        self.job = start_job(ProcessingJob.KIND_GENERATE_3D, self.project, self.image, worker_name="worker-a")
+
+    def run_with_handler(self, handler):
+        with mock.patch.dict(JOB_HANDLERS, {ProcessingJob.KIND_GENERATE_3D: handler}):
+            return run_job(self.job)
+
+    def test_cancel_while_running_is_kept(self):
+        def handler(job, progress):
+            cancel_job(ProcessingJob.objects.get(id=job.id))
+            return {"message": "ok"}
+
+        job = self.run_with_handler(handler)
+        self.assertEqual(job.status, ProcessingJob.STATUS_CANCELLED)
+        self.assertEqual(ProcessingJob.objects.get(id=job.id).status, ProcessingJob.STATUS_CANCELLED)
+
+    def test_requeued_job_claimed_by_other_worker_is_not_overwritten(self):
+        def handler(job, progress):
+            # Se da por interrumpido, vuelve a la cola y lo reclama otro worker
+            requeue_stale_jobs(timeout=-1)
+            claim_next_job("worker-b")
+            return {"message": "ok"}
+
+        job = self.run_with_handler(handler)
+        stored = ProcessingJob.objects.get(id=job.id)
+        self.assertEqual(stored.status, ProcessingJob.STATUS_RUNNING)
+        self.assertEqual(stored.worker, "worker-b")
+        self.assertIsNone(stored.result)
+
+    def test_finished_job_is_saved(self):
+        job = self.run_with_handler(lambda job, progress: {"message": "ok"})
+        stored = ProcessingJob.objects.get(id=job.id)
+        self.assertEqual(stored.status, ProcessingJob.STATUS_SUCCEEDED)
+        self.assertEqual(stored.result, {"message": "ok"})
+
+    def test_stream_jobs_are_not_requeued(self):
+        stream_job = start_job(ProcessingJob.KIND_PROCESS_IMAGE, self.project, self.image,
+                               worker_name=f"{STREAM_WORKER_PREFIX}worker-a")
+        self.assertEqual(requeue_stale_jobs(timeout=-1), (1, 0))
+        self.assertEqual(ProcessingJob.objects.get(id=stream_job.id).status, ProcessingJob.STATUS_RUNNING)
+        self.assertEqual(ProcessingJob.objects.get(id=self.job.id).status, ProcessingJob.STATUS_QUEUED)
+
+
+class ProcessBatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name="Proyecto")
+        self.pipeline = [{"algorithm": "grayscale", "params": {}}]
+
+    def test_invalid_image_ids_are_rejected(self):
+        for image_ids in (["abc"], [1, "2x"], "1,2", {"id": 1}):
+            response = self.client.post(f"/api/projects/{self.project.id}/process_batch/", {
+                "image_ids": image_ids,
+                "pipeline": self.pipeline,
+            }, format="json")
+            self.assertEqual(response.status_code, 400, image_ids)
+
+    def test_missing_image_ids_are_reported(self):
+        response = self.client.post(f"/api/projects/{self.project.id}/process_batch/", {
+            "image_ids": ["7", 8],
+            "pipeline": self.pipeline,
+        }, format="json")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data["image_ids"], [7, 8])
+
+
+class ProcessingJobViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_invalid_ids_are_rejected(self):
+        for params in ({"project": "abc"}, {"image_id": "abc"}):
+            self.assertEqual(self.client.get("/api/jobs/", params).status_code, 400, params)
+        response = self.client.post("/api/jobs/", {"image_id": "abc"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class OperationAnalyticsTests(TestCase):
+    def test_invalid_limit_is_rejected(self):
+        client = APIClient()
+        for params in ({"limit": "-1"}, {"limit": "0"}, {"limit": "abc"}, {"min_operations": "-1"}):
+            response = client.get("/api/analytics/slowest_parameters/", params)
+            self.assertEqual(response.status_code, 400, params)
+        self.assertEqual(client.get("/api/analytics/slowest_parameters/", {"limit": "500"}).status_code, 200)
+
+
+class ProcessingStatisticsTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        self.project = Project.objects.create(name="Proyecto")
+
+    def test_processed_images_have_a_duration(self):
+        os.makedirs(os.path.join(self.media_root, "project_1"))
+        for name in ("a", "b", "c"):
+            cv2.imwrite(os.path.join(self.media_root, "project_1", f"{name}.jpg"), np.full((60, 80, 3), 128, np.uint8))
+            image = ProjectImage.objects.create(project=self.project, image=f"project_1/{name}.jpg")
+            result = process_image_internal({"image_id": image.id, "pipeline": [{"algorithm": "grayscale", "params": {}}]}, image)
+            self.assertNotIn("error", result)
+
+            image.refresh_from_db()
+            self.assertTrue(image.processed)
+            self.assertGreaterEqual(image.processing_completed, image.processing_started)
+
+        statistics = project_statistics(self.project)
+        self.assertEqual(statistics["processed_images"], 3)
+        self.assertGreater(statistics["p95_processing_time"], 0)
@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProjectViewSet, ProjectImageViewSet, process_image
+from .views import OperationAnalyticsViewSet, ProcessingJobViewSet, ProjectViewSet, ProjectImageViewSet, process_image
 
 router = DefaultRouter()
 router.register(r'projects', ProjectViewSet, basename='project')
 router.register(r'images', ProjectImageViewSet, basename='project-image')
+router.register(r'jobs', ProcessingJobViewSet, basename='job')
+router.register(r'analytics', OperationAnalyticsViewSet, basename='analytics')
 
 urlpatterns = [
     path('', include(router.urls)),
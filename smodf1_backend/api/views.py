@@ -2,29 +2,240 @@ from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.shortcuts import get_object_or_404
-from .models import Project, ProjectImage, get_upload_path, get_processed_path
-from .serializers import ProjectSerializer, ProjectImageSerializer
+from django.db.models import Count, F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from .models import ProcessingJob, Project, ProjectImage, get_upload_path, get_processed_path
+from .serializers import HEAVY_IMAGE_FIELDS, LIGHT_IMAGE_FIELDS, ProcessingJobSerializer, ProjectImageSerializer, ProjectListSerializer, ProjectSerializer
+from .jobs import STREAM_WORKER_PREFIX, cancel_job, default_worker_name, enqueue_job, enqueue_jobs, generate_model_3d, job_cancelled, run_streamed_job, start_job
+from .mesh_store import MODEL_METADATA_KEYS, get_stored_mesh, has_geometry, inline_model_3d, load_mesh, save_model_3d, strip_geometry
+from .progress import PipelineCancelled, PipelineProgress, StreamingProgress
+from .renditions import generate_upload_renditions, rendition_entries
+from .pagination import keyset_page, parse_page_size
+from .statistics import dashboard_statistics, invalidate_statistics, project_statistics
+from .telemetry import THROUGHPUT_INTERVALS, filter_operations, latency_by_algorithm, slowest_parameters, throughput_over_time
 import os
 from django.utils import timezone
 from django.conf import settings
+from vision.encoding import (FORMAT_JPEG, FORMAT_PNG, NEGOTIATION_ORDER, QUALITY_TIERS, TIER_STANDARD,
+                             accepts_format, available_formats, encode_image, format_content_type,
+                             format_extension, format_from_extension, negotiate_format, parse_accept)
+from vision.artifacts import write_atomic
+from vision.executor import run_stage
+from vision.image_context import ImageContext
 from vision.image_processor import ImageProcessor
+from vision.mesh import MESH_CONTENT_TYPE, pack_mesh
+from vision.gltf import GLB_CONTENT_TYPE, build_glb
+from vision.lod import parse_lod, select_lod
+from vision.stages import kmeans_segment
 import cv2
 import numpy as np
 import base64
+import glob
+import json
+import mimetypes
 import logging
+import threading
 import time
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
 # Create your views here.
 
-def process_image_internal(request_data, project_image_obj=None):
+def parse_fieldsets(request, nested='images'):
+    """
+    Lee los parámetros ?fields= y ?expand= de la petición
+
+    ?fields=id,name,images.id,images.image limita los campos del recurso y,
+    con el prefijo 'images.', los de las imágenes anidadas.
+
+    Returns:
+        Tuple de (campos del recurso o None, campos anidados o None, conjunto de expansiones)
+    """
+    fields = None
+    nested_fields = None
+    raw = request.query_params.get('fields')
+    if raw:
+        fields = []
+        prefix = f"{nested}."
+        for name in (part.strip() for part in raw.split(',')):
+            if name.startswith(prefix):
+                nested_fields = (nested_fields or []) + [name[len(prefix):]]
+            elif name:
+                fields.append(name)
+        if nested_fields and nested not in fields:
+            fields.append(nested)
+
+    expand = {part.strip() for part in request.query_params.get('expand', '').split(',') if part.strip()}
+    if nested_fields is not None:
+        expand.add(nested)
+    return fields, nested_fields, expand
+
+def parse_images_limit(request):
+    """
+    Lee ?images_limit=N, el número de imágenes (las más recientes) que se
+    expanden por proyecto en el listado
+
+    Returns:
+        Entero o None si no se indicó
+
+    Raises:
+        ValueError: Si no es un entero mayor que 0
+    """
+    value = request.query_params.get('images_limit')
+    if value in (None, ''):
+        return None
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError("'images_limit' debe ser un entero mayor que 0")
+    return int(value)
+
+def deferred_images(image_fields=None, renditions=False):
+    """
+    Queryset de ProjectImage que no carga las columnas JSON pesadas
+    que no estén entre los campos pedidos
+
+    Args:
+        image_fields: Campos pedidos (None si no se limitaron)
+        renditions: Precargar las versiones reducidas si se van a serializar
+    """
+    requested = set(image_fields or ())
+    queryset = ProjectImage.objects.defer(*[name for name in HEAVY_IMAGE_FIELDS if name not in requested])
+    if renditions and (image_fields is None or 'renditions' in requested):
+        queryset = queryset.prefetch_related('renditions')
+    return queryset
+
+
+# Columnas de ProjectImage que necesita list_images
+LISTED_IMAGE_FIELDS = ('id', 'project_id', 'image', 'uploaded_at', 'has_3d_data', 'image_width', 'image_height',
+                       'file_size', 'file_exists', 'checksum', 'file_checked_at')
+
+
+def absolute_url_builder(request):
+    """
+    Función que convierte URLs relativas en absolutas resolviendo el host
+    de la petición una sola vez, para listados con muchas URLs
+    """
+    base_url = request.build_absolute_uri('/')
+    return lambda url: urljoin(base_url, url)
+
+
+# Lado mayor de las vistas previas que se envían en los eventos de progreso
+PREVIEW_MAX_SIDE = 320
+
+
+def image_preview(image, max_side=PREVIEW_MAX_SIDE):
+    """Miniatura JPEG en base64 (data URI) de una imagen BGR o en escala de grises"""
+    height, width = image.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 70])
+    return "data:image/jpeg;base64," + base64.b64encode(buffer).decode('utf-8')
+
+
+def processed_image_version(path):
+    """Versión de la imagen procesada en disco (fecha de modificación y tamaño), usada como ETag"""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def processed_image_location(project_image, path, absolute_uri=None):
+    """
+    URL de la imagen procesada con su versión en la query string: cambia
+    cada vez que se reprocesa, así que el navegador puede cachearla sin
+    revalidar
+    """
+    url = f"{reverse('project-image-processed', args=[project_image.id])}?v={processed_image_version(path)}"
+    return absolute_uri(url) if absolute_uri else url
+
+
+def output_encoding(request_data, pipeline):
+    """
+    Formato y nivel de calidad con que se guarda la imagen procesada
+
+    Los mapas de bordes se guardan en PNG, sin pérdida (ocupan menos que en
+    JPEG y no tienen artefactos); el resto en PROCESSED_IMAGE_FORMAT, o en el
+    'output_format' de la petición. Si OpenCV no sabe codificar el formato
+    se usa JPEG.
+
+    Returns:
+        Tuple de (formato, nivel de calidad)
+    """
+    if any(step.get('algorithm') == 'edge_detection' for step in pipeline):
+        return FORMAT_PNG, TIER_STANDARD
+
+    fmt = request_data.get('output_format') or getattr(settings, 'PROCESSED_IMAGE_FORMAT', FORMAT_JPEG)
+    if fmt not in available_formats():
+        logger.warning(f"Formato de imagen no disponible: {fmt}; se usa JPEG")
+        fmt = FORMAT_JPEG
+    tier = request_data.get('quality') or getattr(settings, 'PROCESSED_IMAGE_QUALITY', TIER_STANDARD)
+    if tier not in QUALITY_TIERS:
+        tier = TIER_STANDARD
+    return fmt, tier
+
+
+def remove_stale_variants(path):
+    """Elimina las versiones de la imagen procesada en otros formatos (guardadas o convertidas)"""
+    base = os.path.splitext(path)[0]
+    for variant in glob.glob(f"{glob.escape(base)}.*"):
+        if variant != path and format_from_extension(os.path.splitext(variant)[1]):
+            try:
+                os.remove(variant)
+            except OSError:
+                pass
+
+
+def emit_depth_preview(progress):
+    """Callback para generate_3d_data que publica una vista previa del mapa de profundidad"""
+    if not progress.wants_artifacts:
+        return None
+
+    def on_depth_map(depth_map):
+        depth = cv2.normalize(depth_map, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+        progress.emit("depth_preview", width=int(depth_map.shape[1]), height=int(depth_map.shape[0]),
+                      preview=image_preview(depth))
+    return on_depth_map
+
+
+def process_image_internal(request_data, project_image_obj=None, processor=None,
+                           pending_operations=None, include_media=True, progress=None,
+                           inline_image=False, absolute_uri=None):
     """
     Función interna para procesar una imagen con algoritmos especificados.
     Puede ser llamada desde otras vistas para reutilizar el código.
+    
+    Args:
+        request_data: Diccionario con image_id y pipeline
+        project_image_obj: ProjectImage ya cargada (opcional)
+        processor: ImageProcessor a reutilizar entre imágenes (opcional)
+        pending_operations: Lista donde acumular los ProcessingOperation para
+            guardarlos en bloque más tarde; si es None se guardan aquí
+        include_media: Incluir la imagen en base64 y el modelo 3D en la respuesta
+        progress: PipelineProgress que recibe un evento al empezar y al terminar
+            cada etapa; si se cancela, el procesamiento se detiene en el
+            siguiente evento y se devuelve un error con 'cancelled'
+        inline_image: Devolver la imagen procesada en base64 (comportamiento
+            anterior) en lugar de solo su URL
+        absolute_uri: Función que convierte una ruta en URL absoluta
+            (normalmente request.build_absolute_uri)
+    
+    Returns:
+        Diccionario de la respuesta; processed_image_url apunta a la imagen
+        procesada servida con caché HTTP (ProjectImageViewSet.processed)
     """
     
     image_id = request_data.get('image_id')
@@ -37,6 +248,10 @@ def process_image_internal(request_data, project_image_obj=None):
     start_time = timezone.now()
     operation_records = []
     
+    # Contexto de la imagen tal como se leyó del disco (para el modelo 3D)
+    source_context = None
+    progress = progress or PipelineProgress()
+    
     try:
         # Get image from database if an ID was provided
         if image_id:
@@ -56,6 +271,7 @@ def process_image_internal(request_data, project_image_obj=None):
                     cv2.circle(original_image, (200, 200), 80, (0, 0, 255), -1)
                 else:
                     print(f"Imagen cargada exitosamente: {original_image.shape}")
+                    source_context = ImageContext(original_image)
                     
                     # Actualizar metadatos de imagen si no están definidos
                     if not project_image_obj.image_width or not project_image_obj.image_height:
@@ -71,9 +287,15 @@ def process_image_internal(request_data, project_image_obj=None):
             return {"error": "No se proporcionó un ID de imagen"}
         
         # Process the image through the pipeline
-        print("Inicializando procesador de imágenes...")
-        processor = ImageProcessor()
+        if processor is None:
+            print("Inicializando procesador de imágenes...")
+            processor = ImageProcessor()
         processed_image = original_image.copy()
+        
+        # Escala de grises, desenfoques, bordes y HSV compartidos entre etapas.
+        # Mientras ninguna etapa modifique la imagen se usa el mismo contexto
+        # que para el modelo 3D; al dibujar sobre ella se crea uno nuevo.
+        context = source_context or ImageContext(original_image)
         results = {
             "detections": [],
             "metrics": {
@@ -85,11 +307,12 @@ def process_image_internal(request_data, project_image_obj=None):
         }
         
         # Apply algorithms in the pipeline
-        for algorithm in pipeline:
+        for index, algorithm in enumerate(pipeline):
             algo_id = algorithm.get('algorithm')
             params = algorithm.get('params', {})
             
             print(f"Aplicando algoritmo: {algo_id} con parámetros: {params}")
+            progress.emit("stage_started", index=index, total=len(pipeline), algorithm=algo_id, params=params)
             
             # Medir tiempo para esta operación
             op_start_time = timezone.now()
@@ -99,7 +322,7 @@ def process_image_internal(request_data, project_image_obj=None):
                 # Apply object detection
                 confidence = params.get('confianza_mínima', 0.5)
                 print(f"Detectando objetos con confianza mínima: {confidence}")
-                results["detections"] = processor.detect_objects(processed_image, confidence)
+                results["detections"] = processor.detect_objects(context, confidence)
                 results["metrics"]["detection_count"] = len(results["detections"])
                 
                 if results["detections"]:
@@ -116,6 +339,7 @@ def process_image_internal(request_data, project_image_obj=None):
                         # Dibujar el texto sobre el fondo
                         cv2.putText(processed_image, text, 
                                    (x+5, y-5), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                    context = ImageContext(processed_image)
             
             elif algo_id == 'people_detection':
                 # Apply people detection
@@ -125,7 +349,7 @@ def process_image_internal(request_data, project_image_obj=None):
                 
                 # Obtener detecciones de personas
                 people_detections = processor.detect_people(
-                    processed_image, 
+                    context, 
                     scale_factor=scale_factor,
                     min_neighbors=min_neighbors,
                     min_height=min_height
@@ -149,6 +373,7 @@ def process_image_internal(request_data, project_image_obj=None):
                         # Dibujar el texto
                         cv2.putText(processed_image, text, 
                                    (x+5, y-5), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 100, 0), 2)
+                    context = ImageContext(processed_image)
             
             elif algo_id == 'yolo':
                 # Apply YOLO object detection
@@ -157,7 +382,7 @@ def process_image_internal(request_data, project_image_obj=None):
                 
                 # Usar el detector de objetos pero con parámetros ajustados para YOLO
                 results["detections"] = processor.detect_objects(
-                    processed_image, 
+                    context, 
                     confidence_threshold=sensitivity
                 )
                 results["metrics"]["detection_count"] = len(results["detections"])
@@ -176,6 +401,7 @@ def process_image_internal(request_data, project_image_obj=None):
                         # Dibujar el texto sobre el fondo
                         cv2.putText(processed_image, text, 
                                    (x+5, y-5), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 200, 255), 2)
+                    context = ImageContext(processed_image)
             
             elif algo_id == 'edge_detection':
                 # Apply edge detection
@@ -188,12 +414,13 @@ def process_image_internal(request_data, project_image_obj=None):
                     # Convert back to 3 channels
                     processed_image = cv2.cvtColor(processed_image, cv2.COLOR_GRAY2BGR)
                 elif method == 'sobel':
-                    gray = cv2.cvtColor(processed_image, cv2.COLOR_BGR2GRAY)
+                    gray = context.gray()
                     sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
                     sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
                     processed_image = cv2.magnitude(sobelx, sobely)
                     processed_image = cv2.normalize(processed_image, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
                     processed_image = cv2.cvtColor(processed_image, cv2.COLOR_GRAY2BGR)
+                context = ImageContext(processed_image)
             
             elif algo_id == 'segmentation':
                 # Apply segmentation
@@ -201,28 +428,19 @@ def process_image_internal(request_data, project_image_obj=None):
                 num_segments = params.get('número_de_segmentos', 5)
                 
                 if method == 'kmeans':
-                    # Convert to RGB for processing
-                    pixels = processed_image.reshape((-1, 3))
-                    pixels = np.float32(pixels)
-                    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)
-                    _, labels, centers = cv2.kmeans(pixels, num_segments, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
-                    centers = np.uint8(centers)
-                    segmented = centers[labels.flatten()]
-                    processed_image = segmented.reshape(processed_image.shape)
+                    # K-means over the pixel colors (runs on the processing executor)
+                    processed_image = run_stage(kmeans_segment, processed_image, num_segments)
+                    context = ImageContext(processed_image)
             
             elif algo_id == 'contour':
                 # Apply contour detection (similar to edge but keeps the original image)
                 sensitivity = params.get('sensitivity', 0.5)
                 detail_level = params.get('detail_level', 5)
                 
-                # Convert to grayscale
-                gray = cv2.cvtColor(processed_image, cv2.COLOR_BGR2GRAY)
-                
-                # Apply blur and then Canny
-                blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+                # Grayscale, blur and then Canny (shared with the other stages)
                 threshold1 = int(100 * sensitivity)
                 threshold2 = int(200 * sensitivity)
-                edges = cv2.Canny(blurred, threshold1, threshold2)
+                edges = context.canny(threshold1, threshold2, blur=5)
                 
                 # Find contours
                 contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -233,6 +451,7 @@ def process_image_internal(request_data, project_image_obj=None):
                 
                 # Draw contours on the original image
                 cv2.drawContours(processed_image, filtered_contours, -1, (0, 255, 0), 2)
+                context = ImageContext(processed_image)
                 
                 # Add contour data to results
                 contour_data = []
@@ -252,9 +471,6 @@ def process_image_internal(request_data, project_image_obj=None):
                 print("Generando modelo 3D a partir del contorno...")
                 try:
                     if project_image_obj:
-                        # Crear una nueva instancia del ImageProcessor
-                        model_processor = ImageProcessor()
-                        
                         # Configuración basada en los parámetros del contorno
                         model_settings = {
                             "polygons": 2000,
@@ -266,25 +482,40 @@ def process_image_internal(request_data, project_image_obj=None):
                         }
                         
                         # Generar datos 3D
-                        model_3d = model_processor.generate_3d_data(
+                        model_3d = processor.generate_3d_data(
                             project_image_obj.image.path,
-                            settings=model_settings
+                            settings=model_settings,
+                            context=source_context,
+                            on_depth_map=emit_depth_preview(progress)
                         )
                         
                         # Actualizar los metadatos del proyecto
                         if isinstance(model_3d, dict) and not model_3d.get('error'):
-                            project_image_obj.has_3d_data = True
-                            project_image_obj.data_3d = model_3d
+                            save_model_3d(project_image_obj, model_3d)
                             project_image_obj.save(update_fields=['has_3d_data', 'data_3d'])
                             print("Modelo 3D generado y guardado correctamente")
                 except Exception as e:
                     print(f"Error generando modelo 3D: {str(e)}")
             
+            op_end_time = timezone.now()
+            execution_time_ms = int((op_end_time - op_start_time).total_seconds() * 1000)
+            
+            stage_event = {
+                "index": index,
+                "total": len(pipeline),
+                "algorithm": algo_id,
+                "execution_time_ms": execution_time_ms,
+                "detection_count": len(results["detections"]),
+            }
+            if progress.wants_artifacts:
+                stage_event["detections"] = results["detections"]
+                if algo_id == 'contour':
+                    stage_event["contours"] = results.get("contours", [])
+                stage_event["preview"] = image_preview(processed_image)
+            progress.emit("stage_completed", **stage_event)
+            
             # Registrar la operación si existe la imagen en la base de datos
             if project_image_obj:
-                op_end_time = timezone.now()
-                execution_time_ms = int((op_end_time - op_start_time).total_seconds() * 1000)
-                
                 # Crear registro de operación
                 from .models import ProcessingOperation
                 operation = ProcessingOperation(
@@ -298,19 +529,35 @@ def process_image_internal(request_data, project_image_obj=None):
         
         # Guardar los registros de operaciones en la base de datos
         from .models import ProcessingOperation
-        if project_image_obj and operation_records:
+        if pending_operations is not None:
+            pending_operations.extend(operation_records)
+        elif project_image_obj and operation_records:
             ProcessingOperation.objects.bulk_create(operation_records)
         
-        # Convert processed image to base64 for response
-        print("Convirtiendo imagen procesada a base64...")
-        _, buffer = cv2.imencode('.jpg', processed_image)
-        processed_image_base64 = "data:image/jpeg;base64," + base64.b64encode(buffer).decode('utf-8')
+        progress.emit("finalizing")
         
         # Update metrics
         if results["detections"]:
             confidences = [det.get("confidence", 0) for det in results["detections"]]
             results["metrics"]["average_confidence"] = sum(confidences) / len(confidences)
         
+        # Nombre del archivo de la imagen procesada (su extensión indica el formato)
+        output_format, quality_tier = output_encoding(request_data, pipeline)
+        processed_filename = None
+        if project_image_obj:
+            base = os.path.splitext(os.path.basename(project_image_obj.image.name))[0]
+            processed_filename = f"processed_{base}{format_extension(output_format)}"
+        
+        # Codificar la imagen una sola vez: los mismos bytes se guardan en
+        # disco y, solo si se pide inline, se devuelven en base64
+        buffer = encode_image(processed_image, output_format, quality_tier)
+        processed_image_base64 = None
+        processed_image_url = None
+        if include_media and inline_image:
+            print("Convirtiendo imagen procesada a base64...")
+            mime_type = format_content_type(output_format)
+            processed_image_base64 = f"data:{mime_type};base64," + base64.b64encode(buffer).decode('utf-8')
+        
         # Guardar la imagen procesada si existe la imagen en la base de datos
         if project_image_obj:
             # Calcula tiempo total de procesamiento
@@ -320,28 +567,21 @@ def process_image_internal(request_data, project_image_obj=None):
             
             try:
                 # Guardar la imagen procesada en el sistema de archivos
-                processed_filename = f"processed_{os.path.basename(project_image_obj.image.name)}"
-                
-                # Asegurar que el archivo tenga una extensión válida (.jpg)
-                base, ext = os.path.splitext(processed_filename)
-                if not ext or ext.lower() not in ['.jpg', '.jpeg', '.png']:
-                    processed_filename = f"{base}.jpg"
-                
                 processed_path = os.path.join(settings.MEDIA_ROOT, get_processed_path(project_image_obj, processed_filename))
                 
-                # Asegurar que el directorio existe
-                os.makedirs(os.path.dirname(processed_path), exist_ok=True)
-                
-                # Guardar imagen procesada con formato jpg
-                cv2.imwrite(processed_path, processed_image)
+                write_atomic(processed_path, buffer)
+                remove_stale_variants(processed_path)
+                processed_image_url = processed_image_location(project_image_obj, processed_path, absolute_uri)
                 
                 # Actualizar el objeto en la base de datos
                 project_image_obj.processed_image.name = get_processed_path(project_image_obj, processed_filename)
                 project_image_obj.analysis_results = results
-                project_image_obj.processed = True
-                project_image_obj.save()
+                # Duración de esta ejecución para las estadísticas (sin la espera en
+                # cola de un lote ni, en /process_image/, el tiempo desde la subida)
+                project_image_obj.processing_started = start_time
+                project_image_obj.complete_processing()
                 
-                print(f"Imagen procesada guardada en: {processed_path}")
+                print(f"Imagen procesada guardada en: {processed_path} ({output_format}, {len(buffer)} bytes)")
             except Exception as e:
                 print(f"Error guardando imagen procesada: {str(e)}")
         
@@ -350,7 +590,8 @@ def process_image_internal(request_data, project_image_obj=None):
         
         # Create response data
         response_data = {
-            "processed_image": processed_image_base64,
+            "processed_image": processed_image_base64 or processed_image_url,
+            "processed_image_url": processed_image_url,
             "results": results,
             "image_info": {
                 "id": image_id,
@@ -368,18 +609,220 @@ def process_image_internal(request_data, project_image_obj=None):
         }
         
         # Añadir datos del modelo 3D si existen
-        if project_image_obj and project_image_obj.has_3d_data and project_image_obj.data_3d:
+        if include_media and project_image_obj and project_image_obj.has_3d_data and project_image_obj.data_3d:
             print("Añadiendo modelo 3D existente a la respuesta")
-            response_data["model_3d"] = project_image_obj.data_3d
+            response_data["model_3d"] = inline_model_3d(project_image_obj)
         
         return response_data
         
+    except PipelineCancelled:
+        print("Procesamiento cancelado")
+        return {"error": "Procesamiento cancelado", "cancelled": True}
     except Exception as e:
         import traceback
         print(f"Error procesando imagen: {str(e)}")
         print(traceback.format_exc())
         return {"error": str(e)}
 
+# Operaciones acumuladas antes de escribirlas en bloque durante un lote
+BATCH_OPERATIONS_FLUSH = 500
+
+
+def iter_process_batch(project_images, pipeline, workers=None, absolute_uri=None, options=None):
+    """
+    Procesa varias imágenes con el mismo pipeline repartiéndolas entre hilos
+
+    Cada hilo construye su ImageProcessor una sola vez y lo reutiliza para
+    todas sus imágenes; las etapas pesadas pasan por el ejecutor de etapas
+    (PROCESSING_EXECUTOR). Los ProcessingOperation de todas las imágenes se
+    escriben en bloque.
+
+    Args:
+        project_images: ProjectImage a procesar
+        pipeline: Pipeline común a todas las imágenes
+        workers: Número de hilos (por defecto PROCESSING_BATCH_WORKERS)
+        absolute_uri: Función para construir las URLs absolutas de las imágenes procesadas
+        options: Formato y calidad de las imágenes procesadas (ver output_options)
+
+    Yields:
+        Un diccionario por imagen en el orden en que terminan y, al final,
+        uno con el resumen del lote
+    """
+    from .models import ProcessingOperation
+
+    workers = workers or getattr(settings, 'PROCESSING_BATCH_WORKERS', 4)
+    workers = max(1, min(workers, len(project_images) or 1))
+    start = time.perf_counter()
+    local = threading.local()
+
+    # Todas las imágenes del lote se marcan como en procesamiento con una sola consulta
+    now = timezone.now()
+    ProjectImage.objects.filter(id__in=[image.id for image in project_images]).update(processing_started=now)
+    invalidate_statistics({image.project_id for image in project_images})
+    for project_image in project_images:
+        project_image.processing_started = now
+
+    def process_one(project_image):
+        if not hasattr(local, 'processor'):
+            local.processor = ImageProcessor()
+        operations = []
+        try:
+            result = process_image_internal(
+                dict(options or {}, image_id=project_image.id, pipeline=pipeline),
+                project_image,
+                processor=local.processor,
+                pending_operations=operations,
+                include_media=False,
+                absolute_uri=absolute_uri
+            )
+        finally:
+            # Conexión propia de este hilo
+            connections.close_all()
+        return result, operations
+
+    pending_operations = []
+    summary = {"total": len(project_images), "succeeded": 0, "failed": 0, "operations": 0}
+
+    def flush():
+        if pending_operations:
+            ProcessingOperation.objects.bulk_create(pending_operations, batch_size=BATCH_OPERATIONS_FLUSH)
+            summary["operations"] += len(pending_operations)
+            pending_operations.clear()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        futures = {pool.submit(process_one, project_image): project_image for project_image in project_images}
+        for future in as_completed(futures):
+            project_image = futures[future]
+            try:
+                result, operations = future.result()
+            except Exception as e:
+                result, operations = {"error": str(e)}, []
+
+            if "error" in result:
+                summary["failed"] += 1
+                yield {"image_id": project_image.id, "status": "failed", "error": result["error"]}
+                continue
+
+            summary["succeeded"] += 1
+            pending_operations.extend(operations)
+            if len(pending_operations) >= BATCH_OPERATIONS_FLUSH:
+                flush()
+            yield {
+                "image_id": project_image.id,
+                "status": "succeeded",
+                "processed_image_url": result["processed_image_url"],
+                "results": result["results"],
+                "image_info": result["image_info"],
+            }
+
+    flush()
+    summary["elapsed_ms"] = int((time.perf_counter() - start) * 1000)
+    yield {"summary": summary}
+
+
+def request_flag(request, name):
+    """Valor booleano de un parámetro de la query string o del cuerpo (?name=1)"""
+    value = request.query_params.get(name, request.data.get(name, False))
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def wants_async(request):
+    """Indica si el cliente pidió ejecutar la operación como trabajo en segundo plano (?async=1)"""
+    return request_flag(request, 'async')
+
+
+def wants_inline(request):
+    """Indica si el cliente pidió la imagen procesada en base64 dentro de la respuesta (?inline=1)"""
+    return request_flag(request, 'inline')
+
+
+def wants_binary_mesh(request):
+    """
+    Indica si el cliente descargará la geometría en binario desde mesh_url
+    (?binary_mesh=1), de modo que el modelo 3D se devuelve sin ella
+    """
+    return request_flag(request, 'binary_mesh')
+
+
+def output_options(request):
+    """Formato y nivel de calidad pedidos para la imagen procesada (?output_format=webp&quality=high)"""
+    options = {}
+    for name in ('output_format', 'quality'):
+        value = request.query_params.get(name, request.data.get(name))
+        if value:
+            options[name] = value
+    return options
+
+
+def job_payload(request, **payload):
+    """
+    Payload de un trabajo con lo necesario para construir su respuesta
+    como la construiría la petición: URL base, imagen inline o no y su formato
+    """
+    payload.setdefault('inline', wants_inline(request))
+    payload.update(output_options(request))
+    payload['base_url'] = request.build_absolute_uri('/')
+    return payload
+
+
+def job_accepted_response(request, job):
+    """Respuesta 202 con el identificador del trabajo y las URLs para consultarlo"""
+    data = ProcessingJobSerializer(job, context={'request': request}).data
+    response = Response(data, status=status.HTTP_202_ACCEPTED)
+    response["Location"] = data["status_url"]
+    return response
+
+
+def mesh_url(request, project_id, image_id, lod=None):
+    """URL absoluta de la malla binaria de una imagen"""
+    url = f"{reverse('project-get-3d-mesh', args=[project_id])}?image_id={image_id}"
+    if lod:
+        url += f"&lod={lod}"
+    return request.build_absolute_uri(url)
+
+
+def attach_model_3d(result, request_data):
+    """
+    Genera el modelo 3D de la imagen procesada y lo añade a result si no lo tiene
+
+    Los parámetros se toman del primer paso de contorno, segmentación o
+    YOLO del pipeline. Un error al generar el modelo no invalida el resultado.
+    """
+    if "model_3d" in result:
+        return result
+
+    print("Generando modelo 3D para la respuesta...")
+    image_id = request_data.get('image_id')
+    try:
+        if image_id:
+            # Obtener la imagen y generar modelo 3D
+            project_image = ProjectImage.objects.get(id=image_id)
+            
+            # Extraer parámetros del pipeline
+            settings_3d = {}
+            for algo in request_data.get('pipeline', []):
+                if algo.get('algorithm') in ['contour', 'segmentation', 'yolo']:
+                    settings_3d = algo.get('params', {})
+                    break
+            
+            model_3d_data = generate_model_3d(project_image, settings_3d)
+            
+            if not isinstance(model_3d_data, dict) or not model_3d_data.get('error'):
+                # Añadir datos 3D al resultado
+                result["model_3d"] = model_3d_data
+                print("Modelo 3D generado y añadido a la respuesta")
+            else:
+                print(f"Error generando modelo 3D: {model_3d_data.get('error')}")
+        else:
+            print("No se pudo generar modelo 3D: No se proporcionó ID de imagen")
+    except Exception as e:
+        print(f"Error generando modelo 3D: {str(e)}")
+        # No devolver error, solo continuar sin el modelo 3D
+    return result
+
+
 @api_view(['POST', 'OPTIONS'])
 def process_image(request):
     """
@@ -403,58 +846,34 @@ def process_image(request):
     print(f"Datos de la solicitud: {request.data}")
     print("=" * 50)
     
+    # Procesamiento en segundo plano: solo para imágenes ya guardadas
+    if wants_async(request):
+        image_id = request.data.get('image_id')
+        if not image_id:
+            return Response({"error": "El procesamiento asíncrono requiere image_id"}, status=status.HTTP_400_BAD_REQUEST)
+        project_image = get_object_or_404(ProjectImage, id=image_id)
+        job = enqueue_job(ProcessingJob.KIND_PROCESS_IMAGE, project_image.project, project_image, job_payload(
+            request,
+            pipeline=request.data.get('pipeline', []),
+            generate_3d=True
+        ))
+        return job_accepted_response(request, job)
+    
     # Procesar la imagen utilizando la función interna
-    result = process_image_internal(request.data)
+    result = process_image_internal(request.data, inline_image=wants_inline(request),
+                                    absolute_uri=request.build_absolute_uri)
     
     # Verificar si hay error
     if "error" in result:
         return Response({"error": result["error"]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     # Generar modelo 3D si no está incluido en el resultado
-    if "model_3d" not in result:
-        print("Generando modelo 3D para la respuesta...")
-        image_id = request.data.get('image_id')
-        try:
-            if image_id:
-                # Obtener la imagen y generar modelo 3D
-                project_image = ProjectImage.objects.get(id=image_id)
-                
-                # Usar el procesador de imágenes
-                processor = ImageProcessor()
-                
-                # Extraer parámetros para el modelo 3D
-                pipeline = request.data.get('pipeline', [])
-                settings = {}
-                
-                # Extraer parámetros del pipeline
-                for algo in pipeline:
-                    if algo.get('algorithm') in ['contour', 'segmentation', 'yolo']:
-                        settings = algo.get('params', {})
-                        break
-                
-                # Generar datos 3D a partir de la imagen
-                model_3d_data = processor.generate_3d_data(
-                    project_image.image.path, 
-                    settings=settings
-                )
-                
-                if not isinstance(model_3d_data, dict) or not model_3d_data.get('error'):
-                    # Añadir datos 3D al resultado
-                    result["model_3d"] = model_3d_data
-                    
-                    # Actualizar la imagen con los datos 3D generados
-                    project_image.has_3d_data = True
-                    project_image.data_3d = model_3d_data
-                    project_image.save()
-                    
-                    print("Modelo 3D generado y añadido a la respuesta")
-                else:
-                    print(f"Error generando modelo 3D: {model_3d_data.get('error')}")
-            else:
-                print("No se pudo generar modelo 3D: No se proporcionó ID de imagen")
-        except Exception as e:
-            print(f"Error generando modelo 3D: {str(e)}")
-            # No devolver error, solo continuar sin el modelo 3D
+    attach_model_3d(result, request.data)
+    if wants_binary_mesh(request) and isinstance(result.get("model_3d"), dict):
+        project_image = ProjectImage.objects.filter(id=request.data.get('image_id'), has_3d_data=True).only('id', 'project_id').first()
+        if project_image is not None:
+            result["model_3d"] = strip_geometry(result["model_3d"])
+            result["mesh_url"] = mesh_url(request, project_image.project_id, project_image.id)
     
     # Crear una respuesta con los headers CORS explícitos
     response = Response(result)
@@ -468,7 +887,51 @@ class ProjectViewSet(viewsets.ModelViewSet):
     queryset = Project.objects.all()
 
     def get_queryset(self):
-        return Project.objects.all()
+        queryset = Project.objects.all()
+        _, image_fields, expand = parse_fieldsets(self.request)
+        
+        if self.action == 'list':
+            # Listado ligero: número de imágenes por agregación y, solo con
+            # ?expand=images, las imágenes sin las columnas JSON pesadas
+            # (las images_limit más recientes de cada proyecto si se indica)
+            queryset = queryset.annotate(image_count=Count('images'))
+            if 'images' in expand:
+                images = deferred_images(image_fields, renditions=True)
+                images_limit = parse_images_limit(self.request)
+                if images_limit:
+                    # Equivale a un slice por proyecto, que Prefetch no admite aquí
+                    images = images.annotate(position=Window(
+                        RowNumber(), partition_by=F('project_id'), order_by=(F('uploaded_at').desc(), F('id').desc())
+                    )).filter(position__lte=images_limit)
+                queryset = queryset.prefetch_related(Prefetch('images', queryset=images))
+        elif self.action == 'retrieve':
+            if image_fields is not None:
+                queryset = queryset.prefetch_related(Prefetch('images', queryset=deferred_images(image_fields, renditions=True)))
+            else:
+                queryset = queryset.prefetch_related('images', 'images__renditions')
+        
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        try:
+            parse_images_limit(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ProjectListSerializer
+        return ProjectSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ('list', 'retrieve'):
+            fields, image_fields, expand = parse_fieldsets(self.request)
+            if self.action == 'list' and 'images' in expand and image_fields is None:
+                image_fields = LIGHT_IMAGE_FIELDS
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('image_fields', image_fields)
+        return super().get_serializer(*args, **kwargs)
 
     def perform_create(self, serializer):
         logger.info(f"Creando proyecto con datos: {serializer.validated_data}")
@@ -484,41 +947,21 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def get_statistics(self, request, pk=None):
         """
         Retorna estadísticas del proyecto
+
+        Los contadores y el tiempo medio de procesamiento se calculan con una
+        consulta de agregados y los percentiles (p50, p95) en la base de
+        datos; el resultado queda en caché hasta que cambia una imagen.
         """
         project = self.get_object()
-        
-        # Obtener todas las imágenes del proyecto
-        images = ProjectImage.objects.filter(project=project)
-        
-        # Calcular estadísticas
-        total_images = images.count()
-        processed_images = images.filter(processed=True).count()
-        pending_images = total_images - processed_images
-        images_with_3d = images.filter(has_3d_data=True).count()
-        
-        # Calcular tiempos promedio si hay imágenes procesadas
-        avg_processing_time = 0
-        if processed_images > 0:
-            processed_imgs = images.filter(processed=True)
-            times = [img.processing_completed - img.processing_started 
-                    for img in processed_imgs 
-                    if img.processing_completed and img.processing_started]
-            
-            if times:
-                avg_time_seconds = sum(time.total_seconds() for time in times) / len(times)
-                avg_processing_time = round(avg_time_seconds, 2)
-        
-        # Devolver estadísticas
-        statistics = {
-            'total_images': total_images,
-            'processed_images': processed_images,
-            'pending_images': pending_images,
-            'images_with_3d': images_with_3d,
-            'avg_processing_time': avg_processing_time,
-            'last_updated': project.updated_at
-        }
-        
-        return Response(statistics)
+        return Response(project_statistics(project))
+
+    @action(detail=False, methods=['GET'])
+    def dashboard(self, request):
+        """
+        Estadísticas de todos los proyectos y sus totales, para el listado
+        de proyectos (un número fijo de consultas, en caché)
+        """
+        return Response(dashboard_statistics(self.get_queryset()))
 
     @action(detail=True, methods=['POST'])
     def upload_image(self, request, pk=None):
@@ -539,6 +982,9 @@ class ProjectViewSet(viewsets.ModelViewSet):
             project_image = ProjectImage(project=project)
             project_image.image.save(filename, image_file)
             project_image.save()
+            
+            # Miniatura, vista previa y metadatos del original
+            generate_upload_renditions(project_image)
 
             serializer = ProjectImageSerializer(project_image)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -556,7 +1002,8 @@ class ProjectViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def generate_3d(self, request, pk=None):
         """
-        Genera un modelo 3D a partir de una imagen existente en el proyecto
+        Genera un modelo 3D a partir de una imagen existente en el proyecto.
+        Con ?binary_mesh=1 'results' no incluye la geometría: se descarga de mesh_url.
         """
         project = self.get_object()
         image_id = request.data.get('image_id')
@@ -571,26 +1018,20 @@ class ProjectViewSet(viewsets.ModelViewSet):
         except ProjectImage.DoesNotExist:
             return Response({"error": "Imagen no encontrada en este proyecto"}, status=status.HTTP_404_NOT_FOUND)
         
-        # Usar el procesador de imágenes
-        processor = ImageProcessor()
+        if wants_async(request):
+            job = enqueue_job(ProcessingJob.KIND_GENERATE_3D, project, project_image, {'settings': settings})
+            return job_accepted_response(request, job)
         
-        # Generar datos 3D a partir de la imagen
-        results = processor.generate_3d_data(
-            project_image.image.path, 
-            settings=settings
-        )
+        # Generar y guardar los datos 3D a partir de la imagen
+        results = generate_model_3d(project_image, settings)
         
         if isinstance(results, dict) and results.get('error'):
             return Response({"error": results['error']}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-        # Actualizar la imagen con los datos 3D generados
-        project_image.has_3d_data = True
-        project_image.data_3d = results
-        project_image.save()
-        
         return Response({
             "message": "Modelo 3D generado exitosamente",
-            "results": results
+            "results": strip_geometry(results) if wants_binary_mesh(request) else select_lod(results),
+            "mesh_url": mesh_url(request, project.id, project_image.id)
         })
 
     @action(detail=True, methods=['post'])
@@ -606,6 +1047,11 @@ class ProjectViewSet(viewsets.ModelViewSet):
         if not image_id or not model_data:
             return Response({"error": "Se requiere ID de imagen y datos del modelo"}, 
                             status=status.HTTP_400_BAD_REQUEST)
+        # Sin geometría solo se pueden cambiar los metadatos o la configuración
+        if not isinstance(model_data, dict) or not (
+                has_geometry(model_data) or settings or any(key in model_data for key in MODEL_METADATA_KEYS)):
+            return Response({"error": "model_data no contiene geometría ni configuración"},
+                            status=status.HTTP_400_BAD_REQUEST)
         
         try:
             # Obtener la imagen del proyecto
@@ -615,8 +1061,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_404_NOT_FOUND)
         
         # Actualizar datos del modelo 3D
-        project_image.has_3d_data = True
-        project_image.data_3d = model_data
+        save_model_3d(project_image, model_data)
         
         # Guardar configuraciones actualizadas si se proporcionan
         if settings:
@@ -636,67 +1081,165 @@ class ProjectViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def get_3d_models(self, request, pk=None):
         """
-        Obtiene todos los modelos 3D de un proyecto
+        Obtiene todos los modelos 3D de un proyecto.
+        ?lod=N devuelve la geometría de ese nivel de detalle (0 = completo).
+        Con ?binary_mesh=1 data_3d no incluye la geometría: se descarga de mesh_url.
         """
         project = self.get_object()
         
+        try:
+            lod = parse_lod(request.query_params.get('lod'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        binary_mesh = wants_binary_mesh(request)
+        
         # Obtener todas las imágenes con datos 3D
         models = ProjectImage.objects.filter(
             project=project,
             has_3d_data=True
-        ).values('id', 'image', 'uploaded_at', 'data_3d')
+        ).only('id', 'image', 'uploaded_at', 'data_3d')
         
         # Formatear la respuesta
         formatted_models = []
         for model in models:
             model_info = {
-                'id': model['id'],
-                'image_url': request.build_absolute_uri(model['image']),
-                'created_at': model['uploaded_at'],
-                'data_3d': model['data_3d']
+                'id': model.id,
+                'image_url': request.build_absolute_uri(model.image.url) if model.image else None,
+                'created_at': model.uploaded_at,
+                # La geometría del nivel pedido se lee del almacén de mallas
+                'data_3d': model.data_3d if binary_mesh else inline_model_3d(model, lod),
+                'mesh_url': mesh_url(request, project.id, model.id, lod)
             }
             
             # Extraer metadatos si están disponibles
-            if model['data_3d'] and isinstance(model['data_3d'], dict) and 'metadata' in model['data_3d']:
-                model_info['metadata'] = model['data_3d']['metadata']
+            if model.data_3d and isinstance(model.data_3d, dict) and 'metadata' in model.data_3d:
+                model_info['metadata'] = model.data_3d['metadata']
             
             formatted_models.append(model_info)
         
         return Response(formatted_models)
 
+    @action(detail=True, methods=['get'], url_path='mesh')
+    def get_3d_mesh(self, request, pk=None):
+        """
+        Devuelve la malla de un modelo 3D en formato binario
+        (cabecera de 16 bytes + arrays float32/uint32 little-endian).
+        ?lod=N selecciona el nivel de detalle (0 = completo).
+        """
+        project = self.get_object()
+        image_id = request.query_params.get('image_id')
+        
+        if not image_id:
+            return Response({"error": "Se requiere un ID de imagen"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            lod = parse_lod(request.query_params.get('lod'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            project_image = ProjectImage.objects.get(id=image_id, project=project, has_3d_data=True)
+        except (ProjectImage.DoesNotExist, ValueError):
+            return Response({"error": "Modelo 3D no encontrado en este proyecto"}, status=status.HTTP_404_NOT_FOUND)
+        
+        # Las mallas del almacén ya están en el formato de transporte
+        stored = get_stored_mesh(project_image, lod)
+        if stored is not None:
+            return FileResponse(stored.file.open('rb'), content_type=MESH_CONTENT_TYPE)
+        
+        mesh = load_mesh(project_image, lod)
+        if mesh is None:
+            return Response({"error": "El modelo 3D no contiene geometría"}, status=status.HTTP_404_NOT_FOUND)
+        
+        return HttpResponse(pack_mesh(mesh), content_type=MESH_CONTENT_TYPE)
+
     @action(detail=True, methods=['get'])
-    def list_images(self, request, pk=None):
+    def export_glb(self, request, pk=None):
         """
-        Lista todas las imágenes del proyecto con URLs absolutas
+        Descarga un modelo 3D del proyecto como archivo GLB (glTF binario).
+        Por defecto usa atributos cuantizados; ?quantize=0 los exporta en float32.
+        ?lod=N selecciona el nivel de detalle (0 = completo).
         """
         project = self.get_object()
+        image_id = request.query_params.get('image_id')
+        quantize = request.query_params.get('quantize', '1') not in ('0', 'false')
         
-        # Obtener todas las imágenes del proyecto
-        images = ProjectImage.objects.filter(project=project)
-        
-        # Formatear la respuesta con URLs absolutas
-        formatted_images = []
-        for image in images:
-            # Verificar si la imagen existe físicamente
-            image_exists = False
-            physical_path = None
-            if image.image:
-                physical_path = image.image.path
-                image_exists = os.path.exists(physical_path)
-            
-            image_info = {
+        if not image_id:
+            return Response({"error": "Se requiere un ID de imagen"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            lod = parse_lod(request.query_params.get('lod'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            project_image = ProjectImage.objects.get(id=image_id, project=project, has_3d_data=True)
+        except (ProjectImage.DoesNotExist, ValueError):
+            return Response({"error": "Modelo 3D no encontrado en este proyecto"}, status=status.HTTP_404_NOT_FOUND)
+        
+        mesh = load_mesh(project_image, lod)
+        if mesh is None:
+            return Response({"error": "El modelo 3D no contiene geometría"}, status=status.HTTP_404_NOT_FOUND)
+        
+        glb = build_glb(mesh, quantize=quantize)
+        response = HttpResponse(glb, content_type=GLB_CONTENT_TYPE)
+        response["Content-Disposition"] = f'attachment; filename="project_{project.id}_model_{project_image.id}.glb"'
+        return response
+
+    @action(detail=True, methods=['get'])
+    def list_images(self, request, pk=None):
+        """
+        Lista paginada de las imágenes del proyecto con URLs absolutas
+
+        Se pagina por clave, de la más reciente a la más antigua: 'next' es
+        la URL de la página siguiente (None en la última). Query params:
+        page_size (50 por defecto, máximo 200) y cursor.
+
+        El estado del archivo (file_exists, file_size, checksum) es el que
+        guardó el último 'manage.py scan_image_integrity': el listado no
+        consulta el almacenamiento.
+        """
+        project = self.get_object()
+
+        try:
+            page_size = parse_page_size(request.query_params.get('page_size'))
+            images, next_cursor = keyset_page(
+                ProjectImage.objects.filter(project=project).only(*LISTED_IMAGE_FIELDS).prefetch_related('renditions'),
+                cursor=request.query_params.get('cursor'),
+                page_size=page_size
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        build_url = absolute_url_builder(request)
+        formatted_images = [
+            {
                 'id': image.id,
                 'name': f"Imagen {image.id}",
-                'image': request.build_absolute_uri(image.image.url) if image.image else None,
+                'image': build_url(image.image.url) if image.image else None,
+                'renditions': rendition_entries(image, build_url),
                 'uploaded_at': image.uploaded_at,
                 'has_3d_data': image.has_3d_data,
-                'file_exists': image_exists,
-                'physical_path': physical_path,
+                'file_exists': image.file_exists,
+                'file_size': image.file_size,
+                'checksum': image.checksum or None,
+                'file_checked_at': image.file_checked_at,
             }
-            
-            formatted_images.append(image_info)
-        
-        return Response(formatted_images)
+            for image in images
+        ]
+
+        next_url = None
+        if next_cursor:
+            query = request.query_params.copy()
+            query['cursor'] = next_cursor
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+        return Response({
+            'results': formatted_images,
+            'next': next_url,
+            'page_size': page_size,
+        })
 
     @action(detail=True, methods=['post'])
     def camera_capture(self, request, pk=None):
@@ -719,31 +1262,19 @@ class ProjectViewSet(viewsets.ModelViewSet):
             image=image_file
         )
         
-        # Extraer dimensiones de la imagen
-        try:
-            from PIL import Image
-            with Image.open(project_image.image.path) as img:
-                project_image.image_width, project_image.image_height = img.size
-                project_image.file_size = os.path.getsize(project_image.image.path)
-                project_image.save()
-        except Exception as e:
-            pass  # Continuar incluso si no se pueden extraer las dimensiones
+        # Miniatura, vista previa y dimensiones de la imagen (continúa aunque fallen)
+        generate_upload_renditions(project_image)
         
         # Generar modelo 3D si se solicita
+        if generate_3d and wants_async(request):
+            # La imagen ya está guardada; el modelo se genera en segundo plano
+            job = enqueue_job(ProcessingJob.KIND_GENERATE_3D, project, project_image, {'settings': settings})
+            data = ProjectImageSerializer(project_image).data
+            data['job'] = ProcessingJobSerializer(job, context={'request': request}).data
+            return Response(data, status=status.HTTP_202_ACCEPTED)
+        
         if generate_3d:
-            # Usar el procesador de imágenes
-            processor = ImageProcessor()
-            
-            # Generar datos 3D
-            results = processor.generate_3d_data(
-                project_image.image.path, 
-                settings=settings
-            )
-            
-            if isinstance(results, dict) and not results.get('error'):
-                project_image.has_3d_data = True
-                project_image.data_3d = results
-                project_image.save()
+            generate_model_3d(project_image, settings)
         
         # Serializar la respuesta
         serializer = ProjectImageSerializer(project_image)
@@ -772,14 +1303,21 @@ class ProjectViewSet(viewsets.ModelViewSet):
                         'algorithm': 'edge_detection',
                         'params': {'método': 'canny', 'umbral_inferior': 100, 'umbral_superior': 200}
                     }
-                ])
+                ]),
+                **output_options(request)
             }
             
+            if wants_async(request):
+                job = enqueue_job(ProcessingJob.KIND_PROCESS_IMAGE, project, project_image,
+                                  job_payload(request, pipeline=process_data['pipeline']))
+                return job_accepted_response(request, job)
+            
             # Marcar la imagen como en procesamiento
             project_image.start_processing()
             
             # Realizar el procesamiento usando la función interna
-            response_data = process_image_internal(process_data, project_image)
+            response_data = process_image_internal(process_data, project_image, inline_image=wants_inline(request),
+                                                   absolute_uri=request.build_absolute_uri)
             
             # Verificar si hay error
             if "error" in response_data:
@@ -792,12 +1330,241 @@ class ProjectViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=True, methods=['GET', 'POST'])
+    def process_image_stream(self, request, pk=None):
+        """
+        Procesa una imagen del proyecto enviando el progreso como server-sent events
+
+        Acepta image_id y pipeline en el cuerpo (POST) o en la query string
+        (GET, para EventSource; pipeline como JSON). Eventos:
+            started: job_id y URLs de estado, resultado y cancelación
+            stage_started / stage_completed: cada etapa, con tiempos,
+                detecciones, contornos y una vista previa de la imagen
+            depth_preview: vista previa del mapa de profundidad
+            finalizing: guardado de la imagen procesada
+            complete / error / cancelled: evento final
+
+        El pipeline se detiene si el cliente se desconecta o si se llama a
+        POST /api/jobs/<job_id>/cancel/.
+        """
+        project = self.get_object()
+        params = request.data if request.method == 'POST' else request.query_params
+        image_id = params.get('image_id')
+        pipeline = params.get('pipeline')
+
+        if isinstance(pipeline, str):
+            try:
+                pipeline = json.loads(pipeline)
+            except ValueError:
+                return Response({"error": "pipeline no es JSON válido"}, status=status.HTTP_400_BAD_REQUEST)
+        if not image_id:
+            return Response({"error": "ID de imagen no proporcionado"}, status=status.HTTP_400_BAD_REQUEST)
+        if not pipeline:
+            return Response({"error": "No processing pipeline specified"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            project_image = ProjectImage.objects.get(id=image_id, project=project)
+        except (ProjectImage.DoesNotExist, ValueError):
+            return Response({"error": "Imagen no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+
+        # El trabajo da al stream un identificador con el que cancelarlo desde otra petición
+        job = start_job(ProcessingJob.KIND_PROCESS_IMAGE, project, project_image,
+                        job_payload(request, pipeline=pipeline),
+                        worker_name=f"{STREAM_WORKER_PREFIX}{default_worker_name()}")
+        progress = StreamingProgress(is_cancelled=lambda: job_cancelled(job.id))
+        progress.emit("started", **ProcessingJobSerializer(job, context={'request': request}).data)
+
+        worker = threading.Thread(target=run_streamed_job, args=(job, progress), daemon=True)
+        worker.start()
+
+        def events():
+            try:
+                yield from progress.stream()
+            finally:
+                # El cliente se desconectó antes del final: detener el pipeline
+                if worker.is_alive():
+                    progress.cancel()
+
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    @action(detail=True, methods=['POST'])
+    def process_batch(self, request, pk=None):
+        """
+        Procesa varias imágenes del proyecto con un mismo pipeline
+
+        Body:
+            image_ids: Lista de IDs de imagen, o bien
+            all_unprocessed: true para todas las imágenes aún sin procesar
+            pipeline: Pipeline común (mismo formato que process_image)
+            async: Encolar un trabajo por imagen en lugar de procesarlas aquí
+
+        La respuesta es NDJSON: una línea por imagen en cuanto termina y una
+        última línea con el resumen del lote. Con async responde 202 con los
+        trabajos creados.
+        """
+        project = self.get_object()
+        pipeline = request.data.get('pipeline')
+        image_ids = request.data.get('image_ids')
+        all_unprocessed = request.data.get('all_unprocessed', False)
+
+        if not pipeline:
+            return Response({"error": "No processing pipeline specified"}, status=status.HTTP_400_BAD_REQUEST)
+
+        images = deferred_images().filter(project=project).select_related('project')
+        if image_ids:
+            if not isinstance(image_ids, list) or not all(str(image_id).isdigit() for image_id in image_ids):
+                return Response({"error": "'image_ids' debe ser una lista de IDs de imagen"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            image_ids = [int(image_id) for image_id in image_ids]
+            project_images = list(images.filter(id__in=image_ids))
+            missing = sorted(set(image_ids) - {image.id for image in project_images})
+            if missing:
+                return Response(
+                    {"error": "Imágenes no encontradas en este proyecto", "image_ids": missing},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+        elif all_unprocessed:
+            project_images = list(images.filter(processed=False))
+        else:
+            return Response({"error": "Se requiere image_ids o all_unprocessed"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if wants_async(request):
+            jobs = enqueue_jobs(ProcessingJob.KIND_PROCESS_IMAGE, project, project_images,
+                                job_payload(request, pipeline=pipeline))
+            serializer = ProcessingJobSerializer(jobs, many=True, context={'request': request})
+            return Response({"count": len(jobs), "jobs": serializer.data}, status=status.HTTP_202_ACCEPTED)
+
+        lines = (
+            json.dumps(item, cls=DjangoJSONEncoder) + "\n"
+            for item in iter_process_batch(project_images, pipeline, absolute_uri=request.build_absolute_uri,
+                                           options=output_options(request))
+        )
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+class ImageContentNegotiation(DefaultContentNegotiation):
+    """
+    Negociación para los endpoints que devuelven imágenes: la cabecera
+    Accept elige el formato de la imagen, no el renderer, así que los
+    errores se devuelven siempre como JSON en lugar de 406
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
 # Nuevo ViewSet para ProjectImage
 class ProjectImageViewSet(viewsets.ModelViewSet):
     queryset = ProjectImage.objects.all()
     serializer_class = ProjectImageSerializer
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        if self.action == 'list':
+            fields, _, _ = parse_fieldsets(self.request)
+            return deferred_images(fields, renditions=True)
+        return ProjectImage.objects.all()
+
+    def perform_create(self, serializer):
+        project_image = serializer.save()
+        # Miniatura, vista previa y metadatos del original
+        generate_upload_renditions(project_image)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ('list', 'retrieve'):
+            fields, _, _ = parse_fieldsets(self.request)
+            if self.action == 'list' and fields is None:
+                fields = LIGHT_IMAGE_FIELDS
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    @action(detail=True, methods=['get'], content_negotiation_class=ImageContentNegotiation)
+    def processed(self, request, pk=None):
+        """
+        Imagen procesada con validación HTTP (ETag y Last-Modified)
+
+        Con ?v= igual a la versión actual (la URL que devuelve process_image)
+        la respuesta se puede cachear indefinidamente; sin ella el navegador
+        revalida y recibe 304 si la imagen no cambió.
+
+        El formato se negocia con la cabecera Accept: si el cliente acepta el
+        formato guardado se envía tal cual; si no, el primero de
+        PROCESSED_IMAGE_FORMATS que acepte (?output_format= lo fuerza). Las
+        conversiones se guardan junto a la imagen y se reutilizan hasta que
+        se reprocesa. Los PNG (sin pérdida) no se convierten salvo que se pida.
+        """
+        project_image = get_object_or_404(deferred_images(), pk=pk)
+        if not project_image.processed_image:
+            return Response({"error": "La imagen no ha sido procesada"}, status=status.HTTP_404_NOT_FOUND)
+
+        path = project_image.processed_image.path
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return Response({"error": "Archivo de imagen procesada no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+
+        stored_format = format_from_extension(os.path.splitext(path)[1])
+        requested_format = request.query_params.get('output_format')
+        if requested_format:
+            if requested_format not in available_formats():
+                return Response({"error": f"Formato de imagen no disponible: {requested_format}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            serve_format = requested_format
+        elif stored_format is None or stored_format == FORMAT_PNG:
+            serve_format = stored_format
+        elif accepts_format(parse_accept(request.META.get('HTTP_ACCEPT')), stored_format):
+            serve_format = stored_format
+        else:
+            order = getattr(settings, 'PROCESSED_IMAGE_FORMATS', NEGOTIATION_ORDER)
+            serve_format = negotiate_format(request.META.get('HTTP_ACCEPT'), order)
+
+        version = processed_image_version(path)
+        etag = f'"{version}-{serve_format}"' if serve_format else f'"{version}"'
+        if request.query_params.get('v') == version:
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            cache_control = "no-cache"
+
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            serve_path = path
+            if serve_format != stored_format:
+                try:
+                    serve_path = self._converted_image(path, stat, serve_format)
+                except (OSError, ValueError) as e:
+                    return Response({"error": f"No se pudo convertir la imagen: {str(e)}"},
+                                    status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            content_type = (format_content_type(serve_format) if serve_format
+                            else mimetypes.guess_type(path)[0] or 'image/jpeg')
+            response = FileResponse(open(serve_path, 'rb'), content_type=content_type)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        response["Cache-Control"] = cache_control
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    @staticmethod
+    def _converted_image(path, stat, fmt):
+        """
+        Ruta de la imagen procesada convertida a fmt, creándola si no existe
+        o es anterior a la imagen guardada
+        """
+        converted_path = os.path.splitext(path)[0] + format_extension(fmt)
+        try:
+            if os.stat(converted_path).st_mtime_ns >= stat.st_mtime_ns:
+                return converted_path
+        except OSError:
+            pass
+
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError("No se pudo leer la imagen procesada")
+        tier = getattr(settings, 'PROCESSED_IMAGE_QUALITY', TIER_STANDARD)
+        write_atomic(converted_path, encode_image(image, fmt, tier if tier in QUALITY_TIERS else TIER_STANDARD))
+        return converted_path
+
     def create(self, request, *args, **kwargs):
         # Obtener el ID del proyecto
         project_id = request.data.get('project')
@@ -817,3 +1584,198 @@ class ProjectImageViewSet(viewsets.ModelViewSet):
             return Response({"error": "Proyecto no encontrado"}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ProcessingJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Trabajos de procesamiento en segundo plano
+
+    POST /jobs/ encola un trabajo y responde 202 con su identificador;
+    GET /jobs/<id>/ devuelve su estado y GET /jobs/<id>/result/ su resultado.
+    Los trabajos los ejecutan los workers de 'manage.py process_jobs'.
+    """
+    serializer_class = ProcessingJobSerializer
+    permission_classes = [AllowAny]
+
+    # Filtros del listado: parámetro de la query string -> campo
+    LIST_FILTERS = (('project', 'project_id'), ('image_id', 'project_image_id'),
+                    ('status', 'status'), ('kind', 'kind'))
+    ID_FILTERS = ('project', 'image_id')
+
+    def list_filters(self):
+        """
+        Raises:
+            ValueError: Si un filtro de ID no es un entero
+        """
+        filters = {}
+        for param, field in self.LIST_FILTERS:
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            if param in self.ID_FILTERS and not value.isdigit():
+                raise ValueError(f"'{param}' debe ser un ID entero")
+            filters[field] = value
+        return filters
+
+    def get_queryset(self):
+        queryset = ProcessingJob.objects.all()
+        if self.action == 'list':
+            queryset = queryset.filter(**self.list_filters())
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        try:
+            self.list_filters()
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
+
+    def create(self, request, *args, **kwargs):
+        kind = request.data.get('kind', ProcessingJob.KIND_PROCESS_IMAGE)
+        image_id = request.data.get('image_id')
+
+        if kind not in dict(ProcessingJob.KIND_CHOICES):
+            return Response({"error": f"Tipo de trabajo no soportado: {kind}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not image_id:
+            return Response({"error": "Se requiere un ID de imagen"}, status=status.HTTP_400_BAD_REQUEST)
+        if not str(image_id).isdigit():
+            return Response({"error": "'image_id' debe ser un ID entero"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            project_image = ProjectImage.objects.select_related('project').get(id=image_id)
+        except ProjectImage.DoesNotExist:
+            return Response({"error": "Imagen no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+
+        if kind == ProcessingJob.KIND_GENERATE_3D:
+            payload = {'settings': request.data.get('settings', {})}
+        else:
+            payload = job_payload(
+                request,
+                pipeline=request.data.get('pipeline', []),
+                generate_3d=bool(request.data.get('generate_3d', False))
+            )
+
+        job = enqueue_job(kind, project_image.project, project_image, payload)
+        return job_accepted_response(request, job)
+
+    @action(detail=True, methods=['get'])
+    def result(self, request, pk=None):
+        """
+        Resultado de un trabajo terminado, con la misma forma que la respuesta
+        síncrona del endpoint equivalente
+        """
+        job = self.get_object()
+
+        if not job.is_finished:
+            return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+        if job.status == ProcessingJob.STATUS_FAILED:
+            return Response({"error": job.error_message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if job.status == ProcessingJob.STATUS_CANCELLED:
+            return Response({"error": job.error_message}, status=status.HTTP_409_CONFLICT)
+
+        data = dict(job.result or {})
+        project_image = job.project_image
+        # La geometría no se guarda en el trabajo: se lee del almacén de mallas
+        if project_image and project_image.has_3d_data and project_image.data_3d:
+            if job.kind == ProcessingJob.KIND_GENERATE_3D:
+                data["results"] = inline_model_3d(project_image)
+                data["mesh_url"] = mesh_url(request, job.project_id, project_image.id)
+            else:
+                data["model_3d"] = inline_model_3d(project_image)
+        return Response(data)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """
+        Cancela un trabajo en cola o en ejecución (incluidos los que se
+        siguen por process_image_stream)
+        """
+        job = self.get_object()
+        if not cancel_job(job):
+            return Response({"error": "El trabajo ya terminó", "status": job.status}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(job).data)
+
+
+class OperationAnalyticsViewSet(viewsets.ViewSet):
+    """
+    Analíticas de telemetría sobre los ProcessingOperation registrados
+
+    GET /analytics/latency/ devuelve la latencia de cada algoritmo
+    (percentiles e histograma), GET /analytics/throughput/ las operaciones
+    por intervalo de tiempo y GET /analytics/slowest_parameters/ las
+    combinaciones de parámetros más lentas.
+
+    Filtros comunes: since/until (ISO 8601, por defecto los últimos
+    'days' días, 7 si no se indica), algorithm y project.
+    """
+    permission_classes = [AllowAny]
+
+    DEFAULT_DAYS = 7
+
+    def filtered_operations(self, request):
+        """
+        Operaciones que cumplen los filtros de la petición
+
+        Raises:
+            ValueError: Si algún filtro no es válido
+        """
+        params = request.query_params
+        until = None
+        if params.get('until'):
+            until = parse_datetime(params['until'])
+            if until is None:
+                raise ValueError("Fecha 'until' no válida")
+        if params.get('since'):
+            since = parse_datetime(params['since'])
+            if since is None:
+                raise ValueError("Fecha 'since' no válida")
+        else:
+            days = params.get('days', self.DEFAULT_DAYS)
+            if not str(days).isdigit() or int(days) < 1:
+                raise ValueError("'days' debe ser un entero mayor que 0")
+            days = int(days)
+            since = (until or timezone.now()) - timedelta(days=days)
+        return filter_operations(
+            since=since,
+            until=until,
+            algorithm=params.get('algorithm'),
+            project_id=params.get('project')
+        )
+
+    @action(detail=False, methods=['get'])
+    def latency(self, request):
+        """Latencia por algoritmo: p50/p95/p99, media, extremos e histograma en ms"""
+        try:
+            operations = self.filtered_operations(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"algorithms": latency_by_algorithm(operations)})
+
+    @action(detail=False, methods=['get'])
+    def throughput(self, request):
+        """Operaciones por intervalo ('minute', 'hour' o 'day') y algoritmo"""
+        interval = request.query_params.get('interval', 'hour')
+        if interval not in THROUGHPUT_INTERVALS:
+            return Response({"error": f"Intervalo no soportado: {interval}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            operations = self.filtered_operations(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"interval": interval, "buckets": throughput_over_time(operations, interval)})
+
+    @action(detail=False, methods=['get'])
+    def slowest_parameters(self, request):
+        """Combinaciones de algoritmo y parámetros con mayor latencia media"""
+        try:
+            operations = self.filtered_operations(request)
+            limit = str(request.query_params.get('limit', 10))
+            if not limit.isdigit() or int(limit) < 1:
+                raise ValueError("'limit' debe ser un entero mayor que 0")
+            limit = min(int(limit), 100)
+            min_operations = str(request.query_params.get('min_operations', 1))
+            if not min_operations.isdigit():
+                raise ValueError("'min_operations' debe ser un entero mayor o igual que 0")
+            min_operations = int(min_operations)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"parameters": slowest_parameters(operations, limit, min_operations)})
@@ -2,8 +2,14 @@ import cv2
 import numpy as np
 import os
 import logging
+import threading
 from abc import ABC, abstractmethod
 
+from vision.depth_primitives import (
+    BLEND_REPLACE, draw_elliptical_bump, draw_radial_bump, draw_vertical_gradient
+)
+from vision.image_context import ImageContext
+
 # Configurar logging
 logger = logging.getLogger(__name__)
 
@@ -19,7 +25,7 @@ class BaseImageProcessor(ABC):
         Procesa una imagen según la especialización
         
         Args:
-            image: Imagen en formato numpy array (OpenCV)
+            image: Imagen en formato numpy array (OpenCV) o ImageContext
             
         Returns:
             Tuple de (imagen procesada, mapa de profundidad, contornos)
@@ -32,7 +38,7 @@ class BaseImageProcessor(ABC):
         Genera un mapa de profundidad a partir de una imagen
         
         Args:
-            image: Imagen en formato numpy array (OpenCV)
+            image: Imagen en formato numpy array (OpenCV) o ImageContext
             detail_level: Nivel de detalle (1-10)
             sensitivity: Sensibilidad (0-1)
             
@@ -48,11 +54,7 @@ class BaseImageProcessor(ABC):
         Returns:
             Lista de contornos
         """
-        # Convertir a escala de grises si es necesario
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image.copy()
+        context = ImageContext.wrap(image)
         
         # Ajustar parámetros según nivel de detalle y sensibilidad
         blur_size = max(1, 11 - detail_level)
@@ -62,9 +64,8 @@ class BaseImageProcessor(ABC):
         canny_low = int(100 * sensitivity)
         canny_high = int(200 * sensitivity)
         
-        # Aplicar filtros
-        blurred = cv2.GaussianBlur(gray, (blur_size, blur_size), 0)
-        edges = cv2.Canny(blurred, canny_low, canny_high)
+        # Aplicar filtros (escala de grises, desenfoque y Canny compartidos con las demás etapas)
+        edges = context.canny(canny_low, canny_high, blur=blur_size)
         
         # Encontrar contornos
         contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -131,22 +132,20 @@ class CircuitImageProcessor(BaseImageProcessor):
         """
         Procesa imágenes de circuitos destacando pistas y componentes
         """
-        # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        context = ImageContext.wrap(image)
         
         # Aplicar umbral adaptativo para destacar pistas
-        thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                      cv2.THRESH_BINARY, 11, 2)
+        thresh = self._adaptive_threshold(context)
         
         # Extraer contornos
-        contours = self.extract_contours(image)
+        contours = self.extract_contours(context)
         
         # Crear imagen procesada con contornos destacados
-        processed = image.copy()
+        processed = context.image.copy()
         cv2.drawContours(processed, contours, -1, (0, 255, 0), 2)
         
         # Generar mapa de profundidad
-        depth_map = self.generate_depth_map(image)
+        depth_map = self.generate_depth_map(context)
         
         return processed, depth_map, contours
     
@@ -154,15 +153,14 @@ class CircuitImageProcessor(BaseImageProcessor):
         """
         Genera un mapa de profundidad para circuitos
         """
-        # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        context = ImageContext.wrap(image)
+        gray = context.gray()
         
         # Aplicar umbral adaptativo
-        thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                    cv2.THRESH_BINARY, 11, 2)
+        thresh = self._adaptive_threshold(context)
         
         # Detectar bordes
-        edges = cv2.Canny(gray, int(50 * sensitivity), int(150 * sensitivity))
+        edges = context.canny(int(50 * sensitivity), int(150 * sensitivity))
         
         # Detectar líneas usando transformada de Hough
         lines = cv2.HoughLinesP(edges, 1, np.pi/180, 
@@ -179,7 +177,7 @@ class CircuitImageProcessor(BaseImageProcessor):
                 cv2.line(line_mask, (x1, y1), (x2, y2), 1.0, 2)
         
         # Detectar componentes electrónicos con HSV
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        hsv = context.hsv()
         
         # Crear máscaras para colores comunes en componentes electrónicos
         mask_green = cv2.inRange(hsv, (35, 50, 50), (85, 255, 255))  # Verde (placas)
@@ -207,6 +205,13 @@ class CircuitImageProcessor(BaseImageProcessor):
         depth_map = cv2.bilateralFilter(depth_map, 9, 75, 75)
         
         return depth_map
+    
+    def _adaptive_threshold(self, context):
+        return context.derive(
+            "adaptive_threshold", (11, 2),
+            lambda: cv2.adaptiveThreshold(context.gray(), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                          cv2.THRESH_BINARY, 11, 2)
+        )
 
 
 class FaceImageProcessor(BaseImageProcessor):
@@ -219,16 +224,24 @@ class FaceImageProcessor(BaseImageProcessor):
         # Cargar clasificadores de OpenCV
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        
+        # La instancia se comparte entre hilos y los clasificadores en cascada
+        # no admiten detecciones concurrentes
+        self.cascade_lock = threading.Lock()
     
     def process_image(self, image):
         """
         Procesa imágenes de rostros destacándolos
         """
+        context = ImageContext.wrap(image)
+        image = context.image
+        
         # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = context.gray()
         
         # Detectar rostros
-        faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+        with self.cascade_lock:
+            faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
         
         # Crear imagen procesada
         processed = image.copy()
@@ -242,12 +255,13 @@ class FaceImageProcessor(BaseImageProcessor):
             roi_color = processed[y:y+h, x:x+w]
             
             # Detectar ojos dentro del rostro
-            eyes = self.eye_cascade.detectMultiScale(roi_gray)
+            with self.cascade_lock:
+                eyes = self.eye_cascade.detectMultiScale(roi_gray)
             for (ex, ey, ew, eh) in eyes:
                 cv2.rectangle(roi_color, (ex, ey), (ex+ew, ey+eh), (0, 255, 0), 2)
         
         # Generar mapa de profundidad
-        depth_map = self.generate_depth_map(image)
+        depth_map = self.generate_depth_map(context)
         
         # Convertir rectángulos de rostros a contornos
         contours = []
@@ -262,33 +276,27 @@ class FaceImageProcessor(BaseImageProcessor):
         Genera un mapa de profundidad para rostros
         """
         # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = ImageContext.wrap(image).gray()
         
         # Crear un mapa de profundidad base
         depth_map = gray.astype(np.float32) / 255.0
         
         # Detectar rostros
-        faces = self.face_cascade.detectMultiScale(
-            gray, 
-            scaleFactor=1.1, 
-            minNeighbors=max(3, min(8, int(4 + sensitivity * 5))),
-            minSize=(30, 30)
-        )
+        with self.cascade_lock:
+            faces = self.face_cascade.detectMultiScale(
+                gray, 
+                scaleFactor=1.1, 
+                minNeighbors=max(3, min(8, int(4 + sensitivity * 5))),
+                minSize=(30, 30)
+            )
         
         # Crear una máscara para las regiones de rostros
         face_mask = np.zeros_like(depth_map)
         
         for (x, y, w, h) in faces:
-            # Crear un gradiente radial para cada rostro
-            center_x, center_y = x + w//2, y + h//2
-            for i in range(y, y + h):
-                for j in range(x, x + w):
-                    # Calcular distancia normalizada al centro del rostro
-                    dist = np.sqrt(((j - center_x) / (w/2))**2 + ((i - center_y) / (h/2))**2)
-                    # Crear un abultamiento para el rostro (mayor en el centro)
-                    if dist < 1.0:
-                        boost = max(0, min(1, (np.cos(dist * np.pi/2) * 0.7 + 0.3) * detail_level / 5))
-                        face_mask[i, j] = boost
+            # Abultamiento elíptico para cada rostro (mayor en el centro)
+            draw_elliptical_bump(face_mask, x, y, w, h, floor=0.3, gain=detail_level / 5,
+                                 clip=True, blend=BLEND_REPLACE)
         
         # Combinar con el mapa de profundidad original
         enhanced_depth = depth_map * (1.0 - face_mask * 0.8) + face_mask * 0.8
@@ -310,11 +318,11 @@ class RoundObjectProcessor(BaseImageProcessor):
         """
         Procesa imágenes destacando objetos redondos
         """
-        # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        context = ImageContext.wrap(image)
+        image = context.image
         
-        # Reducir ruido
-        gray_blurred = cv2.GaussianBlur(gray, (9, 9), 2)
+        # Escala de grises con reducción de ruido
+        gray_blurred = context.gaussian_blur(9, 2)
         
         # Detectar círculos
         circles = cv2.HoughCircles(
@@ -355,7 +363,7 @@ class RoundObjectProcessor(BaseImageProcessor):
                 contours.append(np.array(contour_points, dtype=np.int32))
         
         # Generar mapa de profundidad
-        depth_map = self.generate_depth_map(image)
+        depth_map = self.generate_depth_map(context)
         
         return processed, depth_map, contours
     
@@ -363,11 +371,11 @@ class RoundObjectProcessor(BaseImageProcessor):
         """
         Genera un mapa de profundidad para objetos redondos
         """
-        # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        context = ImageContext.wrap(image)
         
-        # Reducir ruido
-        gray_blurred = cv2.GaussianBlur(gray, (9, 9), 2)
+        # Escala de grises con reducción de ruido
+        gray = context.gray()
+        gray_blurred = context.gaussian_blur(9, 2)
         
         # Detectar círculos con parámetros ajustados según sensibilidad
         param2 = 30 + int((1 - sensitivity) * 20)  # Más sensible con valores más bajos
@@ -392,21 +400,9 @@ class RoundObjectProcessor(BaseImageProcessor):
         if circles is not None:
             circles = np.uint16(np.around(circles))
             
-            for i in circles[0, :]:
-                # Dibujar círculo con gradiente radial
-                center = (i[0], i[1])
-                radius = i[2]
-                
-                # Crear máscara circular con gradiente
-                for y in range(max(0, center[1]-radius), min(depth_map.shape[0], center[1]+radius+1)):
-                    for x in range(max(0, center[0]-radius), min(depth_map.shape[1], center[0]+radius+1)):
-                        dist = np.sqrt((x - center[0])**2 + (y - center[1])**2)
-                        if dist <= radius:
-                            # Crear un abultamiento para el círculo
-                            # Ajustar según nivel de detalle
-                            boost_factor = detail_level / 5
-                            boost = (np.cos(dist/radius * np.pi/2) * 0.5 + 0.5) * boost_factor
-                            circle_mask[y, x] = max(circle_mask[y, x], boost)
+            for center_x, center_y, radius in circles[0, :]:
+                # Abultamiento con gradiente radial, ajustado según nivel de detalle
+                draw_radial_bump(circle_mask, center_x, center_y, radius, floor=0.5, gain=detail_level / 5)
         
         # Combinar con el mapa de profundidad original
         enhanced_depth = depth_map * (1.0 - circle_mask * 0.7) + circle_mask * 0.7
@@ -428,11 +424,10 @@ class TrigonometricObjectProcessor(BaseImageProcessor):
         """
         Procesa imágenes destacando objetos trigonométricos
         """
-        # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        context = ImageContext.wrap(image)
         
         # Detectar bordes
-        edges = cv2.Canny(gray, 50, 150)
+        edges = context.canny(50, 150)
         
         # Detectar líneas
         lines = cv2.HoughLinesP(
@@ -445,7 +440,7 @@ class TrigonometricObjectProcessor(BaseImageProcessor):
         )
         
         # Crear imagen procesada
-        processed = image.copy()
+        processed = context.image.copy()
         
         # Dibujar líneas
         if lines is not None:
@@ -454,13 +449,13 @@ class TrigonometricObjectProcessor(BaseImageProcessor):
                 cv2.line(processed, (x1, y1), (x2, y2), (0, 255, 0), 2)
         
         # Extraer contornos
-        contours = self.extract_contours(image)
+        contours = self.extract_contours(context)
         
         # Dibujar contornos
         cv2.drawContours(processed, contours, -1, (0, 0, 255), 2)
         
         # Generar mapa de profundidad
-        depth_map = self.generate_depth_map(image)
+        depth_map = self.generate_depth_map(context)
         
         return processed, depth_map, contours
     
@@ -468,11 +463,11 @@ class TrigonometricObjectProcessor(BaseImageProcessor):
         """
         Genera un mapa de profundidad para objetos trigonométricos
         """
-        # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        context = ImageContext.wrap(image)
+        gray = context.gray()
         
         # Detectar bordes
-        edges = cv2.Canny(gray, int(50 * sensitivity), int(150 * sensitivity))
+        edges = context.canny(int(50 * sensitivity), int(150 * sensitivity))
         
         # Detectar líneas
         lines = cv2.HoughLinesP(
@@ -496,7 +491,7 @@ class TrigonometricObjectProcessor(BaseImageProcessor):
         line_mask = line_mask / 255.0
         
         # Crear triángulos y polígonos a partir de contornos para mapeo 3D
-        contours = self.extract_contours(image, detail_level, sensitivity)
+        contours = self.extract_contours(context, detail_level, sensitivity)
         
         # Crear máscara de polígonos
         poly_mask = np.zeros_like(gray, dtype=np.float32)
@@ -534,6 +529,9 @@ class PersonImageProcessor(BaseImageProcessor):
         """
         Procesa imágenes destacando personas
         """
+        context = ImageContext.wrap(image)
+        image = context.image
+        
         # Detectar personas
         boxes, weights = self.hog.detectMultiScale(
             image, 
@@ -562,7 +560,7 @@ class PersonImageProcessor(BaseImageProcessor):
                        (x, y-5), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
         
         # Generar mapa de profundidad
-        depth_map = self.generate_depth_map(image)
+        depth_map = self.generate_depth_map(context)
         
         return processed, depth_map, contours
     
@@ -570,8 +568,11 @@ class PersonImageProcessor(BaseImageProcessor):
         """
         Genera un mapa de profundidad para personas
         """
+        context = ImageContext.wrap(image)
+        image = context.image
+        
         # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = context.gray()
         
         # Crear un mapa de profundidad base
         depth_map = gray.astype(np.float32) / 255.0
@@ -591,12 +592,7 @@ class PersonImageProcessor(BaseImageProcessor):
         
         for (x, y, w, h) in boxes:
             # Crear gradiente vertical para cada persona (cabeza más alta que pies)
-            for i in range(y, y + h):
-                height_factor = 1 - (i - y) / h  # 1 en la parte superior, 0 en la parte inferior
-                boost = height_factor * detail_level / 5
-                
-                for j in range(x, x + w):
-                    person_mask[i, j] = max(person_mask[i, j], boost)
+            draw_vertical_gradient(person_mask, x, y, w, h, gain=detail_level / 5)
         
         # Combinar con el mapa de profundidad original
         enhanced_depth = depth_map * 0.5 + person_mask * 0.5
@@ -618,17 +614,19 @@ class DefaultImageProcessor(BaseImageProcessor):
         """
         Implementación por defecto de procesamiento de imagen
         """
+        context = ImageContext.wrap(image)
+        
         # Crear una copia de la imagen original
-        processed = image.copy()
+        processed = context.image.copy()
         
         # Extraer contornos básicos
-        contours = self.extract_contours(image)
+        contours = self.extract_contours(context)
         
         # Dibujar contornos en la imagen
         cv2.drawContours(processed, contours, -1, (0, 255, 0), 2)
         
         # Generar mapa de profundidad
-        depth_map = self.generate_depth_map(image)
+        depth_map = self.generate_depth_map(context)
         
         return processed, depth_map, contours
     
@@ -636,17 +634,13 @@ class DefaultImageProcessor(BaseImageProcessor):
         """
         Implementación por defecto de generación de mapa de profundidad
         """
-        # Convertir a escala de grises si la imagen es a color
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image.copy()
+        context = ImageContext.wrap(image)
         
-        # Aplicar filtro bilateral para reducir ruido manteniendo bordes
-        blurred = cv2.bilateralFilter(gray, 9, 75, 75)
+        # Convertir a escala de grises si la imagen es a color
+        gray = context.gray()
         
-        # Detectar bordes
-        edges = cv2.Canny(blurred, int(100 * sensitivity), int(200 * sensitivity))
+        # Detectar bordes tras un filtro bilateral que reduce ruido manteniendo bordes
+        edges = context.canny(int(100 * sensitivity), int(200 * sensitivity), blur="bilateral")
         
         # Crear un mapa de profundidad básico a partir de la escala de grises
         depth_map = gray.astype(np.float32) / 255.0
@@ -663,7 +657,63 @@ class DefaultImageProcessor(BaseImageProcessor):
         return final_map
 
 
-# Crear un factory para obtener el procesador adecuado según el tipo de imagen
+# Procesador especializado para cada tipo de imagen
+PROCESSOR_CLASSES = {
+    'rostros': FaceImageProcessor,
+    'circuitos': CircuitImageProcessor,
+    'redondos': RoundObjectProcessor,
+    'trigonometria': TrigonometricObjectProcessor,
+    'personas': PersonImageProcessor
+}
+
+class ProcessorRegistry:
+    """
+    Registro de procesadores especializados compartido por todo el proceso
+
+    Cada procesador se construye una sola vez, la primera vez que se pide
+    (cargar los clasificadores en cascada y el descriptor HOG es costoso),
+    y después se reutiliza desde cualquier hilo.
+    """
+    
+    def __init__(self, processor_classes, default_class):
+        self.processor_classes = dict(processor_classes)
+        self.default_class = default_class
+        self._instances = {}
+        self._lock = threading.Lock()
+    
+    def get(self, image_type):
+        """
+        Devuelve el procesador del tipo indicado, o el procesador por defecto
+        si el tipo no es conocido
+        """
+        key = image_type if image_type in self.processor_classes else None
+        processor = self._instances.get(key)
+        if processor is None:
+            with self._lock:
+                # Otro hilo puede haberlo construido mientras se esperaba el bloqueo
+                processor = self._instances.get(key)
+                if processor is None:
+                    processor_class = self.processor_classes.get(key, self.default_class)
+                    processor = processor_class()
+                    self._instances[key] = processor
+                    logger.info(f"Procesador '{processor.name}' inicializado")
+        return processor
+    
+    def warm_up(self, image_types=None):
+        """
+        Construye por adelantado los procesadores indicados (todos por defecto),
+        para que la primera petición no pague la carga de los modelos
+        """
+        for image_type in image_types or list(self.processor_classes) + [None]:
+            self.get(image_type)
+    
+    def clear(self):
+        """Descarta los procesadores construidos"""
+        with self._lock:
+            self._instances.clear()
+
+processor_registry = ProcessorRegistry(PROCESSOR_CLASSES, DefaultImageProcessor)
+
 def get_image_processor(image_type):
     """
     Devuelve el procesador adecuado según el tipo de imagen
@@ -672,15 +722,12 @@ def get_image_processor(image_type):
         image_type: Tipo de imagen ('rostros', 'circuitos', 'redondos', 'trigonometria', 'personas')
         
     Returns:
-        Instancia del procesador especializado
+        Instancia del procesador especializado (compartida en el proceso)
     """
-    processors = {
-        'rostros': FaceImageProcessor(),
-        'circuitos': CircuitImageProcessor(),
-        'redondos': RoundObjectProcessor(),
-        'trigonometria': TrigonometricObjectProcessor(),
-        'personas': PersonImageProcessor()
-    }
-    
-    # Devolver procesador específico o uno por defecto si no existe
-    return processors.get(image_type, DefaultImageProcessor()) 
\ No newline at end of file
+    return processor_registry.get(image_type)
+
+def warm_up_processors(image_types=None):
+    """
+    Inicializa los procesadores al arrancar un worker (ver PROCESSOR_WARMUP en settings)
+    """
+    processor_registry.warm_up(image_types)
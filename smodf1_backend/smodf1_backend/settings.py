@@ -96,6 +96,75 @@ MODELS3D_ROOT = os.path.join(BASE_DIR, 'models3d')
 if not os.path.exists(MODELS3D_ROOT):
     os.makedirs(MODELS3D_ROOT)
 
+# Inicializar los procesadores especializados de OpenCV al arrancar cada
+# worker WSGI/ASGI en lugar de en la primera petición que los necesite
+PROCESSOR_WARMUP = False
+
+# Dónde se ejecutan las etapas limitadas por CPU (k-means, Mean Shift,
+# mapas de profundidad especializados, HOG y mallado):
+#   'inline'  - en el hilo de la petición
+#   'thread'  - en un pool de hilos (OpenCV y NumPy liberan el GIL)
+#   'process' - en un pool de procesos persistente que carga los
+#               procesadores al arrancar; los arrays viajan por memoria compartida
+# PROCESSING_EXECUTOR_WORKERS = None usa un hilo o proceso por núcleo.
+PROCESSING_EXECUTOR = 'inline'
+PROCESSING_EXECUTOR_WORKERS = None
+
+# Imágenes que se procesan a la vez en process_batch (un hilo y un
+# ImageProcessor por imagen en curso)
+PROCESSING_BATCH_WORKERS = 4
+
+# Formato de las imágenes procesadas ('jpeg', 'webp', 'avif' o 'png') y
+# nivel de calidad ('low', 'standard' o 'high'); los mapas de bordes se
+# guardan siempre en PNG, sin pérdida. JPEG es el formato por defecto que
+# esperan los clientes existentes; WebP o AVIF se piden con output_format o
+# se sirven por negociación: si el cliente no acepta el formato guardado
+# (cabecera Accept), se le envía convertido al primero de
+# PROCESSED_IMAGE_FORMATS que acepte.
+PROCESSED_IMAGE_FORMAT = 'jpeg'
+PROCESSED_IMAGE_QUALITY = 'standard'
+PROCESSED_IMAGE_FORMATS = ['avif', 'webp', 'jpeg']
+
+# Versiones reducidas que se generan al subir cada imagen: nombre y lado
+# mayor en píxeles, formato y nivel de calidad
+IMAGE_RENDITION_SIZES = {'preview': 1024, 'thumb': 256}
+IMAGE_RENDITION_FORMAT = 'webp'
+IMAGE_RENDITION_QUALITY = 'standard'
+
+# Las estadísticas de proyectos usan su propia caché, compartida por todos
+# los procesos (servidores web y workers de 'manage.py process_jobs'): la
+# invalidación al escribir una imagen tiene que llegar a todos, y con una
+# caché en memoria solo llegaría al proceso que escribió. La tabla se crea
+# con 'manage.py createcachetable' tras 'manage.py migrate'.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'statistics': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'smodf1_statistics_cache',
+    },
+}
+STATISTICS_CACHE_ALIAS = 'statistics'
+
+# Segundos que se guardan en caché las estadísticas de proyectos (se
+# invalidan antes si cambia alguna imagen)
+STATISTICS_CACHE_TIMEOUT = 300
+
+# Caché persistente de mapas de profundidad y mallas, direccionada por el
+# contenido de la imagen, el tipo de procesador, la configuración y la
+# versión del código. Al superar el tamaño máximo se expulsan las entradas
+# usadas hace más tiempo; con 0 se desactiva.
+RESULT_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'results')
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512MB
+
+# Cola de trabajos en base de datos ('manage.py process_jobs --workers N').
+# Los trabajos en ejecución durante más de PROCESSING_JOB_TIMEOUT segundos
+# se consideran abandonados y vuelven a la cola hasta agotar los intentos.
+PROCESSING_JOB_POLL_INTERVAL = 1.0
+PROCESSING_JOB_TIMEOUT = 30 * 60
+PROCESSING_JOB_MAX_ATTEMPTS = 2
+
 # Convertir esta configuración en más permisiva durante desarrollo
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8080",
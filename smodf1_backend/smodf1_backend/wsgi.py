@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smodf1_backend.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.PROCESSOR_WARMUP:
+    from opencv_processors import warm_up_processors
+    from vision.executor import warm_up_executor
+    warm_up_processors()
+    warm_up_executor()
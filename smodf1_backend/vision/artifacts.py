@@ -0,0 +1,142 @@
+import gzip
+import json
+import logging
+import os
+import struct
+import uuid
+
+import numpy as np
+
+from .mesh import pack_mesh, unpack_mesh
+
+logger = logging.getLogger(__name__)
+
+# Artefacto de un modelo 3D: un único archivo gzip con una cabecera
+# little-endian (magic, versión, longitud de los metadatos), los metadatos
+# en JSON compacto y las mallas de cada nivel de detalle en el formato
+# binario de vision.mesh, una tras otra.
+ARTIFACT_MAGIC = b'SMZA'
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACT_HEADER = struct.Struct('<4sHI')
+ARTIFACT_EXTENSION = '.smz'
+
+# Los floats de las mallas comprimen poco: el nivel 1 da casi el mismo
+# tamaño que el 9 en una fracción del tiempo
+ARTIFACT_COMPRESSION_LEVEL = 1
+
+
+def write_atomic(path, data):
+    """
+    Escribe data en path a través de un archivo temporal en el mismo
+    directorio: los lectores ven el archivo anterior o el nuevo completo
+
+    Es la escritura de todos los archivos que se sirven o se leen mientras
+    se pueden estar reescribiendo (artefactos, imágenes procesadas, mallas).
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def pack_model_artifact(metadata, meshes):
+    """
+    Serializa un modelo 3D una sola vez
+
+    Args:
+        metadata: Diccionario JSON (sin geometría)
+        meshes: Mallas (arrays) de cada nivel, de la más detallada a la más simple
+
+    Returns:
+        bytes comprimidos del artefacto
+    """
+    blobs = [pack_mesh(mesh) for mesh in meshes]
+    header_json = json.dumps(dict(metadata, mesh_sizes=[len(blob) for blob in blobs]),
+                             separators=(',', ':')).encode('utf-8')
+    payload = b''.join([ARTIFACT_HEADER.pack(ARTIFACT_MAGIC, ARTIFACT_FORMAT_VERSION, len(header_json)),
+                        header_json] + blobs)
+    return gzip.compress(payload, compresslevel=ARTIFACT_COMPRESSION_LEVEL, mtime=0)
+
+
+def unpack_model_artifact(data):
+    """
+    Inversa de pack_model_artifact
+
+    Returns:
+        Tuple de (metadatos, lista de mallas)
+    """
+    payload = gzip.decompress(data)
+    magic, version, header_length = ARTIFACT_HEADER.unpack_from(payload, 0)
+    if magic != ARTIFACT_MAGIC or version != ARTIFACT_FORMAT_VERSION:
+        raise ValueError("Formato de artefacto de modelo no válido")
+
+    offset = ARTIFACT_HEADER.size
+    metadata = json.loads(payload[offset:offset + header_length])
+    offset += header_length
+
+    meshes = []
+    for size in metadata.pop("mesh_sizes"):
+        meshes.append(unpack_mesh(payload[offset:offset + size]))
+        offset += size
+    return metadata, meshes
+
+
+def write_model_artifact(path, metadata, meshes, links=()):
+    """
+    Guarda el artefacto de un modelo en path y lo enlaza desde links
+
+    El modelo se serializa y se escribe una sola vez; las demás
+    ubicaciones son enlaces duros al mismo archivo (o simbólicos si el
+    sistema de archivos no los admite), no copias.
+
+    Returns:
+        Tamaño en bytes del artefacto
+    """
+    data = pack_model_artifact(metadata, meshes)
+    write_atomic(path, data)
+    for link_path in links:
+        if os.path.abspath(link_path) != os.path.abspath(path):
+            link_artifact(path, link_path)
+    return len(data)
+
+
+def read_model_artifact(path):
+    """
+    Returns:
+        Tuple de (metadatos, lista de mallas con arrays de numpy)
+    """
+    with open(path, 'rb') as f:
+        metadata, meshes = unpack_model_artifact(f.read())
+    for mesh in meshes:
+        # pack_mesh omite normales y colores vacíos
+        for attribute in ("normals", "colors"):
+            if mesh[attribute] is None:
+                mesh[attribute] = np.zeros((len(mesh["vertices"]), 3), dtype=np.float32)
+    return metadata, meshes
+
+
+def link_artifact(path, link_path):
+    """
+    Hace que link_path apunte al mismo contenido que path sin copiarlo,
+    sustituyendo de forma atómica lo que hubiera en link_path
+    """
+    directory = os.path.dirname(link_path)
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{os.path.basename(link_path)}.{uuid.uuid4().hex}.tmp")
+    try:
+        try:
+            os.link(path, temp_path)
+        except OSError:
+            os.symlink(os.path.abspath(path), temp_path)
+        os.replace(temp_path, link_path)
+    except OSError as e:
+        logger.warning(f"No se pudo enlazar {link_path}: {str(e)}")
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
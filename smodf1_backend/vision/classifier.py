@@ -0,0 +1,258 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Lado mayor de la copia reducida sobre la que se ejecutan los detectores
+CLASSIFIER_MAX_SIDE = 640
+
+# Número de resultados memorizados por clasificador
+CLASSIFIER_CACHE_SIZE = 256
+
+
+@dataclass
+class ClassificationResult:
+    """Resultado de la clasificación del tipo de imagen"""
+    image_type: str
+    stage: str
+    content_hash: str
+    scale: float
+    timings: dict = field(default_factory=dict)
+    cached: bool = False
+
+    @property
+    def total_ms(self):
+        return sum(self.timings.values())
+
+    def as_dict(self):
+        return {
+            "image_type": self.image_type,
+            "stage": self.stage,
+            "content_hash": self.content_hash,
+            "scale": self.scale,
+            "timings_ms": dict(self.timings),
+            "total_ms": self.total_ms,
+            "cached": self.cached,
+        }
+
+
+def image_content_hash(image):
+    """Hash del contenido de una imagen (píxeles y dimensiones)"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(image.shape).encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+def downscale_for_classification(image, max_side=CLASSIFIER_MAX_SIDE):
+    """
+    Reduce la imagen para que su lado mayor no supere max_side
+
+    Returns:
+        Tuple de (imagen reducida, factor de escala aplicado)
+    """
+    height, width = image.shape[:2]
+    scale = min(1.0, max_side / float(max(height, width)))
+    if scale >= 1.0:
+        return image, 1.0
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+class _Stages:
+    """
+    Cálculos intermedios de una clasificación, hechos bajo demanda y una sola vez,
+    con el tiempo de cada etapa
+    """
+
+    def __init__(self, image, scale):
+        self.image = image
+        self.scale = scale
+        self.timings = {}
+        self._values = {}
+
+    def run(self, name, compute):
+        if name not in self._values:
+            start = time.perf_counter()
+            self._values[name] = compute()
+            self.timings[name] = (time.perf_counter() - start) * 1000
+        return self._values[name]
+
+    @property
+    def gray(self):
+        return self.run("gray", lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def edges(self):
+        return self.run("edges", lambda: cv2.Canny(self.gray, 50, 200))
+
+
+class ImageTypeClassifier:
+    """
+    Clasificador por etapas del tipo de contenido de una imagen
+
+    Las reglas se evalúan en orden de prioridad sobre una copia reducida de
+    la imagen y cada detector solo se ejecuta si las reglas anteriores no
+    han decidido ya el tipo. Los parámetros en píxeles de las transformadas
+    de Hough se escalan con la imagen. Los resultados se memorizan por hash
+    del contenido, de modo que clasificar la misma imagen otra vez es gratis.
+
+    Args:
+        detect_people: Buscar personas con HOG justo después de los rostros
+        min_circles: Círculos necesarios (estrictamente más) para 'redondos'
+        min_lines: Líneas necesarias (estrictamente más) para 'circuitos'
+        skin_fallback: Clasificar como 'personas' por histograma de tonos de piel
+        max_side: Lado mayor de la copia reducida
+    """
+
+    def __init__(self, detect_people=True, min_circles=3, min_lines=15, skin_fallback=False,
+                 max_side=CLASSIFIER_MAX_SIDE, cache_size=CLASSIFIER_CACHE_SIZE):
+        self.detect_people = detect_people
+        self.min_circles = min_circles
+        self.min_lines = min_lines
+        self.skin_fallback = skin_fallback
+        self.max_side = max_side
+        self.cache_size = cache_size
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._models_lock = threading.Lock()
+        self._cascade_lock = threading.Lock()
+        self._face_cascade = None
+        self._hog = None
+
+    def classify(self, image):
+        """
+        Clasifica una imagen BGR
+
+        Returns:
+            ClassificationResult con el tipo, la etapa que lo decidió y los tiempos
+        """
+        start = time.perf_counter()
+        content_hash = image_content_hash(image)
+        hash_ms = (time.perf_counter() - start) * 1000
+
+        with self._cache_lock:
+            cached = self._cache.get(content_hash)
+            if cached is not None:
+                self._cache.move_to_end(content_hash)
+                return ClassificationResult(
+                    image_type=cached.image_type,
+                    stage=cached.stage,
+                    content_hash=content_hash,
+                    scale=cached.scale,
+                    timings={"hash": hash_ms},
+                    cached=True
+                )
+
+        start = time.perf_counter()
+        small, scale = downscale_for_classification(image, self.max_side)
+        stages = _Stages(small, scale)
+        stages.timings["hash"] = hash_ms
+        stages.timings["downscale"] = (time.perf_counter() - start) * 1000
+
+        image_type, stage = self._decide(stages)
+        result = ClassificationResult(
+            image_type=image_type,
+            stage=stage,
+            content_hash=content_hash,
+            scale=scale,
+            timings=stages.timings
+        )
+        logger.debug(f"Tipo de imagen '{image_type}' decidido en la etapa '{stage}' ({result.total_ms:.1f} ms)")
+
+        with self._cache_lock:
+            self._cache[content_hash] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _decide(self, stages):
+        """Aplica las reglas en orden de prioridad y devuelve (tipo, etapa)"""
+        if stages.run("faces", lambda: self._count_faces(stages.gray)) > 0:
+            return "rostros", "faces"
+
+        if self.detect_people and stages.run("people", lambda: self._count_people(stages.image)) > 0:
+            return "personas", "people"
+
+        if stages.run("circles", lambda: self._count_circles(stages.gray, stages.scale)) > self.min_circles:
+            return "redondos", "circles"
+
+        edges = stages.edges
+        edge_density = np.count_nonzero(edges) / float(edges.size)
+        if edge_density > 0.2:  # Muchos bordes indican posibles circuitos o figuras geométricas
+            # Patrones rectos (circuitos) o curvos (trigonometría)
+            if stages.run("lines", lambda: self._count_lines(edges, stages.scale)) > self.min_lines:
+                return "circuitos", "lines"
+            return "trigonometria", "lines"
+
+        if self.skin_fallback and stages.run("skin", lambda: self._skin_fraction(stages.gray)) > 0.4:
+            return "personas", "skin"
+
+        return "general", "fallback"
+
+    def _face_detector(self):
+        with self._models_lock:
+            if self._face_cascade is None:
+                self._face_cascade = cv2.CascadeClassifier(
+                    cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+                )
+            return self._face_cascade
+
+    def _people_detector(self):
+        with self._models_lock:
+            if self._hog is None:
+                hog = cv2.HOGDescriptor()
+                hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+                self._hog = hog
+            return self._hog
+
+    def _count_faces(self, gray):
+        cascade = self._face_detector()
+        # Los clasificadores en cascada no admiten detecciones concurrentes
+        with self._cascade_lock:
+            faces = cascade.detectMultiScale(gray, 1.1, 4)
+        return len(faces)
+
+    def _count_people(self, image):
+        try:
+            people, _ = self._people_detector().detectMultiScale(image, winStride=(8, 8), padding=(4, 4), scale=1.05)
+        except cv2.error:
+            # Si falla el detector HOG
+            return 0
+        return len(people)
+
+    def _count_circles(self, gray, scale):
+        circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1.2, minDist=max(1.0, 100 * scale),
+                                   param1=100, param2=30,
+                                   minRadius=max(1, int(round(5 * scale))),
+                                   maxRadius=max(2, int(round(300 * scale))))
+        return 0 if circles is None else len(circles[0])
+
+    def _count_lines(self, edges, scale):
+        lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=max(1, int(round(80 * scale))),
+                                minLineLength=50 * scale, maxLineGap=10 * scale)
+        return 0 if lines is None else len(lines)
+
+    def _skin_fraction(self, gray):
+        # Rango aproximado del histograma para tonos de piel
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+        return float(np.sum(hist[70:150]) / hist.sum())
+
+
+# Reglas de vision.ImageProcessor: rostros, personas (HOG), círculos y bordes
+vision_classifier = ImageTypeClassifier(detect_people=True, min_circles=3, min_lines=15)
+
+# Reglas de api.processors.ImageProcessor: rostros, círculos, bordes e histograma de piel
+analysis_classifier = ImageTypeClassifier(detect_people=False, min_circles=5, min_lines=20, skin_fallback=True)
@@ -0,0 +1,134 @@
+import numpy as np
+
+# Primitivas de relieve para los mapas de profundidad de los procesadores.
+# Cada una calcula su perfil solo sobre el recorte de la máscara que ocupa
+# la detección (recortado a los bordes de la imagen) y lo compone con lo
+# que ya había: por máximo, o sustituyendo los píxeles que cubre.
+
+BLEND_MAX = "max"
+BLEND_REPLACE = "replace"
+
+
+def _clip_window(shape, top, left, bottom, right):
+    """
+    Recorta una ventana [top, bottom) x [left, right) a las dimensiones de la máscara
+
+    Returns:
+        Tuple de (top, left, bottom, right) o None si la ventana queda vacía
+    """
+    height, width = shape[:2]
+    top, left = max(0, int(top)), max(0, int(left))
+    bottom, right = min(height, int(bottom)), min(width, int(right))
+    if top >= bottom or left >= right:
+        return None
+    return top, left, bottom, right
+
+
+def cosine_falloff(dist, floor=0.0, gain=1.0, clip=False):
+    """
+    Perfil de abultamiento: 1 en el centro (dist=0) y floor en el borde (dist=1)
+
+    Args:
+        dist: Distancia normalizada al centro
+        floor: Valor del perfil en el borde
+        gain: Factor aplicado al perfil (normalmente detail_level / 5)
+        clip: Limitar el resultado al rango [0, 1]
+    """
+    value = (np.cos(dist * np.pi / 2) * (1.0 - floor) + floor) * gain
+    if clip:
+        value = np.clip(value, 0.0, 1.0)
+    return value
+
+
+def _composite(mask, window, value, inside, blend):
+    """Compone value sobre mask[window] en los píxeles marcados por inside"""
+    top, left, bottom, right = window
+    region = mask[top:bottom, left:right]
+    value = value.astype(mask.dtype, copy=False)
+    if blend == BLEND_MAX:
+        np.maximum(region, np.where(inside, value, region), out=region)
+    elif blend == BLEND_REPLACE:
+        np.copyto(region, value, where=inside)
+    else:
+        raise ValueError(f"Modo de composición no soportado: {blend}")
+
+
+def draw_elliptical_bump(mask, x, y, w, h, floor=0.0, gain=1.0, clip=False, blend=BLEND_MAX):
+    """
+    Abultamiento elíptico inscrito en la caja (x, y, w, h) de una detección
+
+    El centro es (x + w//2, y + h//2) y los semiejes w/2 y h/2. Solo se
+    pintan los píxeles estrictamente dentro de la elipse.
+
+    Args:
+        mask: Máscara float a modificar en el sitio
+        x, y, w, h: Caja de la detección
+        floor, gain, clip: Parámetros de cosine_falloff
+        blend: 'max' o 'replace'
+
+    Returns:
+        La propia máscara
+    """
+    x, y, w, h = int(x), int(y), int(w), int(h)
+    window = _clip_window(mask.shape, y, x, y + h, x + w)
+    if window is None or w <= 0 or h <= 0:
+        return mask
+
+    top, left, bottom, right = window
+    center_x, center_y = x + w // 2, y + h // 2
+    rows, cols = np.ogrid[top:bottom, left:right]
+    dist = np.sqrt(((cols - center_x) / (w / 2)) ** 2 + ((rows - center_y) / (h / 2)) ** 2)
+    inside = dist < 1.0
+    _composite(mask, window, cosine_falloff(dist, floor, gain, clip), inside, blend)
+    return mask
+
+
+def draw_radial_bump(mask, center_x, center_y, radius, floor=0.0, gain=1.0, clip=False, blend=BLEND_MAX):
+    """
+    Abultamiento circular de radio radius, incluido el propio borde
+
+    Args:
+        mask: Máscara float a modificar en el sitio
+        center_x, center_y, radius: Círculo en píxeles (p. ej. de HoughCircles)
+        floor, gain, clip: Parámetros de cosine_falloff
+        blend: 'max' o 'replace'
+
+    Returns:
+        La propia máscara
+    """
+    # Los círculos de HoughCircles llegan como uint16: se pasan a int para
+    # que las restas cerca del borde no desborden
+    center_x, center_y, radius = int(center_x), int(center_y), int(radius)
+    if radius <= 0:
+        return mask
+    window = _clip_window(mask.shape, center_y - radius, center_x - radius,
+                          center_y + radius + 1, center_x + radius + 1)
+    if window is None:
+        return mask
+
+    top, left, bottom, right = window
+    rows, cols = np.ogrid[top:bottom, left:right]
+    dist = np.sqrt((cols - center_x) ** 2 + (rows - center_y) ** 2)
+    inside = dist <= radius
+    _composite(mask, window, cosine_falloff(dist / radius, floor, gain, clip), inside, blend)
+    return mask
+
+
+def draw_vertical_gradient(mask, x, y, w, h, gain=1.0, blend=BLEND_MAX):
+    """
+    Gradiente vertical sobre la caja (x, y, w, h): gain en la fila superior
+    y decreciendo linealmente hacia la inferior
+
+    Returns:
+        La propia máscara
+    """
+    x, y, w, h = int(x), int(y), int(w), int(h)
+    window = _clip_window(mask.shape, y, x, y + h, x + w)
+    if window is None or h <= 0:
+        return mask
+
+    top, left, bottom, right = window
+    rows = np.arange(top, bottom)[:, np.newaxis]
+    value = np.broadcast_to((1 - (rows - y) / h) * gain, (bottom - top, right - left))
+    _composite(mask, window, value, True, blend)
+    return mask
@@ -0,0 +1,175 @@
+import threading
+
+import cv2
+import numpy as np
+
+# Formatos de salida de las imágenes procesadas: extensión y tipo MIME
+FORMAT_JPEG = "jpeg"
+FORMAT_WEBP = "webp"
+FORMAT_AVIF = "avif"
+FORMAT_PNG = "png"
+
+FORMATS = {
+    FORMAT_JPEG: (".jpg", "image/jpeg"),
+    FORMAT_WEBP: (".webp", "image/webp"),
+    FORMAT_AVIF: (".avif", "image/avif"),
+    FORMAT_PNG: (".png", "image/png"),
+}
+
+# Formatos que todos los clientes aceptan aunque solo anuncien */* o image/*
+UNIVERSAL_FORMATS = (FORMAT_JPEG, FORMAT_PNG)
+
+# Orden de preferencia al negociar con la cabecera Accept (el más compacto primero)
+NEGOTIATION_ORDER = (FORMAT_AVIF, FORMAT_WEBP, FORMAT_JPEG)
+
+# Calidad de cada nivel por formato. Las escalas no son comparables entre
+# formatos: AVIF a 55 se ve como JPEG a 85 con bastantes menos bytes.
+TIER_LOW = "low"
+TIER_STANDARD = "standard"
+TIER_HIGH = "high"
+QUALITY_TIERS = {
+    TIER_LOW: {FORMAT_JPEG: 70, FORMAT_WEBP: 65, FORMAT_AVIF: 40},
+    TIER_STANDARD: {FORMAT_JPEG: 85, FORMAT_WEBP: 80, FORMAT_AVIF: 55},
+    TIER_HIGH: {FORMAT_JPEG: 95, FORMAT_WEBP: 92, FORMAT_AVIF: 75},
+}
+
+# PNG es sin pérdida: el nivel solo cambia el tiempo de compresión
+PNG_COMPRESSION = 6
+
+_available = None
+_available_lock = threading.Lock()
+
+
+def available_formats():
+    """
+    Formatos que la build de OpenCV puede codificar (AVIF y WebP dependen
+    de cómo se compiló), comprobados una vez por proceso
+    """
+    global _available
+    with _available_lock:
+        if _available is None:
+            sample = np.zeros((8, 8, 3), dtype=np.uint8)
+            _available = set()
+            for name, (ext, _) in FORMATS.items():
+                try:
+                    if cv2.imencode(ext, sample)[0]:
+                        _available.add(name)
+                except cv2.error:
+                    pass
+        return _available
+
+
+def format_extension(fmt):
+    return FORMATS[fmt][0]
+
+
+def format_content_type(fmt):
+    return FORMATS[fmt][1]
+
+
+def format_from_extension(ext):
+    """Formato correspondiente a una extensión de archivo ('.jpeg' cuenta como JPEG)"""
+    ext = ext.lower()
+    if ext == ".jpeg":
+        return FORMAT_JPEG
+    for name, (format_ext, _) in FORMATS.items():
+        if format_ext == ext:
+            return name
+    return None
+
+
+def _encode_params(fmt, quality):
+    if fmt == FORMAT_JPEG:
+        # Tablas de Huffman optimizadas: ~5% menos bytes por un coste mínimo
+        return [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+    if fmt == FORMAT_WEBP:
+        return [cv2.IMWRITE_WEBP_QUALITY, quality]
+    if fmt == FORMAT_AVIF:
+        return [cv2.IMWRITE_AVIF_QUALITY, quality]
+    return [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]
+
+
+def encode_image(image, fmt=FORMAT_JPEG, tier=TIER_STANDARD, quality=None):
+    """
+    Codifica una imagen en el formato y nivel de calidad indicados
+
+    Las imágenes en color cuyos tres canales son iguales (mapas de bordes)
+    se guardan en PNG como escala de grises, un tercio de los datos.
+
+    Args:
+        image: Imagen BGR o en escala de grises
+        fmt: 'jpeg', 'webp', 'avif' o 'png'
+        tier: 'low', 'standard' o 'high' (ignorado en PNG)
+        quality: Calidad explícita (0-100) en lugar de la del nivel
+
+    Returns:
+        Bytes del archivo codificado
+    """
+    if fmt not in available_formats():
+        raise ValueError(f"Formato de imagen no disponible: {fmt}")
+    if tier not in QUALITY_TIERS:
+        raise ValueError(f"Nivel de calidad no soportado: {tier}")
+
+    if fmt == FORMAT_PNG and image.ndim == 3 and image.shape[2] == 3:
+        if np.array_equal(image[:, :, 0], image[:, :, 1]) and np.array_equal(image[:, :, 1], image[:, :, 2]):
+            image = image[:, :, 0]
+
+    if quality is None:
+        quality = QUALITY_TIERS[tier].get(fmt)
+    ok, buffer = cv2.imencode(format_extension(fmt), image, _encode_params(fmt, quality))
+    if not ok:
+        raise ValueError(f"No se pudo codificar la imagen como {fmt}")
+    return buffer.tobytes()
+
+
+def parse_accept(header):
+    """
+    Tipos de una cabecera Accept con su factor de calidad
+
+    Returns:
+        Diccionario {tipo MIME: q}
+    """
+    accepted = {}
+    for item in (header or "").split(","):
+        parts = [part.strip() for part in item.split(";")]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[parts[0].lower()] = q
+    return accepted
+
+
+def accepts_format(accepted, fmt):
+    """
+    Indica si el cliente acepta el formato
+
+    Los formatos modernos (WebP, AVIF) solo se envían si el cliente los
+    anuncia explícitamente; los comodines solo cubren JPEG y PNG.
+    """
+    content_type = format_content_type(fmt)
+    if content_type in accepted:
+        return accepted[content_type] > 0
+    if fmt in UNIVERSAL_FORMATS:
+        return accepted.get("image/*", accepted.get("*/*", 0)) > 0 or not accepted
+    return False
+
+
+def negotiate_format(accept_header, order=NEGOTIATION_ORDER):
+    """
+    Primer formato de order que el cliente acepta y OpenCV sabe codificar
+
+    Returns:
+        Nombre del formato ('jpeg' si ninguno encaja)
+    """
+    accepted = parse_accept(accept_header)
+    available = available_formats()
+    for fmt in order:
+        if fmt in available and accepts_format(accepted, fmt):
+            return fmt
+    return FORMAT_JPEG
@@ -0,0 +1,302 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+from .image_context import ImageContext
+
+logger = logging.getLogger(__name__)
+
+# Modos de ejecución de las etapas pesadas (PROCESSING_EXECUTOR en settings)
+EXECUTOR_INLINE = "inline"
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+# Los arrays más pequeños se envían serializados: crear un segmento de
+# memoria compartida cuesta más que copiarlos
+SHARED_MEMORY_MIN_BYTES = 64 * 1024
+
+
+class SharedArray:
+    """
+    Referencia serializable a un array guardado en memoria compartida
+
+    Solo viaja el nombre del segmento, la forma y el tipo; los datos se
+    leen directamente del segmento sin copiarlos.
+    """
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    @classmethod
+    def create(cls, array):
+        """
+        Copia array a un segmento nuevo
+
+        Returns:
+            Tuple de (referencia, segmento); quien crea el segmento debe liberarlo
+        """
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+        return cls(segment.name, array.shape, array.dtype.str), segment
+
+    def open(self):
+        """
+        Returns:
+            Tuple de (array sobre el segmento, segmento)
+        """
+        segment = shared_memory.SharedMemory(name=self.name)
+        return np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=segment.buf), segment
+
+
+def _share(value, segments):
+    """
+    Sustituye los arrays grandes de value (recorriendo tuplas, listas y
+    diccionarios) por SharedArray. Un ImageContext se envía como su imagen.
+    """
+    if isinstance(value, ImageContext):
+        value = value.image
+    if isinstance(value, np.ndarray):
+        if value.nbytes < SHARED_MEMORY_MIN_BYTES or value.dtype.hasobject:
+            return value
+        handle, segment = SharedArray.create(value)
+        segments.append(segment)
+        return handle
+    if isinstance(value, tuple):
+        return tuple(_share(item, segments) for item in value)
+    if isinstance(value, list):
+        return [_share(item, segments) for item in value]
+    if isinstance(value, dict):
+        return {key: _share(item, segments) for key, item in value.items()}
+    return value
+
+
+def _restore(value, segments, copy):
+    """
+    Inversa de _share: sustituye cada SharedArray por el array
+
+    Args:
+        copy: Copiar los datos fuera del segmento (para poder liberarlo enseguida)
+    """
+    if isinstance(value, SharedArray):
+        array, segment = value.open()
+        segments.append(segment)
+        return array.copy() if copy else array
+    if isinstance(value, tuple):
+        return tuple(_restore(item, segments, copy) for item in value)
+    if isinstance(value, list):
+        return [_restore(item, segments, copy) for item in value]
+    if isinstance(value, dict):
+        return {key: _restore(item, segments, copy) for key, item in value.items()}
+    return value
+
+
+def _release(segments, unlink):
+    for segment in segments:
+        try:
+            segment.close()
+        except BufferError:
+            # Aún quedan vistas sobre el segmento; se cerrará al recolectarlas
+            pass
+        if unlink:
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _init_worker():
+    """Inicializa cada proceso del pool con los procesadores ya construidos"""
+    # Un hilo de OpenCV por proceso: el paralelismo lo dan los procesos
+    cv2.setNumThreads(1)
+    try:
+        from opencv_processors import warm_up_processors
+        warm_up_processors()
+    except ImportError:
+        pass
+
+
+def _ping():
+    return os.getpid()
+
+
+def _call_shared(func, args, kwargs):
+    """
+    Ejecuta func en el proceso worker leyendo los arrays de la memoria
+    compartida y devolviendo los del resultado en segmentos nuevos, que
+    libera el proceso principal
+    """
+    attached = []
+    created = []
+    try:
+        args, kwargs = _restore((args, kwargs), attached, copy=False)
+        result = func(*args, **kwargs)
+        del args, kwargs
+        return _share(result, created)
+    finally:
+        _release(attached, unlink=False)
+        _release(created, unlink=False)
+
+
+class InlineExecutor:
+    """Ejecuta cada etapa en el hilo que la pide (comportamiento original)"""
+
+    mode = EXECUTOR_INLINE
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def warm_up(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class ThreadExecutor:
+    """
+    Pool de hilos: útil porque las funciones de OpenCV y NumPy liberan el
+    GIL, sin el coste de copiar datos entre procesos
+    """
+
+    mode = EXECUTOR_THREAD
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="processing")
+
+    def submit(self, func, *args, **kwargs):
+        return self._pool.submit(func, *args, **kwargs)
+
+    def warm_up(self):
+        pass
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessExecutor:
+    """
+    Pool de procesos persistente para las etapas limitadas por CPU
+
+    Los workers se crean con 'forkserver' (o 'spawn' donde no existe), de
+    modo que no heredan el estado de los hilos del servidor, y cargan los
+    procesadores especializados al arrancar. Los arrays de los argumentos
+    y del resultado viajan por memoria compartida; las funciones deben
+    poder importarse desde el worker (funciones de módulo, no lambdas).
+    """
+
+    mode = EXECUTOR_PROCESS
+
+    def __init__(self, workers):
+        self.workers = workers
+        # Un único resource tracker para el proceso principal y los workers,
+        # que así comparten el registro de los segmentos de memoria
+        resource_tracker.ensure_running()
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker
+        )
+
+    def submit(self, func, *args, **kwargs):
+        segments = []
+        try:
+            shared_args, shared_kwargs = _share((args, kwargs), segments)
+            inner = self._pool.submit(_call_shared, func, shared_args, shared_kwargs)
+        except Exception:
+            _release(segments, unlink=True)
+            raise
+
+        outer = Future()
+
+        def done(future):
+            _release(segments, unlink=True)
+            try:
+                shared_result = future.result()
+            except BaseException as e:
+                outer.set_exception(e)
+                return
+
+            result_segments = []
+            try:
+                result = _restore(shared_result, result_segments, copy=True)
+            except Exception as e:
+                outer.set_exception(e)
+                return
+            finally:
+                _release(result_segments, unlink=True)
+            outer.set_result(result)
+
+        inner.add_done_callback(done)
+        return outer
+
+    def warm_up(self):
+        """Arranca todos los workers (y sus procesadores) sin esperar a la primera etapa"""
+        pids = {future.result() for future in [self._pool.submit(_ping) for _ in range(self.workers)]}
+        logger.info(f"Pool de procesamiento listo: {len(pids)} procesos")
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def create_executor(mode, workers=None):
+    """
+    Crea un ejecutor
+
+    Args:
+        mode: 'inline', 'thread' o 'process'
+        workers: Número de hilos o procesos (por defecto, uno por núcleo)
+    """
+    workers = workers or os.cpu_count() or 1
+    if mode == EXECUTOR_INLINE:
+        return InlineExecutor()
+    if mode == EXECUTOR_THREAD:
+        return ThreadExecutor(workers)
+    if mode == EXECUTOR_PROCESS:
+        return ProcessExecutor(workers)
+    raise ValueError(f"Modo de ejecución no soportado: {mode}")
+
+
+def get_executor():
+    """
+    Ejecutor del proceso, configurado con PROCESSING_EXECUTOR y
+    PROCESSING_EXECUTOR_WORKERS
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from django.conf import settings
+
+            mode = getattr(settings, 'PROCESSING_EXECUTOR', EXECUTOR_INLINE)
+            workers = getattr(settings, 'PROCESSING_EXECUTOR_WORKERS', None)
+            _executor = create_executor(mode, workers)
+            logger.info(f"Ejecutor de etapas: {mode}")
+        return _executor
+
+
+def run_stage(func, *args, **kwargs):
+    """Ejecuta una etapa de procesamiento con el ejecutor configurado y espera su resultado"""
+    return get_executor().submit(func, *args, **kwargs).result()
+
+
+def warm_up_executor():
+    """Arranca el pool al iniciar un worker WSGI/ASGI (ver PROCESSOR_WARMUP en settings)"""
+    get_executor().warm_up()
@@ -0,0 +1,234 @@
+import json
+import struct
+
+import numpy as np
+
+from .mesh import mesh_from_data
+
+# Constantes del formato glTF 2.0 / GLB
+GLB_MAGIC = 0x46546C67  # 'glTF'
+GLB_VERSION = 2
+GLB_CHUNK_JSON = 0x4E4F534A
+GLB_CHUNK_BIN = 0x004E4942
+GLB_CONTENT_TYPE = 'model/gltf-binary'
+
+COMPONENT_BYTE = 5120
+COMPONENT_UNSIGNED_BYTE = 5121
+COMPONENT_UNSIGNED_SHORT = 5123
+COMPONENT_UNSIGNED_INT = 5125
+COMPONENT_FLOAT = 5126
+
+TARGET_ARRAY_BUFFER = 34962
+TARGET_ELEMENT_ARRAY_BUFFER = 34963
+
+MODE_POINTS = 0
+MODE_TRIANGLES = 4
+
+QUANTIZATION_EXTENSION = 'KHR_mesh_quantization'
+
+
+def _pad4(size):
+    return (size + 3) & ~3
+
+
+class _GLBBuilder:
+    """Acumula bufferViews y accessors sobre un único buffer binario"""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+        self.buffer_views = []
+        self.accessors = []
+
+    def add_attribute(self, data, component_type, count, normalized=False, minimum=None, maximum=None):
+        """
+        Añade un atributo de vértice VEC3
+
+        data debe tener una fila por vértice; si tiene 4 columnas la cuarta es
+        relleno para alinear cada elemento a 4 bytes (byteStride).
+        """
+        data = np.ascontiguousarray(data)
+        view = {
+            "buffer": 0,
+            "byteOffset": self.offset,
+            "byteLength": data.nbytes,
+            "target": TARGET_ARRAY_BUFFER,
+        }
+        if data.shape[1] == 4:
+            view["byteStride"] = data.strides[0]
+
+        accessor = {
+            "bufferView": self._append(data, view),
+            "componentType": component_type,
+            "count": count,
+            "type": "VEC3",
+        }
+        if normalized:
+            accessor["normalized"] = True
+        if minimum is not None:
+            accessor["min"] = minimum
+            accessor["max"] = maximum
+        return self._add_accessor(accessor)
+
+    def add_indices(self, faces, vertex_count):
+        """Añade el buffer de índices usando uint16 cuando los vértices lo permiten"""
+        if vertex_count <= 0xFFFF:
+            indices = faces.astype('<u2').ravel()
+            component_type = COMPONENT_UNSIGNED_SHORT
+        else:
+            indices = faces.astype('<u4').ravel()
+            component_type = COMPONENT_UNSIGNED_INT
+
+        view = {
+            "buffer": 0,
+            "byteOffset": self.offset,
+            "byteLength": indices.nbytes,
+            "target": TARGET_ELEMENT_ARRAY_BUFFER,
+        }
+        return self._add_accessor({
+            "bufferView": self._append(indices, view),
+            "componentType": component_type,
+            "count": len(indices),
+            "type": "SCALAR",
+        })
+
+    def binary(self):
+        return b''.join(self.chunks)
+
+    def _append(self, data, view):
+        payload = data.tobytes()
+        padding = _pad4(len(payload)) - len(payload)
+        self.chunks.append(payload + b'\x00' * padding)
+        self.offset += len(payload) + padding
+        self.buffer_views.append(view)
+        return len(self.buffer_views) - 1
+
+    def _add_accessor(self, accessor):
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+
+def _quantize_positions(vertices):
+    """
+    Cuantiza posiciones a uint16 sobre su caja envolvente
+
+    Los tres ejes usan la misma escala (la de la mayor dimensión de la
+    caja): glTF transforma las normales con la inversa traspuesta de la
+    matriz del nodo, y una escala distinta por eje las deformaría.
+
+    Returns:
+        Tuple de (array uint16 (N, 4) con relleno, traslación, escala por eje)
+    """
+    minimum = vertices.min(axis=0).astype(np.float64)
+    extent = float((vertices.max(axis=0).astype(np.float64) - minimum).max()) or 1.0
+
+    quantized = np.zeros((len(vertices), 4), dtype='<u2')
+    quantized[:, :3] = np.round((vertices - minimum) / extent * 65535)
+    return quantized, minimum, np.full(3, extent / 65535)
+
+
+def _pad_columns(values, dtype):
+    """Añade una cuarta columna de relleno para alinear cada vértice a 4 bytes"""
+    padded = np.zeros((len(values), 4), dtype=dtype)
+    padded[:, :3] = values
+    return padded
+
+
+def build_glb(mesh, quantize=True):
+    """
+    Genera un archivo GLB (glTF 2.0 binario) a partir de una malla
+
+    Args:
+        mesh: Diccionario con arrays 'vertices', 'normals', 'colors' y 'faces'
+        quantize: Usar posiciones uint16, normales int8 y colores uint8
+                  (extensión KHR_mesh_quantization) en lugar de float32
+
+    Returns:
+        bytes con el contenido del archivo GLB
+    """
+    vertices = np.asarray(mesh["vertices"], dtype=np.float32).reshape(-1, 3)
+    faces = np.asarray(mesh["faces"], dtype=np.uint32).reshape(-1, 3)
+    normals = mesh.get("normals")
+    colors = mesh.get("colors")
+    vertex_count = len(vertices)
+
+    if vertex_count == 0:
+        raise ValueError("La malla no contiene vértices")
+
+    builder = _GLBBuilder()
+    attributes = {}
+    node = {"mesh": 0}
+
+    if quantize:
+        quantized, translation, scale = _quantize_positions(vertices)
+        attributes["POSITION"] = builder.add_attribute(
+            quantized, COMPONENT_UNSIGNED_SHORT, vertex_count,
+            minimum=quantized[:, :3].min(axis=0).tolist(),
+            maximum=quantized[:, :3].max(axis=0).tolist()
+        )
+        # La transformación del nodo recupera las coordenadas originales
+        node["translation"] = translation.tolist()
+        node["scale"] = scale.tolist()
+    else:
+        attributes["POSITION"] = builder.add_attribute(
+            vertices.astype('<f4'), COMPONENT_FLOAT, vertex_count,
+            minimum=vertices.min(axis=0).tolist(),
+            maximum=vertices.max(axis=0).tolist()
+        )
+
+    if normals is not None and len(normals) == vertex_count:
+        normals = np.asarray(normals, dtype=np.float32).reshape(-1, 3)
+        if quantize:
+            packed = _pad_columns(np.round(np.clip(normals, -1.0, 1.0) * 127), 'i1')
+            attributes["NORMAL"] = builder.add_attribute(packed, COMPONENT_BYTE, vertex_count, normalized=True)
+        else:
+            attributes["NORMAL"] = builder.add_attribute(normals.astype('<f4'), COMPONENT_FLOAT, vertex_count)
+
+    if colors is not None and len(colors) == vertex_count:
+        colors = np.clip(np.asarray(colors, dtype=np.float32).reshape(-1, 3), 0.0, 1.0)
+        if quantize:
+            packed = _pad_columns(np.round(colors * 255), 'u1')
+            attributes["COLOR_0"] = builder.add_attribute(packed, COMPONENT_UNSIGNED_BYTE, vertex_count, normalized=True)
+        else:
+            attributes["COLOR_0"] = builder.add_attribute(colors.astype('<f4'), COMPONENT_FLOAT, vertex_count)
+
+    primitive = {"attributes": attributes, "material": 0, "mode": MODE_POINTS}
+    if len(faces):
+        primitive["indices"] = builder.add_indices(faces, vertex_count)
+        primitive["mode"] = MODE_TRIANGLES
+
+    binary = builder.binary()
+    gltf = {
+        "asset": {"version": "2.0", "generator": "SMODF1"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [node],
+        "meshes": [{"primitives": [primitive]}],
+        "materials": [{
+            "pbrMetallicRoughness": {"baseColorFactor": [1, 1, 1, 1], "metallicFactor": 0, "roughnessFactor": 1},
+            "doubleSided": True,
+        }],
+        "buffers": [{"byteLength": len(binary)}],
+        "bufferViews": builder.buffer_views,
+        "accessors": builder.accessors,
+    }
+    if quantize:
+        gltf["extensionsUsed"] = [QUANTIZATION_EXTENSION]
+        gltf["extensionsRequired"] = [QUANTIZATION_EXTENSION]
+
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_chunk += b' ' * (_pad4(len(json_chunk)) - len(json_chunk))
+
+    total_length = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    return b''.join([
+        struct.pack('<III', GLB_MAGIC, GLB_VERSION, total_length),
+        struct.pack('<II', len(json_chunk), GLB_CHUNK_JSON),
+        json_chunk,
+        struct.pack('<II', len(binary), GLB_CHUNK_BIN),
+        binary,
+    ])
+
+
+def model_to_glb(data_3d, quantize=True):
+    """Genera un GLB a partir del resultado de generate_3d_data (listas JSON)"""
+    return build_glb(mesh_from_data(data_3d), quantize=quantize)
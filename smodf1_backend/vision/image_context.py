@@ -0,0 +1,117 @@
+import hashlib
+
+import cv2
+import numpy as np
+
+
+class ImageContext:
+    """
+    Imagen de una petición junto con sus representaciones derivadas
+
+    Cada representación (escala de grises, HSV, desenfoques, bordes...) se
+    calcula la primera vez que se pide y se memoriza por operación y
+    parámetros, de modo que las distintas etapas del procesamiento la
+    comparten en lugar de recalcularla. Los arrays memorizados son de solo
+    lectura: quien necesite modificarlos debe hacer una copia.
+
+    El contexto asume que la imagen no cambia. Si una etapa dibuja sobre
+    ella o la sustituye, hay que crear un contexto nuevo.
+
+    Args:
+        image: Imagen BGR (o en escala de grises) en formato numpy array
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self.hits = 0
+        self.misses = 0
+        self._derived = {}
+
+    @classmethod
+    def wrap(cls, image):
+        """Devuelve image si ya es un ImageContext o un contexto nuevo para el array"""
+        if isinstance(image, cls):
+            return image
+        return cls(image)
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def derive(self, operation, params, compute):
+        """
+        Devuelve la representación (operation, *params), calculándola con compute() si no existe
+
+        Args:
+            operation: Nombre de la operación
+            params: Tupla con los parámetros que la identifican
+            compute: Función sin argumentos que calcula la representación
+        """
+        key = (operation,) + tuple(params)
+        if key in self._derived:
+            self.hits += 1
+            return self._derived[key]
+
+        self.misses += 1
+        value = compute()
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        self._derived[key] = value
+        return value
+
+    def sha256(self):
+        """SHA-256 del contenido de la imagen (dimensiones y píxeles)"""
+        def compute():
+            digest = hashlib.sha256(str(self.image.shape).encode())
+            digest.update(np.ascontiguousarray(self.image).data)
+            return digest.hexdigest()
+
+        return self.derive("sha256", (), compute)
+
+    def gray(self):
+        """Imagen en escala de grises (la propia imagen si ya lo está)"""
+        if self.image.ndim == 2:
+            return self.image
+        return self.derive("gray", (), lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY))
+
+    def hsv(self):
+        """Imagen en espacio de color HSV"""
+        return self.derive("hsv", (), lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2HSV))
+
+    def gaussian_blur(self, ksize, sigma=0):
+        """Desenfoque gaussiano de la escala de grises con un kernel ksize x ksize"""
+        return self.derive(
+            "gaussian_blur", (ksize, sigma),
+            lambda: cv2.GaussianBlur(self.gray(), (ksize, ksize), sigma)
+        )
+
+    def bilateral(self, diameter, sigma_color, sigma_space):
+        """Filtro bilateral de la escala de grises"""
+        return self.derive(
+            "bilateral", (diameter, sigma_color, sigma_space),
+            lambda: cv2.bilateralFilter(self.gray(), diameter, sigma_color, sigma_space)
+        )
+
+    def canny(self, low, high, blur=None):
+        """
+        Bordes de Canny sobre la escala de grises
+
+        Args:
+            low, high: Umbrales de histéresis
+            blur: None para usar la escala de grises directamente, el tamaño
+                del kernel de un desenfoque gaussiano previo o 'bilateral'
+                para el filtro bilateral (9, 75, 75)
+        """
+        def compute():
+            if blur is None:
+                source = self.gray()
+            elif blur == "bilateral":
+                source = self.bilateral(9, 75, 75)
+            else:
+                source = self.gaussian_blur(blur)
+            return cv2.Canny(source, low, high)
+
+        return self.derive("canny", (low, high, blur), compute)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._derived)}
@@ -8,6 +8,13 @@ import random
 import sys
 import logging
 
+from .artifacts import ARTIFACT_EXTENSION, write_model_artifact
+from .classifier import vision_classifier
+from .executor import run_stage
+from .image_context import ImageContext
+from .lod import build_mesh_lods, lod_entries
+from .result_cache import KIND_DEPTH, KIND_MODEL, get_result_cache, normalize_settings
+
 # Añadir el directorio padre al path para poder importar opencv_processors
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if parent_dir not in sys.path:
@@ -22,11 +29,18 @@ except ImportError:
     # Definición de placeholder para evitar errores
     def get_image_processor(image_type):
         return None
+else:
+    from .stages import detect_people_contours, specialized_depth_map
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Configuración que determina el mapa de profundidad y, junto con la
+# resolución de la malla, el modelo 3D completo
+DEPTH_SETTINGS = ("detail_level", "sensitivity")
+MODEL_SETTINGS = DEPTH_SETTINGS + ("polygons", "mesh_mode", "color_mode")
+
 def make_json_serializable(obj):
     """
     Convierte objetos con tipos NumPy a tipos Python estándar para serialización JSON
@@ -73,6 +87,9 @@ class ImageProcessor:
         if image is None:
             return {"error": "No se pudo cargar la imagen"}
 
+        # Representaciones derivadas compartidas por todas las etapas
+        context = ImageContext(image)
+        
         # Convertir a RGB para procesamiento
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
@@ -83,23 +100,23 @@ class ImageProcessor:
         edges = cv2.Canny(image, 100, 200)
         
         # Detectar rostros
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = context.gray()
         faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
         
         # Análisis de color
         average_color = np.mean(image, axis=(0,1)).tolist()
         
         # Detectar el tipo de imagen
-        image_type = self._detect_image_type(image)
+        image_type = self._detect_image_type(context)
         
         # Procesar usando procesador especializado o método interno
         specialized_processor = get_image_processor(image_type)
         if specialized_processor:
-            processed_image, depth_map, contours = specialized_processor.process_image(image)
+            processed_image, depth_map, contours = specialized_processor.process_image(context)
         else:
             # Método interno fallback
-            processed_image = self._process_image_internal(image)
-            depth_map = self._generate_depth_map_internal(image)
+            processed_image = self._process_image_internal(context)
+            depth_map = self._generate_depth_map_internal(context)
             contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
         # Detección de objetos
@@ -138,12 +155,13 @@ class ImageProcessor:
             depth_map_path = None
         
         # Guardar JSON con resultados
+        results = make_json_serializable(results)
         json_path = os.path.join(output_dir, os.path.splitext(os.path.basename(image_path))[0] + '_analysis.json')
         with open(json_path, 'w') as f:
-            json.dump(make_json_serializable(results), f, indent=4)
+            json.dump(results, f, indent=4)
 
         return {
-            "results": make_json_serializable(results),
+            "results": results,
             "processed_image": processed_image_path,
             "depth_map": depth_map_path,
             "analysis_json": json_path
@@ -151,11 +169,12 @@ class ImageProcessor:
 
     def _process_image_internal(self, image):
         """Método interno para procesar imágenes si no hay procesador especializado"""
-        processed = image.copy()
+        context = ImageContext.wrap(image)
+        processed = context.image.copy()
         
         # Detectar bordes
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        edges = cv2.Canny(gray, 100, 200)
+        gray = context.gray()
+        edges = context.canny(100, 200)
         
         # Dibujar contornos
         contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -170,12 +189,13 @@ class ImageProcessor:
 
     def _generate_depth_map_internal(self, image):
         """Método interno para generar mapa de profundidad"""
+        context = ImageContext.wrap(image)
+        
         # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = context.gray()
         
         # Aplicar filtros para mejorar contraste
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
+        edges = context.canny(50, 150, blur=5)
         
         # Crear un mapa de profundidad usando una combinación de técnicas
         # 1. Usar detección de bordes como parte del mapa de profundidad
@@ -192,9 +212,14 @@ class ImageProcessor:
         
         return depth_map
 
-    def generate_3d_data(self, image_path, settings=None):
+    def generate_3d_data(self, image_path, settings=None, context=None, on_depth_map=None):
         """
         Genera datos para modelado 3D usando procesador especializado según tipo de imagen
+
+        Si se pasa context (ImageContext de la imagen ya cargada en la petición),
+        no se vuelve a leer la imagen del disco y se reutilizan sus representaciones
+        derivadas. on_depth_map, si se indica, recibe el mapa de profundidad en
+        cuanto está disponible (para mostrar una vista previa).
         """
         print(f"Iniciando generación de datos 3D para: {image_path}")
         
@@ -211,216 +236,207 @@ class ImageProcessor:
             print(f"Configuración recibida: {settings}")
         
         # Leer imagen
-        image = cv2.imread(image_path)
-        if image is None:
-            print(f"ERROR: No se pudo cargar la imagen desde: {image_path}")
-            return {"error": "No se pudo cargar la imagen"}
+        if context is None:
+            image = cv2.imread(image_path)
+            if image is None:
+                print(f"ERROR: No se pudo cargar la imagen desde: {image_path}")
+                return {"error": "No se pudo cargar la imagen"}
+            context = ImageContext(image)
+        image = context.image
         
         print(f"Imagen cargada correctamente, dimensiones: {image.shape}")
         
         # Detectar tipo de imagen
-        image_type = self._detect_image_type(image)
+        image_type = self._detect_image_type(context)
         logger.info(f"Tipo de imagen detectado para 3D: {image_type}")
         print(f"Tipo de imagen detectado: {image_type}")
         
-        # Generar mapa de profundidad según el tipo de imagen
-        specialized_processor = get_image_processor(image_type)
-        
         detail_level = settings.get("detail_level", 5)
         sensitivity = settings.get("sensitivity", 0.5)
+        target_polygons = settings.get("polygons", 2000)
+        mesh_mode = settings.get("mesh_mode", "grid")
+        color_mode = settings.get("color_mode", "color")
+        
+        # Caché persistente de resultados: la misma imagen con la misma
+        # configuración y la misma versión del código da el mismo modelo
+        effective_settings = {
+            "detail_level": detail_level,
+            "sensitivity": sensitivity,
+            "polygons": target_polygons,
+            "mesh_mode": mesh_mode,
+            "color_mode": color_mode
+        }
+        result_cache = get_result_cache()
+        image_hash = context.sha256() if result_cache.enabled else None
+        depth_key = result_cache.key(KIND_DEPTH, image_hash, image_type,
+                                     normalize_settings(effective_settings, DEPTH_SETTINGS))
+        model_key = result_cache.key(KIND_MODEL, image_hash, image_type,
+                                     normalize_settings(effective_settings, MODEL_SETTINGS))
+        
+        cached_model = result_cache.get_model(model_key)
+        if result_cache.enabled:
+            counters = result_cache.counters()
+            logger.info("Caché de resultados: " + ", ".join(
+                f"{kind} {values['hits']}/{values['hits'] + values['misses']} aciertos"
+                for kind, values in counters.items()
+            ))
+        if cached_model is not None:
+            print("Modelo 3D recuperado de la caché de resultados")
+            cached_data, meshes = cached_model
+            levels = [(mesh, None, None) for mesh in meshes]
+            metadata = cached_data["metadata"]
+            if on_depth_map:
+                depth_map = result_cache.get_depth(depth_key)
+                if depth_map is not None:
+                    on_depth_map(depth_map)
+        else:
+            levels, metadata = self._build_model(context, image_type, effective_settings, depth_key, result_cache,
+                                                 on_depth_map)
+            if levels is None:
+                return {"error": "No se pudo generar el mapa de profundidad"}
+            result_cache.put_model(model_key, {"metadata": metadata}, [mesh for mesh, _, _ in levels])
+        
+        mesh = levels[0][0]
+        vertices_count = len(mesh["vertices"])
+        faces_count = len(mesh["faces"])
+        
+        # Solo los metadatos pueden traer tipos de NumPy; la geometría sale
+        # de tolist() ya con tipos de Python
+        metadata = make_json_serializable(dict(metadata, settings=settings))
+        
+        # Guardar datos para modelado 3D: un único artefacto comprimido
+        # escrito desde los arrays, enlazado desde el directorio especializado
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output_dir = os.path.join(base_dir, 'models3d')
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        artifact_path = os.path.join(output_dir, f'{stem}_{image_type}_3d_data{ARTIFACT_EXTENSION}')
+        specialized_dir = self.specialized_dirs.get(image_type, output_dir)
+        specialized_path = os.path.join(specialized_dir, f'{stem}_3d_data{ARTIFACT_EXTENSION}')
+        try:
+            artifact_size = write_model_artifact(artifact_path, metadata, [level[0] for level in levels],
+                                                 links=[specialized_path])
+            print(f"Archivo guardado en: {artifact_path} ({artifact_size} bytes)")
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el artefacto del modelo 3D: {str(e)}")
         
-        print(f"Generando mapa de profundidad con nivel de detalle: {detail_level}, sensibilidad: {sensitivity}")
+        print(f"Modelo 3D generado: {vertices_count} vértices, {faces_count} caras")
         
-        if specialized_processor:
-            print(f"Usando procesador especializado para: {image_type}")
-            depth_map = specialized_processor.generate_depth_map(image, detail_level, sensitivity)
+        # Datos 3D para la respuesta
+        return {
+            "vertices": mesh["vertices"].tolist(),
+            "faces": mesh["faces"].tolist(),
+            "normals": mesh["normals"].tolist(),
+            "colors": mesh["colors"].tolist(),
+            "lods": lod_entries(levels),
+            "metadata": metadata
+        }
+
+    def _build_model(self, context, image_type, settings, depth_key, result_cache, on_depth_map=None):
+        """
+        Genera el mapa de profundidad (o lo toma de la caché) y la cadena de niveles de detalle
+
+        Returns:
+            Tuple de (niveles de build_mesh_lods, metadatos del modelo sin la configuración),
+            o (None, None) si no se pudo generar el mapa de profundidad
+        """
+        image = context.image
+        detail_level = settings["detail_level"]
+        sensitivity = settings["sensitivity"]
+        target_polygons = settings["polygons"]
+        mesh_mode = settings["mesh_mode"]
+        
+        depth_map = result_cache.get_depth(depth_key)
+        if depth_map is not None:
+            print("Mapa de profundidad recuperado de la caché de resultados")
         else:
-            print("Usando procesador interno genérico")
-            # Método interno fallback
-            depth_map = self._generate_depth_map_internal(image)
-        
-        if depth_map is None:
-            print("ERROR: No se pudo generar el mapa de profundidad")
-            return {"error": "No se pudo generar el mapa de profundidad"}
+            # Generar mapa de profundidad según el tipo de imagen
+            specialized_processor = get_image_processor(image_type)
+            
+            print(f"Generando mapa de profundidad con nivel de detalle: {detail_level}, sensibilidad: {sensitivity}")
+            
+            if specialized_processor:
+                print(f"Usando procesador especializado para: {image_type}")
+                depth_map = run_stage(specialized_depth_map, image_type, context, detail_level, sensitivity)
+            else:
+                print("Usando procesador interno genérico")
+                # Método interno fallback
+                depth_map = self._generate_depth_map_internal(context)
+            
+            if depth_map is None:
+                print("ERROR: No se pudo generar el mapa de profundidad")
+                return None, None
+            
+            result_cache.put_depth(depth_key, depth_map)
         
         print(f"Mapa de profundidad generado, dimensiones: {depth_map.shape}")
+        if on_depth_map:
+            on_depth_map(depth_map)
         
         # Generar geometría 3D
         height, width = depth_map.shape
-        vertices = []
-        faces = []
-        normals = []
-        colors = []
-        
-        # Aplicar un factor de escala para reducir la densidad de vértices
-        target_polygons = settings.get("polygons", 2000)
-        scale_factor = max(1, int(np.sqrt((height * width) / (target_polygons * 2))))
         
-        print(f"Factor de escala para polígonos: {scale_factor}, objetivo: {target_polygons}")
+        # Cadena de niveles de detalle (completo, 1/4 y 1/16) a partir del mismo mapa
+        print("Generando malla...")
+        levels = run_stage(
+            build_mesh_lods,
+            depth_map,
+            image,
+            target_polygons,
+            mesh_mode=mesh_mode,
+            color_mode=settings["color_mode"]
+        )
+        mesh, resized_depth, scale_factor = levels[0]
         
-        # Redimensionar mapa de profundidad y la imagen
-        resized_depth = cv2.resize(depth_map, (width // scale_factor, height // scale_factor), interpolation=cv2.INTER_AREA)
-        resized_image = cv2.resize(image, (width // scale_factor, height // scale_factor), interpolation=cv2.INTER_AREA)
+        print(f"Factor de escala para polígonos: {scale_factor}, objetivo: {target_polygons}, modo: {mesh_mode}")
         
         # Obtener dimensiones del mapa de profundidad redimensionado
         h_resized, w_resized = resized_depth.shape
         
         print(f"Mapa de profundidad redimensionado a: {w_resized}x{h_resized}")
         
-        # 1. Crear vértices
-        print("Generando vértices...")
-        for y in range(h_resized):
-            for x in range(w_resized):
-                # Normalizar coordenadas entre -1 y 1
-                norm_x = (x / (w_resized-1)) * 2 - 1
-                norm_y = -((y / (h_resized-1)) * 2 - 1)  # Y invertido
-                norm_z = resized_depth[y, x] * 2 - 1  # Z desde profundidad
-                
-                vertices.append([norm_x, norm_y, norm_z])
-                
-                # Calcular normales
-                if x > 0 and x < w_resized-1 and y > 0 and y < h_resized-1:
-                    dx = resized_depth[y, x+1] - resized_depth[y, x-1]
-                    dy = resized_depth[y+1, x] - resized_depth[y-1, x]
-                    normal = [-dx, -dy, 1.0]  # Vector normal aproximado
-                    
-                    # Normalizar el vector
-                    length = np.sqrt(normal[0]**2 + normal[1]**2 + normal[2]**2)
-                    if length > 0:
-                        normal = [n/length for n in normal]
-                    else:
-                        normal = [0, 0, 1]
-                else:
-                    normal = [0, 0, 1]  # Normal por defecto
-                
-                normals.append(normal)
-                
-                # Colores - extraer de la imagen
-                b, g, r = [float(c)/255.0 for c in resized_image[y, x]]
-                colors.append([r, g, b])  # RGB normalizado
-        
-        # 2. Crear caras (triángulos)
-        depth_threshold = 0.2  # Umbral para detectar cambios bruscos
-        
-        for y in range(h_resized - 1):
-            for x in range(w_resized - 1):
-                # Índices de los vértices para cada cuadrado
-                v0 = y * w_resized + x
-                v1 = y * w_resized + (x + 1)
-                v2 = (y + 1) * w_resized + x
-                v3 = (y + 1) * w_resized + (x + 1)
-                
-                # Extraer valores de profundidad
-                d0 = resized_depth[y, x]
-                d1 = resized_depth[y, x+1]
-                d2 = resized_depth[y+1, x]
-                d3 = resized_depth[y+1, x+1]
-                
-                # Solo crear caras si la diferencia de profundidad no es muy grande
-                if (abs(d0-d1) < depth_threshold and 
-                    abs(d1-d3) < depth_threshold and 
-                    abs(d3-d2) < depth_threshold and 
-                    abs(d2-d0) < depth_threshold):
-                    faces.append([v0, v1, v2])
-                    faces.append([v1, v3, v2])
-        
-        # Preparar datos 3D
-        model_data = {
-            "vertices": [[float(v) for v in vertex] for vertex in vertices],
-            "faces": [[int(f) for f in face] for face in faces],
-            "normals": [[float(n) for n in normal] for normal in normals],
-            "colors": [[float(c) for c in color] for color in colors],
-            "metadata": {
-                "image_type": image_type,
-                "vertices_count": len(vertices),
-                "faces_count": len(faces),
-                "image_dimensions": {
-                    "width": int(width),
-                    "height": int(height),
-                    "depth_width": int(w_resized),
-                    "depth_height": int(h_resized)
-                },
-                "settings": settings
+        metadata = {
+            "image_type": image_type,
+            "mesh_mode": mesh_mode,
+            "vertices_count": len(mesh["vertices"]),
+            "faces_count": len(mesh["faces"]),
+            "lod_count": len(levels),
+            "image_dimensions": {
+                "width": int(width),
+                "height": int(height),
+                "depth_width": int(w_resized),
+                "depth_height": int(h_resized)
             }
         }
-        
-        # Guardar datos para modelado 3D
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        output_dir = os.path.join(base_dir, 'models3d')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        json_path = os.path.join(output_dir, os.path.splitext(os.path.basename(image_path))[0] + f'_{image_type}_3d_data.json')
-        with open(json_path, 'w') as f:
-            json.dump(make_json_serializable(model_data), f, indent=2)
-        
-        print(f"Modelo 3D generado: {len(vertices)} vértices, {len(faces)} caras")
-        print(f"Archivo guardado en: {json_path}")
-        
-        # Guardar también una copia en el directorio especializado
-        specialized_dir = self.specialized_dirs.get(image_type, output_dir)
-        specialized_path = os.path.join(specialized_dir, os.path.splitext(os.path.basename(image_path))[0] + '_3d_data.json')
-        with open(specialized_path, 'w') as f:
-            json.dump(make_json_serializable(model_data), f, indent=2)
-
-        return make_json_serializable(model_data)
+        return levels, metadata
 
     def _detect_image_type(self, image):
         """
         Detecta automáticamente el tipo de imagen basado en su contenido
+        (clasificador por etapas sobre una copia reducida, memorizado por contenido)
         """
-        # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Usar diferentes detectores para identificar el tipo de contenido
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-        
-        # Detectar bordes
-        edges = cv2.Canny(gray, 50, 200)
-        edge_density = np.count_nonzero(edges) / (edges.shape[0] * edges.shape[1])
-        
-        # Detectar círculos
-        circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1.2, minDist=100,
-                                  param1=100, param2=30, minRadius=5, maxRadius=300)
-        
-        # Inicializar detector HOG para personas
-        try:
-            hog = cv2.HOGDescriptor()
-            hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
-            people, _ = hog.detectMultiScale(image, winStride=(8, 8), padding=(4, 4), scale=1.05)
-        except:
-            # Si falla el detector HOG
-            people = []
-        
-        # Analizar resultados para determinar el tipo
-        if len(faces) > 0:
-            return "rostros"
-        elif len(people) > 0:
-            return "personas"
-        elif circles is not None and len(circles[0]) > 3:
-            return "redondos"
-        elif edge_density > 0.2:  # Muchos bordes indican posibles circuitos o figuras geométricas
-            # Analizar si son patrones rectos (circuitos) o curvos (trigonometría)
-            lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=80, minLineLength=50, maxLineGap=10)
-            if lines is not None and len(lines) > 15:
-                return "circuitos"
-            else:
-                return "trigonometria"
-        
-        # Si no se puede determinar con certeza
-        return "general"
+        context = ImageContext.wrap(image)
+
+        def classify():
+            result = vision_classifier.classify(context.image)
+            logger.info(f"Clasificación: {result.image_type} (etapa {result.stage}, "
+                        f"{result.total_ms:.1f} ms{', en caché' if result.cached else ''})")
+            return result
+
+        return context.derive("image_type", (), classify).image_type
 
     def detect_objects(self, image, confidence_threshold=0.5):
         """
         Detecta objetos en una imagen utilizando una combinación de técnicas
         avanzadas similar a YOLO pero optimizada para rendimiento
         """
+        context = ImageContext.wrap(image)
+        
         # Detectar tipo de imagen para procesamiento especializado
-        image_type = self._detect_image_type(image)
+        image_type = self._detect_image_type(context)
         logger.info(f"Tipo de imagen detectado para detección de objetos: {image_type}")
         
         # Altura y ancho de la imagen
-        height, width = image.shape[:2]
+        height, width = context.shape[:2]
         
         # Procesar con procesador especializado
         specialized_processor = get_image_processor(image_type)
@@ -429,7 +445,7 @@ class ImageProcessor:
         detections = []
         
         # 1. Detección basada en contornos usando procesadores especializados
-        _, _, contours = specialized_processor.process_image(image)
+        _, _, contours = specialized_processor.process_image(context)
         
         # Convertir contornos a detecciones iniciales
         contour_detections = []
@@ -489,7 +505,7 @@ class ImageProcessor:
         # 2. Detección basada en cascada para objetos específicos (rostros, ojos, etc.)
         if image_type in ["rostros", "personas"]:
             # Detección de rostros
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = context.gray()
             faces = self.face_cascade.detectMultiScale(gray, 1.3, 5, minSize=(30, 30))
             
             for (x, y, w, h) in faces:
@@ -510,7 +526,7 @@ class ImageProcessor:
         
         # 3. Detección basada en color para elementos destacados
         # Convertir a HSV para mejor segmentación de color
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        hsv = context.hsv()
         
         # Detección de objetos rojos
         lower_red1 = np.array([0, 100, 100])
@@ -583,12 +599,15 @@ class ImageProcessor:
         """
         Detecta personas en una imagen usando el detector HOG de OpenCV
         """
+        context = ImageContext.wrap(image)
+        image = context.image
+        
         # Obtener el procesador especializado para personas
         specialized_processor = get_image_processor("personas")
         
         if specialized_processor:
-            # Procesar imagen
-            _, _, contours = specialized_processor.process_image(image)
+            # Procesar imagen (detector HOG del procesador especializado)
+            contours = run_stage(detect_people_contours, context)
         else:
             # Usar detector HOG directamente
             try:
@@ -639,15 +658,17 @@ class ImageProcessor:
         """
         Detecta rostros en una imagen usando el procesador especializado
         """
+        context = ImageContext.wrap(image)
+        
         # Obtener el procesador especializado para rostros
         specialized_processor = get_image_processor("rostros")
         
         if specialized_processor:
             # Procesar imagen
-            _, _, contours = specialized_processor.process_image(image)
+            _, _, contours = specialized_processor.process_image(context)
         else:
             # Usar detector de cascada directamente
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = context.gray()
             faces = self.face_cascade.detectMultiScale(
                 gray,
                 scaleFactor=scale_factor,
@@ -0,0 +1,124 @@
+import math
+
+import cv2
+
+from .mesh import build_grid_mesh, resample_for_polygons
+from .quadtree_mesh import ADAPTIVE_OVERSAMPLING, build_adaptive_lods
+
+# Cadena de niveles de detalle: divisor del presupuesto de polígonos de cada
+# nivel. El nivel 0 es la malla completa; los siguientes son 1/4 y 1/16.
+LOD_DIVISORS = (1, 4, 16)
+
+# Claves de geometría que se sustituyen al seleccionar un nivel
+GEOMETRY_KEYS = ("vertices", "faces", "normals", "colors")
+
+
+def build_mesh_lods(depth_map, image, target_polygons, mesh_mode="grid", **options):
+    """
+    Genera la cadena de niveles de detalle a partir de un único mapa de profundidad
+
+    En modo 'grid' los niveles forman una pirámide: cada uno reduce la
+    resolución del nivel 0 a la mitad por eje (1/4 de polígonos). En modo
+    'adaptive' todos los niveles comparten el mismo quadtree y solo cambia
+    el umbral de subdivisión.
+
+    Args:
+        depth_map: Mapa de profundidad a resolución completa
+        image: Imagen BGR con las mismas dimensiones
+        target_polygons: Presupuesto de polígonos del nivel 0
+        mesh_mode: 'grid' o 'adaptive'
+        options: Argumentos de build_grid_mesh / build_adaptive_mesh
+
+    Returns:
+        Lista de tuplas (malla, mapa de profundidad remuestreado, factor de escala),
+        del nivel más detallado al más simple
+    """
+    if mesh_mode == "adaptive":
+        budgets = [max(2, target_polygons // divisor) for divisor in LOD_DIVISORS]
+        resized_depth, resized_image, scale_factor = resample_for_polygons(
+            depth_map, image, target_polygons * ADAPTIVE_OVERSAMPLING
+        )
+        meshes = build_adaptive_lods(resized_depth, resized_image, budgets, **options)
+        return [(mesh, resized_depth, scale_factor) for mesh in meshes]
+
+    base_depth, base_image, base_scale = resample_for_polygons(depth_map, image, target_polygons)
+    height, width = base_depth.shape
+
+    levels = []
+    for divisor in LOD_DIVISORS:
+        axis = int(round(math.sqrt(divisor)))
+        if axis == 1:
+            resized_depth, resized_image = base_depth, base_image
+        else:
+            size = (max(2, width // axis), max(2, height // axis))
+            resized_depth = cv2.resize(base_depth, size, interpolation=cv2.INTER_AREA)
+            resized_image = cv2.resize(base_image, size, interpolation=cv2.INTER_AREA)
+        levels.append((build_grid_mesh(resized_depth, resized_image, **options), resized_depth, base_scale * axis))
+    return levels
+
+
+def lod_entries(levels):
+    """
+    Serializa los niveles 1..N de la cadena (el nivel 0 va en la raíz de data_3d)
+
+    Returns:
+        Lista de diccionarios JSON con la geometría y los contadores de cada nivel
+    """
+    entries = []
+    for lod, (mesh, _, _) in enumerate(levels[1:], start=1):
+        entries.append({
+            "lod": lod,
+            "vertices": mesh["vertices"].tolist(),
+            "faces": mesh["faces"].tolist(),
+            "normals": mesh["normals"].tolist(),
+            "colors": mesh["colors"].tolist(),
+            "vertices_count": len(mesh["vertices"]),
+            "faces_count": len(mesh["faces"]),
+        })
+    return entries
+
+
+def parse_lod(value):
+    """
+    Valida el parámetro ?lod= de la API
+
+    Returns:
+        Nivel entero o None si no se indicó
+
+    Raises:
+        ValueError: Si no es un nivel válido
+    """
+    if value in (None, ''):
+        return None
+    message = f"lod debe ser un entero entre 0 y {len(LOD_DIVISORS) - 1}"
+    try:
+        lod = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(message)
+    if not 0 <= lod < len(LOD_DIVISORS):
+        raise ValueError(message)
+    return lod
+
+
+def select_lod(data_3d, lod=None):
+    """
+    Devuelve data_3d con la geometría del nivel indicado y sin la cadena de niveles
+
+    Los modelos generados antes de existir la cadena solo tienen el nivel 0;
+    en ese caso se usa el nivel más simple disponible.
+    """
+    if not isinstance(data_3d, dict):
+        return data_3d
+
+    selected = {key: value for key, value in data_3d.items() if key != "lods"}
+    if not lod:
+        return selected
+
+    available = data_3d.get("lods") or []
+    levels = [entry for entry in available if entry.get("lod", 0) <= lod]
+    if levels:
+        level = max(levels, key=lambda entry: entry.get("lod", 0))
+        for key in GEOMETRY_KEYS:
+            selected[key] = level.get(key, [])
+        selected["lod"] = level.get("lod", 0)
+    return selected
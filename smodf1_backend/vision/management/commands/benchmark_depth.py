@@ -0,0 +1,152 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from vision.depth_primitives import (
+    BLEND_REPLACE, draw_elliptical_bump, draw_radial_bump, draw_vertical_gradient
+)
+
+
+# Bucles originales píxel a píxel de los procesadores. Se conservan
+# únicamente como referencia para comparar resultados.
+
+def legacy_face_mask(mask, faces, detail_level):
+    """FaceImageProcessor.generate_depth_map"""
+    for (x, y, w, h) in faces:
+        center_x, center_y = x + w//2, y + h//2
+        for i in range(y, y + h):
+            for j in range(x, x + w):
+                dist = np.sqrt(((j - center_x) / (w/2))**2 + ((i - center_y) / (h/2))**2)
+                if dist < 1.0:
+                    boost = max(0, min(1, (np.cos(dist * np.pi/2) * 0.7 + 0.3) * detail_level / 5))
+                    mask[i, j] = boost
+    return mask
+
+
+def legacy_analysis_face_mask(mask, faces, detail_level):
+    """api.processors.ImageProcessor._enhance_faces_depth_map"""
+    for (x, y, w, h) in faces:
+        center_x, center_y = x + w//2, y + h//2
+        for i in range(y, y + h):
+            for j in range(x, x + w):
+                dist = np.sqrt(((j - center_x) / (w/2))**2 + ((i - center_y) / (h/2))**2)
+                if dist < 1.0:
+                    boost = np.cos(dist * np.pi/2) * 0.5 + 0.5
+                    mask[i, j] = boost
+    return mask
+
+
+def legacy_circle_mask(mask, circles, detail_level):
+    """RoundObjectProcessor.generate_depth_map y _enhance_rounds_depth_map (gain=1)"""
+    for center_x, center_y, radius in circles:
+        for y in range(max(0, center_y-radius), min(mask.shape[0], center_y+radius+1)):
+            for x in range(max(0, center_x-radius), min(mask.shape[1], center_x+radius+1)):
+                dist = np.sqrt((x - center_x)**2 + (y - center_y)**2)
+                if dist <= radius:
+                    boost = (np.cos(dist/radius * np.pi/2) * 0.5 + 0.5) * detail_level / 5
+                    mask[y, x] = max(mask[y, x], boost)
+    return mask
+
+
+def legacy_person_mask(mask, boxes, detail_level):
+    """PersonImageProcessor.generate_depth_map"""
+    for (x, y, w, h) in boxes:
+        for i in range(y, y + h):
+            boost = (1 - (i - y) / h) * detail_level / 5
+            for j in range(x, x + w):
+                mask[i, j] = max(mask[i, j], boost)
+    return mask
+
+
+def face_mask(mask, faces, detail_level):
+    for (x, y, w, h) in faces:
+        draw_elliptical_bump(mask, x, y, w, h, floor=0.3, gain=detail_level / 5,
+                             clip=True, blend=BLEND_REPLACE)
+    return mask
+
+
+def analysis_face_mask(mask, faces, detail_level):
+    for (x, y, w, h) in faces:
+        draw_elliptical_bump(mask, x, y, w, h, floor=0.5, blend=BLEND_REPLACE)
+    return mask
+
+
+def circle_mask(mask, circles, detail_level):
+    for center_x, center_y, radius in circles:
+        draw_radial_bump(mask, center_x, center_y, radius, floor=0.5, gain=detail_level / 5)
+    return mask
+
+
+def person_mask(mask, boxes, detail_level):
+    for (x, y, w, h) in boxes:
+        draw_vertical_gradient(mask, x, y, w, h, gain=detail_level / 5)
+    return mask
+
+
+class Command(BaseCommand):
+    help = "Compara las primitivas de profundidad vectorizadas con los bucles originales píxel a píxel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=3840)
+        parser.add_argument('--height', type=int, default=2160)
+        parser.add_argument('--detections', type=int, default=50)
+        parser.add_argument('--detail-level', type=int, default=7)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        shape = (options['height'], options['width'])
+        detail_level = options['detail_level']
+        boxes, circles = self._detections(shape, options['detections'])
+
+        cases = [
+            ("rostros", legacy_face_mask, face_mask, boxes),
+            ("rostros (análisis)", legacy_analysis_face_mask, analysis_face_mask, boxes),
+            ("redondos", legacy_circle_mask, circle_mask, circles),
+            ("personas", legacy_person_mask, person_mask, boxes),
+        ]
+        self.stdout.write(
+            f"imagen={shape[1]}x{shape[0]} detecciones={options['detections']} detail_level={detail_level}"
+        )
+
+        for name, legacy, vectorized, detections in cases:
+            start = time.perf_counter()
+            expected = legacy(np.zeros(shape, dtype=np.float32), detections, detail_level)
+            legacy_time = time.perf_counter() - start
+
+            vectorized_time = float('inf')
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                result = vectorized(np.zeros(shape, dtype=np.float32), detections, detail_level)
+                vectorized_time = min(vectorized_time, time.perf_counter() - start)
+
+            if not np.allclose(expected, result, atol=1e-6):
+                raise CommandError(f"La máscara de '{name}' no coincide con el bucle original")
+
+            self.stdout.write(
+                f"{name}: original={legacy_time * 1000:.1f}ms vectorizado={vectorized_time * 1000:.1f}ms "
+                f"aceleración={legacy_time / vectorized_time:.0f}x"
+            )
+
+        self.stdout.write(self.style.SUCCESS("Máscaras idénticas dentro de la tolerancia de punto flotante"))
+
+    def _detections(self, shape, count):
+        """Cajas y círculos sintéticos, solapados entre sí y dentro de la imagen"""
+        height, width = shape
+        rng = np.random.default_rng(0)
+
+        boxes = []
+        for _ in range(count):
+            w = int(rng.integers(60, 400))
+            h = int(rng.integers(60, 400))
+            x = int(rng.integers(0, width - w))
+            y = int(rng.integers(0, height - h))
+            boxes.append((x, y, w, h))
+
+        circles = []
+        for _ in range(count):
+            radius = int(rng.integers(10, 150))
+            center_x = int(rng.integers(radius, width - radius))
+            center_y = int(rng.integers(radius, height - radius))
+            circles.append((center_x, center_y, radius))
+        return boxes, circles
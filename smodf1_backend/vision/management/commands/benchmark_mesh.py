@@ -0,0 +1,138 @@
+import math
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from vision.mesh import build_grid_mesh
+
+
+def legacy_grid_mesh(resized_depth, resized_image):
+    """
+    Mallado original píxel a píxel de ImageProcessor.generate_3d_data.
+    Se conserva únicamente como referencia para comparar resultados.
+    """
+    h_resized, w_resized = resized_depth.shape
+    vertices = []
+    faces = []
+    normals = []
+    colors = []
+
+    for y in range(h_resized):
+        for x in range(w_resized):
+            norm_x = (x / (w_resized-1)) * 2 - 1
+            norm_y = -((y / (h_resized-1)) * 2 - 1)
+            norm_z = resized_depth[y, x] * 2 - 1
+            vertices.append([norm_x, norm_y, norm_z])
+
+            if x > 0 and x < w_resized-1 and y > 0 and y < h_resized-1:
+                dx = resized_depth[y, x+1] - resized_depth[y, x-1]
+                dy = resized_depth[y+1, x] - resized_depth[y-1, x]
+                normal = [-dx, -dy, 1.0]
+                length = math.sqrt(normal[0]**2 + normal[1]**2 + normal[2]**2)
+                normal = [n/length for n in normal]
+            else:
+                normal = [0, 0, 1]
+            normals.append(normal)
+
+            b, g, r = [float(c)/255.0 for c in resized_image[y, x]]
+            colors.append([r, g, b])
+
+    depth_threshold = 0.2
+    for y in range(h_resized - 1):
+        for x in range(w_resized - 1):
+            v0 = y * w_resized + x
+            v1 = y * w_resized + (x + 1)
+            v2 = (y + 1) * w_resized + x
+            v3 = (y + 1) * w_resized + (x + 1)
+
+            d0 = resized_depth[y, x]
+            d1 = resized_depth[y, x+1]
+            d2 = resized_depth[y+1, x]
+            d3 = resized_depth[y+1, x+1]
+
+            if (abs(d0-d1) < depth_threshold and
+                abs(d1-d3) < depth_threshold and
+                abs(d3-d2) < depth_threshold and
+                abs(d2-d0) < depth_threshold):
+                faces.append([v0, v1, v2])
+                faces.append([v1, v3, v2])
+
+    return {
+        "vertices": vertices,
+        "faces": faces,
+        "normals": normals,
+        "colors": colors,
+    }
+
+
+class Command(BaseCommand):
+    help = "Compara el mallado vectorizado con el mallado original píxel a píxel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--image', help='Imagen a usar como mapa de profundidad (por defecto, una imagen sintética)')
+        parser.add_argument('--width', type=int, default=1920)
+        parser.add_argument('--height', type=int, default=1080)
+        parser.add_argument('--polygons', type=int, nargs='+', default=[2000, 20000, 50000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        image = self._load_image(options)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        depth_map = cv2.GaussianBlur(gray, (9, 9), 0).astype(np.float32) / 255.0
+        height, width = depth_map.shape
+
+        for target_polygons in options['polygons']:
+            scale_factor = max(1, int(np.sqrt((height * width) / (target_polygons * 2))))
+            size = (width // scale_factor, height // scale_factor)
+            resized_depth = cv2.resize(depth_map, size, interpolation=cv2.INTER_AREA)
+            resized_image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+            start = time.perf_counter()
+            legacy = legacy_grid_mesh(resized_depth, resized_image)
+            legacy_time = time.perf_counter() - start
+
+            vectorized_time = float('inf')
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                mesh = build_grid_mesh(resized_depth, resized_image)
+                vectorized_time = min(vectorized_time, time.perf_counter() - start)
+
+            self._check_matches(legacy, mesh)
+
+            self.stdout.write(
+                f"polygons={target_polygons} grid={size[0]}x{size[1]} "
+                f"vertices={len(mesh['vertices'])} faces={len(mesh['faces'])} "
+                f"original={legacy_time * 1000:.1f}ms vectorizado={vectorized_time * 1000:.1f}ms "
+                f"aceleración={legacy_time / vectorized_time:.0f}x"
+            )
+
+        self.stdout.write(self.style.SUCCESS("Resultados idénticos dentro de la tolerancia de punto flotante"))
+
+    def _load_image(self, options):
+        if options['image']:
+            image = cv2.imread(options['image'])
+            if image is None:
+                raise CommandError(f"No se pudo cargar la imagen: {options['image']}")
+            return image
+
+        # Imagen sintética con gradientes y discontinuidades de profundidad
+        rng = np.random.default_rng(0)
+        image = rng.integers(0, 256, (options['height'], options['width'], 3), dtype=np.uint8)
+        image = cv2.GaussianBlur(image, (31, 31), 0)
+        for _ in range(20):
+            center = (int(rng.integers(0, options['width'])), int(rng.integers(0, options['height'])))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.circle(image, center, int(rng.integers(20, 200)), color, -1)
+        return image
+
+    def _check_matches(self, legacy, mesh):
+        for key in ('vertices', 'normals', 'colors'):
+            expected = np.asarray(legacy[key], dtype=np.float64)
+            if not np.allclose(expected, mesh[key], atol=1e-5):
+                raise CommandError(f"'{key}' no coincide con el mallado original")
+
+        expected_faces = np.asarray(legacy['faces'], dtype=np.int64).reshape(-1, 3)
+        if not np.array_equal(expected_faces, mesh['faces']):
+            raise CommandError("'faces' no coincide con el mallado original")
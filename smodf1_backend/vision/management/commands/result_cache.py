@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from vision.result_cache import get_result_cache
+
+
+class Command(BaseCommand):
+    help = "Muestra la ocupación de la caché de resultados (mapas de profundidad y mallas) o la vacía"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Eliminar todas las entradas')
+
+    def handle(self, *args, **options):
+        result_cache = get_result_cache()
+        if options['clear']:
+            result_cache.clear()
+            self.stdout.write(self.style.SUCCESS(f"Caché vaciada: {result_cache.directory}"))
+
+        stats = result_cache.stats()
+        self.stdout.write(
+            f"directorio={result_cache.directory} versión={result_cache.version} "
+            f"entradas={stats['entries']} tamaño={stats['size_bytes'] / (1024 * 1024):.1f}MB "
+            f"máximo={stats['max_bytes'] / (1024 * 1024):.0f}MB"
+        )
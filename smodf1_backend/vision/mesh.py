@@ -0,0 +1,272 @@
+import struct
+
+import cv2
+import numpy as np
+
+# Umbral de diferencia de profundidad para descartar caras (huecos en el modelo)
+DEPTH_THRESHOLD = 0.2
+
+# Formato binario de transporte: cabecera little-endian de 16 bytes
+# (magic, versión, flags, número de vértices, número de caras) seguida de
+# posiciones, normales y colores en float32 y caras en uint32.
+MESH_MAGIC = b'SMSH'
+MESH_FORMAT_VERSION = 1
+MESH_HEADER = struct.Struct('<4sHHII')
+MESH_CONTENT_TYPE = 'application/octet-stream'
+
+MESH_HAS_NORMALS = 1
+MESH_HAS_COLORS = 2
+
+
+def resample_for_polygons(depth_map, image, target_polygons):
+    """
+    Reduce el mapa de profundidad y la imagen a la resolución de malla
+    correspondiente al número de polígonos deseado
+
+    Returns:
+        Tuple de (mapa de profundidad, imagen, factor de escala)
+    """
+    height, width = depth_map.shape[:2]
+    scale_factor = max(1, int(np.sqrt((height * width) / (target_polygons * 2))))
+    size = (width // scale_factor, height // scale_factor)
+
+    resized_depth = cv2.resize(depth_map, size, interpolation=cv2.INTER_AREA)
+    resized_image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return resized_depth, resized_image, scale_factor
+
+
+def apply_color_mode(image, color_mode="color"):
+    """
+    Aplica el modo de color de la malla a una imagen BGR
+
+    Args:
+        image: Imagen BGR (OpenCV)
+        color_mode: 'color', 'grayscale' o 'blueprint'
+
+    Returns:
+        Imagen BGR con el modo de color aplicado
+    """
+    if color_mode == "grayscale":
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+    if color_mode == "blueprint":
+        # Efecto blueprint (azul técnico)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        result = np.zeros_like(image)
+        result[:, :, 0] = 180  # Canal B (azul)
+        result[:, :, 1] = 30 + gray // 4  # Canal G
+        result[:, :, 2] = 5 + gray // 8   # Canal R
+        return result
+
+    # color (normal)
+    return image
+
+
+def _normalized_axis(size):
+    """Coordenadas normalizadas entre -1 y 1 para un eje de la malla"""
+    return np.linspace(-1.0, 1.0, size, dtype=np.float32)
+
+
+def grid_positions(depth_map, z_scale=2.0, z_offset=-1.0):
+    """
+    Genera las posiciones de los vértices de una malla regular
+
+    Args:
+        depth_map: Mapa de profundidad (alto x ancho)
+        z_scale: Factor aplicado a la profundidad
+        z_offset: Desplazamiento aplicado a la profundidad escalada
+
+    Returns:
+        Array float32 (alto*ancho, 3) con las coordenadas x, y, z
+    """
+    height, width = depth_map.shape
+    positions = np.empty((height, width, 3), dtype=np.float32)
+    positions[:, :, 0] = _normalized_axis(width)[np.newaxis, :]
+    positions[:, :, 1] = -_normalized_axis(height)[:, np.newaxis]  # Y invertido
+    positions[:, :, 2] = depth_map * z_scale + z_offset
+    return positions.reshape(-1, 3)
+
+
+def grid_normals(depth_map, spacing=1.0):
+    """
+    Calcula las normales de la malla a partir del gradiente del mapa de profundidad
+
+    Los vértices del borde conservan la normal por defecto (0, 0, 1).
+
+    Args:
+        depth_map: Mapa de profundidad (alto x ancho)
+        spacing: Píxeles del mapa que ocupa una celda de la malla
+
+    Returns:
+        Array float32 (alto*ancho, 3) con normales unitarias
+    """
+    height, width = depth_map.shape
+    normals = np.zeros((height, width, 3), dtype=np.float32)
+    normals[:, :, 2] = 1.0
+
+    if height > 2 and width > 2:
+        # np.gradient usa diferencias centrales divididas entre 2
+        grad_y, grad_x = np.gradient(depth_map.astype(np.float32))
+        dx = grad_x[1:-1, 1:-1] * (2 * spacing)
+        dy = grad_y[1:-1, 1:-1] * (2 * spacing)
+
+        inner = np.stack([-dx, -dy, np.ones_like(dx)], axis=-1)
+        inner /= np.linalg.norm(inner, axis=-1, keepdims=True)
+        normals[1:-1, 1:-1] = inner
+
+    return normals.reshape(-1, 3)
+
+
+def grid_colors(image):
+    """
+    Convierte una imagen BGR (OpenCV) en colores RGB normalizados por vértice
+
+    Returns:
+        Array float32 (alto*ancho, 3)
+    """
+    return image[:, :, ::-1].reshape(-1, 3).astype(np.float32) / 255.0
+
+
+def grid_faces(depth_map, depth_threshold=DEPTH_THRESHOLD):
+    """
+    Genera los triángulos de la malla descartando celdas con cambios bruscos de profundidad
+
+    Cada celda produce dos triángulos [v0, v1, v2] y [v1, v3, v2], en el mismo
+    orden de recorrido (fila por fila) que el mallado original.
+
+    Returns:
+        Array int32 (caras, 3) con los índices de los vértices
+    """
+    height, width = depth_map.shape
+
+    d0 = depth_map[:-1, :-1]
+    d1 = depth_map[:-1, 1:]
+    d2 = depth_map[1:, :-1]
+    d3 = depth_map[1:, 1:]
+
+    # Solo crear caras si la diferencia de profundidad no es muy grande
+    mask = (
+        (np.abs(d0 - d1) < depth_threshold) &
+        (np.abs(d1 - d3) < depth_threshold) &
+        (np.abs(d3 - d2) < depth_threshold) &
+        (np.abs(d2 - d0) < depth_threshold)
+    )
+
+    ys, xs = np.nonzero(mask)
+    v0 = (ys * width + xs).astype(np.int32)
+    v1 = v0 + 1
+    v2 = v0 + width
+    v3 = v2 + 1
+
+    faces = np.empty((len(v0), 2, 3), dtype=np.int32)
+    faces[:, 0] = np.stack([v0, v1, v2], axis=-1)
+    faces[:, 1] = np.stack([v1, v3, v2], axis=-1)
+    return faces.reshape(-1, 3)
+
+
+def build_grid_mesh(depth_map, image, z_scale=2.0, z_offset=-1.0, color_mode="color",
+                    depth_threshold=DEPTH_THRESHOLD, cull_extruded=False):
+    """
+    Construye una malla regular completa a partir de un mapa de profundidad
+
+    Args:
+        depth_map: Mapa de profundidad redimensionado (alto x ancho)
+        image: Imagen BGR con las mismas dimensiones que el mapa de profundidad
+        z_scale: Factor de extrusión aplicado a la profundidad
+        z_offset: Desplazamiento aplicado a la profundidad escalada
+        color_mode: Modo de color de los vértices ('color', 'grayscale', 'blueprint')
+        depth_threshold: Diferencia máxima de profundidad para crear una cara
+        cull_extruded: Comparar la profundidad ya extruida (z) en lugar del mapa original
+
+    Returns:
+        Diccionario con arrays 'vertices', 'normals', 'colors' y 'faces'
+    """
+    positions = grid_positions(depth_map, z_scale, z_offset)
+
+    if cull_extruded:
+        cull_depth = positions[:, 2].reshape(depth_map.shape)
+    else:
+        cull_depth = depth_map
+
+    return {
+        "vertices": positions,
+        "normals": grid_normals(depth_map),
+        "colors": grid_colors(apply_color_mode(image, color_mode)),
+        "faces": grid_faces(cull_depth, depth_threshold),
+    }
+
+
+def mesh_from_data(data_3d):
+    """
+    Convierte un modelo 3D serializado en JSON (listas) en arrays de numpy
+
+    Returns:
+        Diccionario con arrays 'vertices', 'normals', 'colors' y 'faces'
+    """
+    def as_array(key, dtype):
+        values = data_3d.get(key) or []
+        return np.asarray(values, dtype=dtype).reshape(-1, 3)
+
+    return {
+        "vertices": as_array("vertices", np.float32),
+        "normals": as_array("normals", np.float32),
+        "colors": as_array("colors", np.float32),
+        "faces": as_array("faces", np.uint32),
+    }
+
+
+def pack_mesh(mesh):
+    """
+    Empaqueta una malla en el formato binario de transporte
+
+    Normales y colores solo se incluyen si existe uno por vértice; la
+    cabecera indica cuáles están presentes.
+
+    Returns:
+        bytes con la cabecera y los arrays little-endian
+    """
+    vertices = np.ascontiguousarray(mesh["vertices"], dtype='<f4').reshape(-1, 3)
+    faces = np.ascontiguousarray(mesh["faces"], dtype='<u4').reshape(-1, 3)
+    vertex_count = len(vertices)
+
+    flags = 0
+    chunks = [vertices]
+    for key, flag in (("normals", MESH_HAS_NORMALS), ("colors", MESH_HAS_COLORS)):
+        values = mesh.get(key)
+        if values is not None and len(values) == vertex_count and vertex_count > 0:
+            chunks.append(np.ascontiguousarray(values, dtype='<f4').reshape(-1, 3))
+            flags |= flag
+    chunks.append(faces)
+
+    header = MESH_HEADER.pack(MESH_MAGIC, MESH_FORMAT_VERSION, flags, vertex_count, len(faces))
+    return b''.join([header] + [chunk.tobytes() for chunk in chunks])
+
+
+def unpack_mesh(buffer):
+    """
+    Lee una malla empaquetada con pack_mesh sin copiar los datos
+
+    Returns:
+        Diccionario con arrays 'vertices', 'normals', 'colors' y 'faces'
+        ('normals' y 'colors' son None si no están presentes)
+    """
+    magic, version, flags, vertex_count, face_count = MESH_HEADER.unpack_from(buffer, 0)
+    if magic != MESH_MAGIC or version != MESH_FORMAT_VERSION:
+        raise ValueError("Formato de malla binaria no válido")
+
+    offset = MESH_HEADER.size
+
+    def read(dtype, count):
+        nonlocal offset
+        array = np.frombuffer(buffer, dtype=dtype, count=count * 3, offset=offset).reshape(-1, 3)
+        offset += array.nbytes
+        return array
+
+    mesh = {"vertices": read('<f4', vertex_count), "normals": None, "colors": None}
+    if flags & MESH_HAS_NORMALS:
+        mesh["normals"] = read('<f4', vertex_count)
+    if flags & MESH_HAS_COLORS:
+        mesh["colors"] = read('<f4', vertex_count)
+    mesh["faces"] = read('<u4', face_count)
+    return mesh
@@ -0,0 +1,291 @@
+import math
+
+import cv2
+import numpy as np
+
+from .mesh import DEPTH_THRESHOLD, apply_color_mode, grid_colors, grid_normals
+
+# Resolución de trabajo del quadtree respecto a la malla regular equivalente:
+# el mapa de profundidad se muestrea para 4 veces más polígonos, de modo que
+# las zonas con detalle pueden refinarse por debajo de la celda uniforme.
+ADAPTIVE_OVERSAMPLING = 4
+
+
+def _build_tree(height, width):
+    """
+    Construye el quadtree completo sobre las esquinas de los píxeles
+
+    Cada nodo es un rectángulo inclusivo [x0, x1] x [y0, y1]; los hijos
+    comparten bordes con sus vecinos. Los nodos de 1 píxel de ancho o alto
+    solo se dividen en el otro eje.
+
+    Returns:
+        Tuple de arrays (x0, y0, x1, y1, padre), nivel por nivel
+    """
+    x0 = np.array([0]); y0 = np.array([0])
+    x1 = np.array([width - 1]); y1 = np.array([height - 1])
+    parent = np.array([-1])
+    levels = [(x0, y0, x1, y1, parent)]
+    offset = 0
+
+    while True:
+        split_x = (x1 - x0) >= 2
+        split_y = (y1 - y0) >= 2
+        splittable = np.nonzero(split_x | split_y)[0]
+        if len(splittable) == 0:
+            break
+
+        sx, sy = split_x[splittable], split_y[splittable]
+        px0, py0, px1, py1 = x0[splittable], y0[splittable], x1[splittable], y1[splittable]
+        mx = np.where(sx, (px0 + px1) // 2, px1)
+        my = np.where(sy, (py0 + py1) // 2, py1)
+        ids = splittable + offset
+
+        # Cuadrantes: superior izquierdo, superior derecho, inferior izquierdo, inferior derecho
+        quadrants = [
+            (np.ones_like(sx), px0, py0, mx, my),
+            (sx, mx, py0, px1, my),
+            (sy, px0, my, mx, py1),
+            (sx & sy, mx, my, px1, py1),
+        ]
+        offset += len(x0)
+        x0 = np.concatenate([q[1][q[0]] for q in quadrants])
+        y0 = np.concatenate([q[2][q[0]] for q in quadrants])
+        x1 = np.concatenate([q[3][q[0]] for q in quadrants])
+        y1 = np.concatenate([q[4][q[0]] for q in quadrants])
+        parent = np.concatenate([ids[q[0]] for q in quadrants])
+        levels.append((x0, y0, x1, y1, parent))
+
+    return tuple(np.concatenate([level[i] for level in levels]) for i in range(5))
+
+
+def _rect_sums(integral, x0, y0, x1, y1):
+    """Suma de un rectángulo inclusivo usando una imagen integral"""
+    return (integral[y1 + 1, x1 + 1] - integral[y0, x1 + 1]
+            - integral[y1 + 1, x0] + integral[y0, x0])
+
+
+class _QuadTree:
+    """Quadtree sobre un mapa de profundidad con el error de cada nodo precalculado"""
+
+    def __init__(self, depth_map):
+        self.height, self.width = depth_map.shape
+        self.x0, self.y0, self.x1, self.y1, self.parent = _build_tree(self.height, self.width)
+
+        # Error cuadrático del nodo (varianza * área) a partir de imágenes integrales.
+        # Nunca aumenta de padre a hijo, por lo que un umbral sobre él define
+        # siempre un árbol válido y equivale a dividir primero el nodo con más error.
+        sums, squares = cv2.integral2(depth_map.astype(np.float64))
+        area = (self.x1 - self.x0 + 1) * (self.y1 - self.y0 + 1)
+        total = _rect_sums(sums, self.x0, self.y0, self.x1, self.y1)
+        total_sq = _rect_sums(squares, self.x0, self.y0, self.x1, self.y1)
+        self.error = np.maximum(total_sq - total * total / area, 0.0)
+
+        self.splittable = ((self.x1 - self.x0) >= 2) | ((self.y1 - self.y0) >= 2)
+
+    def leaves(self, threshold):
+        """Índices de las hojas cuando se dividen los nodos con error mayor que el umbral"""
+        split = self.splittable & (self.error > threshold)
+        parent_split = np.ones(len(split), dtype=bool)
+        has_parent = self.parent >= 0
+        parent_split[has_parent] = split[self.parent[has_parent]]
+        return np.nonzero(parent_split & ~split)[0]
+
+    def corner_grid(self, leaves):
+        """Máscara (alto x ancho) con las esquinas de las hojas, que serán los vértices"""
+        grid = np.zeros((self.height, self.width), dtype=bool)
+        x0, y0, x1, y1 = self.x0[leaves], self.y0[leaves], self.x1[leaves], self.y1[leaves]
+        grid[y0, x0] = True
+        grid[y0, x1] = True
+        grid[y1, x0] = True
+        grid[y1, x1] = True
+        return grid
+
+    def edge_points(self, leaves, grid):
+        """
+        Número de vértices sobre el borde de cada hoja además de sus 4 esquinas
+        (uniones en T con hojas vecinas más pequeñas)
+        """
+        x0, y0, x1, y1 = self.x0[leaves], self.y0[leaves], self.x1[leaves], self.y1[leaves]
+        rows = np.cumsum(grid, axis=1)
+        cols = np.cumsum(grid, axis=0)
+
+        # Puntos estrictamente interiores de cada borde
+        top = rows[y0, x1 - 1] - rows[y0, x0]
+        bottom = rows[y1, x1 - 1] - rows[y1, x0]
+        left = cols[y1 - 1, x0] - cols[y0, x0]
+        right = cols[y1 - 1, x1] - cols[y0, x1]
+        return top + bottom + left + right
+
+    def face_count(self, threshold):
+        leaves = self.leaves(threshold)
+        extra = self.edge_points(leaves, self.corner_grid(leaves))
+        return int(np.where(extra == 0, 2, 4 + extra).sum())
+
+
+def _select_threshold(tree, target_polygons):
+    """
+    Busca el umbral de error más bajo cuya malla no supera el presupuesto de polígonos
+    """
+    # Umbrales de mayor a menor: cada uno divide más nodos que el anterior.
+    # El primero no divide nada y el último (-1) divide todos los nodos posibles.
+    candidates = np.append(np.unique(tree.error[tree.splittable])[::-1], -1.0)
+
+    best = 0
+    low, high = 1, len(candidates) - 1
+    while low <= high:
+        middle = (low + high) // 2
+        if tree.face_count(candidates[middle]) <= target_polygons:
+            best = middle
+            low = middle + 1
+        else:
+            high = middle - 1
+
+    return candidates[best]
+
+
+def build_adaptive_mesh(depth_map, image, target_polygons, z_scale=2.0, z_offset=-1.0, color_mode="color",
+                        depth_threshold=DEPTH_THRESHOLD, cull_extruded=False):
+    """
+    Construye una malla adaptativa subdividiendo un quadtree según la varianza local de profundidad
+
+    Las zonas planas se cubren con pocas celdas grandes y el detalle se
+    concentra donde cambia la profundidad, sin superar target_polygons caras.
+    Las hojas con vértices de vecinas más finas en sus bordes se triangulan
+    en abanico desde su centro para no dejar grietas en las uniones en T.
+
+    Args:
+        depth_map: Mapa de profundidad a la resolución de trabajo
+        image: Imagen BGR con las mismas dimensiones que el mapa de profundidad
+        target_polygons: Número máximo de caras
+        (resto de argumentos como en build_grid_mesh)
+
+    Returns:
+        Diccionario con arrays 'vertices', 'normals', 'colors' y 'faces'
+    """
+    return build_adaptive_lods(
+        depth_map, image, [target_polygons], z_scale, z_offset, color_mode, depth_threshold, cull_extruded
+    )[0]
+
+
+def build_adaptive_lods(depth_map, image, budgets, z_scale=2.0, z_offset=-1.0, color_mode="color",
+                        depth_threshold=DEPTH_THRESHOLD, cull_extruded=False):
+    """
+    Construye varias mallas adaptativas, una por presupuesto de polígonos,
+    reutilizando el mismo quadtree y las mismas imágenes integrales
+
+    Returns:
+        Lista de diccionarios de malla en el mismo orden que budgets
+    """
+    depth_map = depth_map.astype(np.float32)
+    height, width = depth_map.shape
+    if height < 2 or width < 2:
+        raise ValueError("El mapa de profundidad es demasiado pequeño para el mallado adaptativo")
+
+    tree = _QuadTree(depth_map)
+    color_image = apply_color_mode(image, color_mode)
+    color_field = grid_colors(color_image).reshape(height, width, 3)
+    depth_sums = cv2.integral(depth_map.astype(np.float64))
+    color_sums = cv2.integral(color_image.astype(np.float64))
+
+    meshes = []
+    for target_polygons in budgets:
+        leaves = tree.leaves(_select_threshold(tree, target_polygons))
+        # Celda uniforme equivalente, para que las normales sean comparables con la malla regular
+        spacing = max(1.0, math.sqrt(height * width / (2.0 * max(target_polygons, 1))))
+        normal_field = grid_normals(depth_map, spacing).reshape(height, width, 3)
+
+        meshes.append(_leaves_mesh(
+            tree, leaves, depth_map, normal_field, color_field, depth_sums, color_sums,
+            z_scale, z_offset, depth_threshold, cull_extruded
+        ))
+    return meshes
+
+
+def _leaves_mesh(tree, leaves, depth_map, normal_field, color_field, depth_sums, color_sums,
+                 z_scale, z_offset, depth_threshold, cull_extruded):
+    """Triangula las hojas seleccionadas del quadtree"""
+    height, width = depth_map.shape
+    grid = tree.corner_grid(leaves)
+    extra = tree.edge_points(leaves, grid)
+
+    # Vértices: esquinas de las hojas en orden de filas
+    index = np.full((height, width), -1, dtype=np.int64)
+    ys, xs = np.nonzero(grid)
+    index[ys, xs] = np.arange(len(ys))
+
+    axis_x = np.linspace(-1.0, 1.0, width, dtype=np.float32)
+    axis_y = -np.linspace(-1.0, 1.0, height, dtype=np.float32)
+
+    depths = [depth_map[ys, xs]]
+    positions = [np.stack([axis_x[xs], axis_y[ys]], axis=-1)]
+    normals = [normal_field[ys, xs]]
+    colors = [color_field[ys, xs]]
+
+    x0, y0, x1, y1 = tree.x0[leaves], tree.y0[leaves], tree.x1[leaves], tree.y1[leaves]
+
+    # Hojas sin uniones en T: dos triángulos como en la malla regular
+    simple = extra == 0
+    v0 = index[y0[simple], x0[simple]]
+    v1 = index[y0[simple], x1[simple]]
+    v2 = index[y1[simple], x0[simple]]
+    v3 = index[y1[simple], x1[simple]]
+    faces = [np.stack([v0, v1, v2], axis=-1), np.stack([v1, v3, v2], axis=-1)]
+
+    # Hojas con uniones en T: abanico desde un vértice central
+    fan = np.nonzero(~simple)[0]
+    if len(fan):
+        fx0, fy0, fx1, fy1 = x0[fan], y0[fan], x1[fan], y1[fan]
+        centers = len(ys) + np.arange(len(fan))
+        cx = (fx0 + fx1) / 2.0
+        cy = (fy0 + fy1) / 2.0
+
+        # El centro toma la profundidad y el color medios de la hoja
+        area = (fx1 - fx0 + 1) * (fy1 - fy0 + 1)
+        mean_depth = _rect_sums(depth_sums, fx0, fy0, fx1, fy1) / area
+        mean_color = _rect_sums(color_sums, fx0, fy0, fx1, fy1) / area[:, np.newaxis]
+
+        depths.append(mean_depth.astype(np.float32))
+        positions.append(np.stack([cx / (width - 1) * 2 - 1, -(cy / (height - 1) * 2 - 1)], axis=-1))
+        normals.append(normal_field[np.round(cy).astype(int), np.round(cx).astype(int)])
+        colors.append(mean_color[:, ::-1] / 255.0)
+
+        fan_faces = []
+        for i in range(len(fan)):
+            lx0, ly0, lx1, ly1 = fx0[i], fy0[i], fx1[i], fy1[i]
+            # Borde recorrido en el mismo sentido que los triángulos de la malla regular
+            ring = np.concatenate([
+                index[ly0, lx0:lx1],
+                index[ly0:ly1, lx1],
+                index[ly1, lx0 + 1:lx1 + 1][::-1],
+                index[ly0 + 1:ly1 + 1, lx0][::-1],
+            ])
+            ring = ring[ring >= 0]
+            fan_faces.append(np.stack([
+                np.full(len(ring), centers[i]),
+                ring,
+                np.roll(ring, -1),
+            ], axis=-1))
+        faces.append(np.concatenate(fan_faces))
+
+    depth = np.concatenate(depths)
+    vertices = np.empty((len(depth), 3), dtype=np.float32)
+    vertices[:, :2] = np.concatenate(positions)
+    vertices[:, 2] = depth * z_scale + z_offset
+    faces = np.concatenate(faces).astype(np.int32)
+
+    # Descartar triángulos con cambios bruscos de profundidad (huecos en el modelo)
+    cull_depth = vertices[:, 2] if cull_extruded else depth
+    corners = cull_depth[faces]
+    keep = (
+        (np.abs(corners[:, 0] - corners[:, 1]) < depth_threshold) &
+        (np.abs(corners[:, 1] - corners[:, 2]) < depth_threshold) &
+        (np.abs(corners[:, 2] - corners[:, 0]) < depth_threshold)
+    )
+
+    return {
+        "vertices": vertices,
+        "normals": np.concatenate(normals).astype(np.float32),
+        "colors": np.concatenate(colors).astype(np.float32),
+        "faces": faces[keep],
+    }
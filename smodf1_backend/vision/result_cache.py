@@ -0,0 +1,330 @@
+import hashlib
+import importlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+
+from .mesh import pack_mesh, unpack_mesh
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo por defecto de la caché en disco
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# El tamaño de la caché se estima sumando lo que escribe cada proceso y solo
+# se recorre el directorio entero cuando la estimación supera el máximo o
+# cada EVICTION_SCAN_INTERVAL escrituras (para contar las de otros procesos).
+# La expulsión deja la caché en EVICTION_TARGET_RATIO del máximo, de modo que
+# las siguientes escrituras no vuelvan a provocar un recorrido.
+EVICTION_SCAN_INTERVAL = 100
+EVICTION_TARGET_RATIO = 0.9
+
+# Tipos de entrada: mapas de profundidad y modelos 3D completos
+KIND_DEPTH = "depth"
+KIND_MODEL = "model"
+
+DEPTH_FILE = "depth.npz"
+MODEL_FILE = "model.json"
+MESH_FILE = "lod{lod}.smsh"
+
+
+def normalize_settings(settings, keys):
+    """
+    Subconjunto canónico de la configuración que afecta al resultado
+
+    Los números se convierten a float para que 5 y 5.0 den la misma clave.
+    """
+    normalized = {}
+    for key in keys:
+        value = settings.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        normalized[key] = value
+    return normalized
+
+
+def source_version(module_names):
+    """
+    Versión del código de un conjunto de módulos (hash de sus fuentes)
+
+    Cualquier cambio en el código que genera los resultados invalida
+    automáticamente las entradas calculadas con la versión anterior.
+    """
+    digest = hashlib.sha256()
+    for name in module_names:
+        module = importlib.import_module(name)
+        try:
+            with open(inspect.getsourcefile(module), 'rb') as f:
+                digest.update(f.read())
+        except (OSError, TypeError):
+            digest.update(name.encode())
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Caché persistente de resultados direccionada por contenido
+
+    Cada entrada es un directorio con los archivos del resultado (el mapa
+    de profundidad como .npz comprimido, las mallas en el formato binario
+    de vision.mesh) cuyo nombre es el SHA-256 de su clave. Las entradas se
+    escriben en un directorio temporal y se publican con un rename atómico,
+    así que varios procesos pueden compartir la caché. Al superar max_bytes
+    se expulsan las entradas usadas hace más tiempo (fecha de modificación
+    del directorio, que se actualiza en cada acierto); el tamaño se estima
+    al escribir en lugar de recorrer la caché en cada escritura.
+
+    Args:
+        directory: Directorio local de la caché
+        max_bytes: Tamaño máximo en disco; 0 desactiva la caché
+        version: Versión del código que produce los resultados
+    """
+
+    def __init__(self, directory, max_bytes=RESULT_CACHE_MAX_BYTES, version=""):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.version = version
+        self._lock = threading.Lock()
+        self._hits = {}
+        self._misses = {}
+        # Tamaño estimado en disco (None hasta el primer recorrido)
+        self._size_estimate = None
+        self._writes_since_scan = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def key(self, kind, image_hash, processor_type, settings):
+        """Clave de una entrada: SHA-256 de (tipo, imagen, procesador, configuración, versión)"""
+        payload = json.dumps(
+            [kind, image_hash, processor_type, settings, self.version],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get_depth(self, key):
+        """Mapa de profundidad guardado o None"""
+        path = self._lookup(KIND_DEPTH, key)
+        if path is None:
+            return None
+        try:
+            with np.load(os.path.join(path, DEPTH_FILE)) as data:
+                return data["depth"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Entrada de caché ilegible {KIND_DEPTH}/{key}: {str(e)}")
+            return None
+
+    def put_depth(self, key, depth_map):
+        def write(path):
+            np.savez_compressed(os.path.join(path, DEPTH_FILE), depth=depth_map)
+        self._store(KIND_DEPTH, key, write)
+
+    def get_model(self, key):
+        """
+        Modelo guardado o None
+
+        Returns:
+            Tuple de (diccionario del modelo sin geometría, lista de mallas por nivel)
+        """
+        path = self._lookup(KIND_MODEL, key)
+        if path is None:
+            return None
+        try:
+            with open(os.path.join(path, MODEL_FILE)) as f:
+                model = json.load(f)
+            meshes = []
+            for lod in range(model.pop("mesh_count")):
+                with open(os.path.join(path, MESH_FILE.format(lod=lod)), 'rb') as f:
+                    mesh = unpack_mesh(f.read())
+                # pack_mesh omite normales y colores vacíos
+                for attribute in ("normals", "colors"):
+                    if mesh[attribute] is None:
+                        mesh[attribute] = np.zeros((len(mesh["vertices"]), 3), dtype=np.float32)
+                meshes.append(mesh)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Entrada de caché ilegible {KIND_MODEL}/{key}: {str(e)}")
+            return None
+        return model, meshes
+
+    def put_model(self, key, model, meshes):
+        """
+        Guarda un modelo
+
+        Args:
+            model: Diccionario JSON del modelo sin geometría
+            meshes: Mallas (arrays) de cada nivel de detalle, de la más detallada a la más simple
+        """
+        def write(path):
+            with open(os.path.join(path, MODEL_FILE), 'w') as f:
+                json.dump(dict(model, mesh_count=len(meshes)), f)
+            for lod, mesh in enumerate(meshes):
+                with open(os.path.join(path, MESH_FILE.format(lod=lod)), 'wb') as f:
+                    f.write(pack_mesh(mesh))
+        self._store(KIND_MODEL, key, write)
+
+    def counters(self):
+        """Aciertos, fallos y tasa de aciertos de este proceso por tipo de entrada"""
+        with self._lock:
+            hits, misses = dict(self._hits), dict(self._misses)
+        result = {}
+        for kind in (KIND_DEPTH, KIND_MODEL):
+            kind_hits, kind_misses = hits.get(kind, 0), misses.get(kind, 0)
+            total = kind_hits + kind_misses
+            result[kind] = {
+                "hits": kind_hits,
+                "misses": kind_misses,
+                "hit_rate": kind_hits / total if total else 0.0,
+            }
+        return result
+
+    def stats(self):
+        """Contadores de este proceso y ocupación en disco"""
+        entries = self._entries()
+        result = self.counters()
+        result.update({
+            "entries": len(entries),
+            "size_bytes": sum(size for _, _, size in entries),
+            "max_bytes": self.max_bytes,
+        })
+        return result
+
+    def clear(self):
+        for path, _, _ in self._entries():
+            shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self._size_estimate = 0
+
+    def _entry_path(self, kind, key):
+        return os.path.join(self.directory, kind, key[:2], key)
+
+    def _count(self, kind, hit):
+        with self._lock:
+            counters = self._hits if hit else self._misses
+            counters[kind] = counters.get(kind, 0) + 1
+
+    def _lookup(self, kind, key):
+        if not self.enabled:
+            return None
+        path = self._entry_path(kind, key)
+        if not os.path.isdir(path):
+            self._count(kind, False)
+            return None
+        try:
+            # Marcar la entrada como usada recientemente para el LRU
+            os.utime(path)
+        except OSError:
+            # Expulsada por otro proceso entre la comprobación y el acceso
+            self._count(kind, False)
+            return None
+        self._count(kind, True)
+        return path
+
+    def _store(self, kind, key, write):
+        if not self.enabled:
+            return
+        path = self._entry_path(kind, key)
+        temp_path = os.path.join(self.directory, "tmp", uuid.uuid4().hex)
+        try:
+            os.makedirs(temp_path)
+            write(temp_path)
+            size = self._entry_size(temp_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.rename(temp_path, path)
+        except OSError as e:
+            # Otro proceso ya publicó la misma entrada, o el disco falló:
+            # la caché es opcional y el resultado ya está calculado
+            logger.debug(f"No se guardó la entrada {kind}/{key}: {str(e)}")
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return
+        self._account(size)
+
+    def _account(self, size):
+        """Suma una entrada nueva a la estimación y expulsa si hace falta"""
+        with self._lock:
+            self._writes_since_scan += 1
+            if self._size_estimate is not None:
+                self._size_estimate += size
+            scan = (self._size_estimate is None or self._size_estimate > self.max_bytes
+                    or self._writes_since_scan >= EVICTION_SCAN_INTERVAL)
+            if scan:
+                self._writes_since_scan = 0
+        if scan:
+            self._evict()
+
+    @staticmethod
+    def _entry_size(path):
+        return sum(item.stat().st_size for item in os.scandir(path))
+
+    def _entries(self):
+        """Lista de (ruta, último uso, tamaño en bytes) de todas las entradas"""
+        entries = []
+        for kind in (KIND_DEPTH, KIND_MODEL):
+            root = os.path.join(self.directory, kind)
+            if not os.path.isdir(root):
+                continue
+            for prefix in os.scandir(root):
+                if not prefix.is_dir():
+                    continue
+                for entry in os.scandir(prefix.path):
+                    try:
+                        size = self._entry_size(entry.path)
+                        entries.append((entry.path, entry.stat().st_mtime, size))
+                    except OSError:
+                        continue
+        return entries
+
+    def _evict(self):
+        """Recorre la caché y, si supera max_bytes, la reduce a EVICTION_TARGET_RATIO del máximo"""
+        entries = self._entries()
+        total = sum(size for _, _, size in entries)
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICTION_TARGET_RATIO
+            for path, _, size in sorted(entries, key=lambda entry: entry[1]):
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                if total <= target:
+                    break
+            logger.info(f"Caché de resultados reducida a {total / (1024 * 1024):.1f} MB")
+        with self._lock:
+            self._size_estimate = total
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+# Módulos cuyo código determina los mapas de profundidad y las mallas
+PIPELINE_MODULES = (
+    "opencv_processors",
+    "vision.depth_primitives",
+    "vision.image_context",
+    "vision.image_processor",
+    "vision.lod",
+    "vision.mesh",
+    "vision.quadtree_mesh",
+)
+
+
+def get_result_cache():
+    """
+    Caché de resultados del proceso, configurada con RESULT_CACHE_DIR y
+    RESULT_CACHE_MAX_BYTES
+    """
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            from django.conf import settings
+
+            _result_cache = ResultCache(
+                getattr(settings, 'RESULT_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'results')),
+                getattr(settings, 'RESULT_CACHE_MAX_BYTES', RESULT_CACHE_MAX_BYTES),
+                version=source_version(PIPELINE_MODULES)
+            )
+            logger.info(f"Caché de resultados en {_result_cache.directory} (versión {_result_cache.version})")
+        return _result_cache
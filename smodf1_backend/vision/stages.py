@@ -0,0 +1,38 @@
+import cv2
+import numpy as np
+
+from opencv_processors import get_image_processor
+
+# Etapas limitadas por CPU que se ejecutan a través de vision.executor.
+# Deben ser funciones de módulo para que los procesos del pool puedan
+# importarlas, y reciben arrays (o un ImageContext en modo inline).
+
+
+def kmeans_segment(image, num_segments, attempts=10):
+    """
+    Segmenta la imagen en num_segments colores con k-means
+
+    Returns:
+        Imagen con cada píxel sustituido por el centro de su grupo
+    """
+    pixels = np.float32(image.reshape((-1, 3)))
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)
+    _, labels, centers = cv2.kmeans(pixels, num_segments, None, criteria, attempts, cv2.KMEANS_RANDOM_CENTERS)
+    centers = np.uint8(centers)
+    return centers[labels.flatten()].reshape(image.shape)
+
+
+def mean_shift_filter(image, spatial_radius, color_radius, min_density):
+    """Filtrado Mean Shift (pyrMeanShiftFiltering) con los parámetros originales"""
+    return cv2.pyrMeanShiftFiltering(image, spatial_radius, color_radius, min_density)
+
+
+def specialized_depth_map(image_type, image, detail_level=5, sensitivity=0.5):
+    """Mapa de profundidad del procesador especializado de image_type"""
+    return get_image_processor(image_type).generate_depth_map(image, detail_level, sensitivity)
+
+
+def detect_people_contours(image):
+    """Contornos rectangulares de las personas detectadas con HOG"""
+    _, _, contours = get_image_processor("personas").process_image(image)
+    return contours
@@ -1,3 +1,169 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import struct
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+
+from .artifacts import pack_model_artifact, read_model_artifact, unpack_model_artifact, write_model_artifact
+from .gltf import GLB_CHUNK_BIN, GLB_CHUNK_JSON, GLB_MAGIC, GLB_VERSION, build_glb
+from .mesh import MESH_HEADER, pack_mesh, unpack_mesh
+from .result_cache import EVICTION_SCAN_INTERVAL, ResultCache
+
+
+def grid_mesh(size=4, normals=True, colors=True):
+    """Malla (arrays de numpy) de una rejilla de size x size vértices con relieve"""
+    xs, ys = np.meshgrid(np.linspace(-1, 1, size), np.linspace(-1, 1, size))
+    vertices = np.stack([xs.ravel(), ys.ravel(), (xs * ys).ravel() * 0.5], axis=1).astype(np.float32)
+    faces = []
+    for y in range(size - 1):
+        for x in range(size - 1):
+            i = y * size + x
+            faces += [[i, i + 1, i + size], [i + 1, i + size + 1, i + size]]
+    count = len(vertices)
+    return {
+        "vertices": vertices,
+        "normals": np.tile(np.float32([0, 0, 1]), (count, 1)) if normals else None,
+        "colors": np.linspace(0, 1, count * 3, dtype=np.float32).reshape(-1, 3) if colors else None,
+        "faces": np.asarray(faces, dtype=np.uint32),
+    }
+
+
+def read_glb(data):
+    """Separa un GLB en (cabecera, lista de (longitud, tipo, contenido) de cada chunk)"""
+    header = struct.unpack_from('<III', data, 0)
+    chunks = []
+    offset = 12
+    while offset < len(data):
+        length, chunk_type = struct.unpack_from('<II', data, offset)
+        chunks.append((length, chunk_type, data[offset + 8:offset + 8 + length]))
+        offset += 8 + length
+    return header, chunks
+
+
+class MeshFormatTests(SimpleTestCase):
+    def assertMeshEqual(self, first, second):
+        for key in ("vertices", "normals", "colors", "faces"):
+            if first[key] is None:
+                self.assertIsNone(second[key], key)
+            else:
+                np.testing.assert_array_equal(first[key], second[key], err_msg=key)
+
+    def test_pack_unpack_round_trip(self):
+        mesh = grid_mesh()
+        data = pack_mesh(mesh)
+        self.assertEqual(len(data), MESH_HEADER.size + (16 * 3 * 3) * 4 + 18 * 3 * 4)
+        self.assertMeshEqual(mesh, unpack_mesh(data))
+
+    def test_missing_attributes_are_omitted(self):
+        mesh = grid_mesh(normals=False, colors=False)
+        self.assertMeshEqual(mesh, unpack_mesh(pack_mesh(mesh)))
+
+    def test_invalid_header_is_rejected(self):
+        data = bytearray(pack_mesh(grid_mesh()))
+        data[:4] = b'XXXX'
+        with self.assertRaises(ValueError):
+            unpack_mesh(bytes(data))
+
+
+class GLBTests(SimpleTestCase):
+    def check_layout(self, data):
+        (magic, version, length), chunks = read_glb(data)
+        self.assertEqual(magic, GLB_MAGIC)
+        self.assertEqual(version, GLB_VERSION)
+        self.assertEqual(length, len(data))
+        self.assertEqual([chunk_type for _, chunk_type, _ in chunks], [GLB_CHUNK_JSON, GLB_CHUNK_BIN])
+        for chunk_length, _, content in chunks:
+            self.assertEqual(chunk_length % 4, 0)
+            self.assertEqual(len(content), chunk_length)
+
+        gltf = json.loads(chunks[0][2])
+        binary = chunks[1][2]
+        self.assertEqual(gltf["buffers"][0]["byteLength"], len(binary))
+        for view in gltf["bufferViews"]:
+            self.assertEqual(view["byteOffset"] % 4, 0)
+            self.assertLessEqual(view["byteOffset"] + view["byteLength"], len(binary))
+            self.assertEqual(view.get("byteStride", 4) % 4, 0)
+        return gltf, binary
+
+    def test_float_layout(self):
+        mesh = grid_mesh()
+        gltf, binary = self.check_layout(build_glb(mesh, quantize=False))
+        view = gltf["bufferViews"][gltf["accessors"][0]["bufferView"]]
+        positions = np.frombuffer(binary, dtype='<f4', count=16 * 3, offset=view["byteOffset"]).reshape(-1, 3)
+        np.testing.assert_array_equal(positions, mesh["vertices"])
+
+    def test_quantized_positions_use_uniform_scale(self):
+        mesh = grid_mesh()
+        gltf, binary = self.check_layout(build_glb(mesh))
+        self.assertIn("KHR_mesh_quantization", gltf["extensionsRequired"])
+
+        node = gltf["nodes"][0]
+        self.assertEqual(len(set(node["scale"])), 1)
+        view = gltf["bufferViews"][gltf["accessors"][0]["bufferView"]]
+        quantized = np.frombuffer(binary, dtype='<u2', count=16 * 4, offset=view["byteOffset"]).reshape(-1, 4)
+        positions = quantized[:, :3] * np.asarray(node["scale"]) + np.asarray(node["translation"])
+        np.testing.assert_allclose(positions, mesh["vertices"], atol=1e-4)
+
+    def test_points_without_faces(self):
+        mesh = dict(grid_mesh(3), faces=np.zeros((0, 3), dtype=np.uint32))
+        gltf, _ = self.check_layout(build_glb(mesh))
+        self.assertNotIn("indices", gltf["meshes"][0]["primitives"][0])
+
+    def test_empty_mesh_is_rejected(self):
+        with self.assertRaises(ValueError):
+            build_glb({"vertices": np.zeros((0, 3)), "faces": np.zeros((0, 3))})
+
+
+class ModelArtifactTests(SimpleTestCase):
+    def test_artifact_with_several_lods(self):
+        metadata = {"vertices_count": 36, "lods": [{"lod": 0}, {"lod": 1}]}
+        meshes = [grid_mesh(6), grid_mesh(3, normals=False)]
+
+        unpacked_metadata, unpacked_meshes = unpack_model_artifact(pack_model_artifact(metadata, meshes))
+        self.assertEqual(unpacked_metadata, metadata)
+        self.assertEqual(len(unpacked_meshes), 2)
+        for mesh, unpacked in zip(meshes, unpacked_meshes):
+            np.testing.assert_array_equal(mesh["vertices"], unpacked["vertices"])
+            np.testing.assert_array_equal(mesh["faces"], unpacked["faces"])
+        self.assertIsNone(unpacked_meshes[1]["normals"])
+
+    def test_read_fills_missing_attributes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        path = os.path.join(directory, "modelo.smz")
+
+        write_model_artifact(path, {}, [grid_mesh(3, normals=False, colors=False)])
+        _, meshes = read_model_artifact(path)
+        np.testing.assert_array_equal(meshes[0]["normals"], np.zeros((9, 3), dtype=np.float32))
+        np.testing.assert_array_equal(meshes[0]["colors"], np.zeros((9, 3), dtype=np.float32))
+
+
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def put_depth_maps(self, cache, count, size=32):
+        for index in range(count):
+            cache.put_depth(cache.key("depth", str(index), "test", {}), np.random.rand(size, size))
+
+    def test_writes_below_limit_do_not_scan_the_cache(self):
+        cache = ResultCache(self.directory)
+        with mock.patch.object(cache, '_entries', wraps=cache._entries) as entries:
+            self.put_depth_maps(cache, EVICTION_SCAN_INTERVAL + 1)
+        # El primer recorrido inicializa la estimación; el siguiente toca por intervalo
+        self.assertEqual(entries.call_count, 2)
+
+    def test_size_limit_is_enforced(self):
+        self.put_depth_maps(ResultCache(self.directory), 1)
+        entry_size = ResultCache(self.directory).stats()["size_bytes"]
+
+        cache = ResultCache(self.directory, max_bytes=entry_size * 5)
+        self.put_depth_maps(cache, 20)
+        stats = cache.stats()
+        self.assertLessEqual(stats["size_bytes"], cache.max_bytes)
+        self.assertGreater(stats["entries"], 0)